@@ -1,39 +1,281 @@
 import csv
+import io
 import os
 import re
+import hashlib
+import threading
+import sqlite3
+import json
+from collections import Counter
+from itertools import chain
 
 # --- Local Imports ---
 import config
 from agents.privacy_agent import sanitize_contact_location # <-- Import the new tool
 
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# A fuzzy match must score at least this much to count as a match at all...
+MATCH_THRESHOLD = 0.45
+# ...and resolve_contact() also wants the runner-up to trail by this margin.
+RESOLVE_MARGIN = 0.1
+
+# Compiled snapshot written by import_contacts(); used instead of the CSV when present.
+SNAPSHOT_PATH = getattr(config, "CONTACTS_SNAPSHOT_PATH", "contacts_snapshot.db")
+
+def _tokens(text: str):
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def _trigrams(text: str):
+    """Character trigrams of each word, padded so word starts weigh more ("  j", " jo", "jon", ...)."""
+    grams = set()
+    for token in _tokens(text):
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _name_entries(fields: list):
+    """
+    Precomputes what _similarity needs for a contact: each name field and each
+    word in it, with its trigrams and words.
+    """
+    entries = []
+    for field in fields:
+        words = _tokens(field)
+        entries.append((field, _trigrams(field), words))
+        if len(words) > 1:
+            entries.extend((field, _trigrams(word), [word]) for word in words)
+    return entries
+
+def _similarity(query_tokens: list, query_grams: set, field_grams: set, field_tokens: list):
+    """
+    Scores how well a name (or one word of it) matches the query, from 0 to 1:
+    trigram overlap (Dice coefficient), with a floor for nickname-style
+    prefixes like "Jon" -> "Jonathan".
+    """
+    if not field_grams:
+        return 0.0
+    score = 2 * len(query_grams & field_grams) / (len(query_grams) + len(field_grams))
+    prefixes = [[len(f) for f in field_tokens if f.startswith(q)] for q in query_tokens]
+    if all(prefixes):
+        matched = sum(len(q) for q in query_tokens)
+        covered = sum(min(lengths) for lengths in prefixes)
+        score = max(score, 0.7 + 0.3 * matched / covered)
+    return score
+
+class _Contact:
+    """One row of the contacts export, reduced to the fields Umbra uses."""
+    __slots__ = ("full_name", "first_name", "last_name", "nickname", "file_as", "organization",
+                 "formatted_address", "city", "region", "postal_code", "phones", "emails")
+
+    def __init__(self, row: dict):
+        self.first_name = row.get("First Name", "").strip()
+        self.last_name = row.get("Last Name", "").strip()
+        self.full_name = f"{self.first_name} {self.last_name}".strip()
+        self.nickname = row.get("Nickname", "").strip()
+        self.file_as = row.get("File As", "").strip()
+        self.organization = row.get("Organization Name", "").strip()
+        self.formatted_address = row.get("Address 1 - Formatted", "").strip()
+        self.city = row.get("Address 1 - City", "").strip()
+        self.region = row.get("Address 1 - Region", "").strip()
+        self.postal_code = row.get("Address 1 - Postal Code", "").strip()
+        self.phones = tuple(p.strip() for key in ("Phone 1 - Value", "Phone 2 - Value")
+                            for p in row.get(key, "").split(":::") if p.strip())
+        self.emails = tuple(e.strip() for key in ("E-mail 1 - Value", "E-mail 2 - Value")
+                            for e in row.get(key, "").split(":::") if e.strip())
+
+    @classmethod
+    def from_snapshot(cls, row):
+        """Rebuilds a contact from a snapshot row (phones and e-mails are newline-separated)."""
+        contact = cls.__new__(cls)
+        for field in cls.__slots__:
+            value = row[field]
+            if field in ("phones", "emails"):
+                value = tuple(value.split("\n")) if value else ()
+            setattr(contact, field, value)
+        return contact
+
+    def snapshot_values(self):
+        """This contact's fields in snapshot column order."""
+        return [("\n".join(getattr(self, f)) if f in ("phones", "emails") else getattr(self, f))
+                for f in self.__slots__]
+
+    def location(self):
+        """The formatted address if available, otherwise 'City, Region'."""
+        if self.formatted_address:
+            return self.formatted_address
+        if self.city and self.region:
+            return f"{self.city}, {self.region}"
+        return ""
+
+    def name_fields(self):
+        """The name-like fields a person may be looked up by."""
+        return [f for f in (self.full_name, self.nickname, self.file_as, self.organization) if f]
+
+    def location_text(self):
+        """Everything a location filter may match against."""
+        return " ".join(filter(None, [self.formatted_address, self.city, self.region, self.postal_code]))
+
+
+class _ContactsStore:
+    """
+    Parses the contacts file once and keeps inverted indexes from location
+    and name tokens to contacts. Reloads automatically when the file changes.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.signature = None
+        self.digest = None
+        self.contacts = []
+        self.by_location = {}
+        self.by_name = {}
+        self.by_trigram = {}
+        self.name_entries = []
+        self._lock = threading.Lock()
+
+    def _index(self, contacts):
+        by_location, by_name, by_trigram = {}, {}, {}
+        name_entries = []
+        for position, contact in enumerate(contacts):
+            for token in set(_tokens(contact.location_text())):
+                by_location.setdefault(token, []).append(position)
+            for token in set(_tokens(contact.full_name)):
+                by_name.setdefault(token, []).append(position)
+            entries = _name_entries(contact.name_fields())
+            name_entries.append(entries)
+            for gram in set().union(*(grams for _, grams, _ in entries)):
+                by_trigram.setdefault(gram, []).append(position)
+        self.contacts, self.by_location, self.by_name = contacts, by_location, by_name
+        self.by_trigram, self.name_entries = by_trigram, name_entries
+
+    def refresh(self):
+        """
+        Makes sure the indexes match the source on disk: the compiled snapshot
+        if one exists, otherwise the raw CSV. A changed mtime or size triggers a
+        content check; contacts are only reloaded if the content differs.
+        Returns False if there is no contacts source.
+        """
+        path = SNAPSHOT_PATH if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH) else config.CONTACTS_FILE_PATH
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return True
+
+        with self._lock:
+            if signature == self.signature:
+                return True
+            if path == SNAPSHOT_PATH:
+                self._load_snapshot(path)
+            else:
+                self._load_csv(path)
+            self.signature = signature
+        return True
+
+    def _load_csv(self, path: str):
+        with open(path, mode='rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if digest != self.digest or path != self.path:
+            reader = csv.DictReader(io.StringIO(raw.decode('utf-8-sig'), newline=''))
+            self._index([_Contact(row) for row in reader])
+            self.digest, self.path = digest, path
+
+    def _load_snapshot(self, path: str):
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            # Let SQLite read the snapshot through a memory map instead of read() calls.
+            conn.execute("PRAGMA mmap_size = 268435456")
+            conn.row_factory = sqlite3.Row
+            generation = conn.execute("SELECT value FROM snapshot_meta WHERE key = 'generation'").fetchone()
+            digest = f"snapshot:{generation['value'] if generation else 0}"
+            if digest != self.digest or path != self.path:
+                rows = conn.execute(f"SELECT {', '.join(_Contact.__slots__)} FROM contacts ORDER BY position, contact_key").fetchall()
+                self._index([_Contact.from_snapshot(row) for row in rows])
+                self.digest, self.path = digest, path
+        finally:
+            conn.close()
+
+    def candidates(self, index: dict, text: str):
+        """Positions of contacts that contain every token of `text` (in file order)."""
+        postings = [index.get(token) for token in _tokens(text)]
+        if not postings or any(p is None for p in postings):
+            return []
+        matches = set(postings[0]).intersection(*postings[1:])
+        return sorted(matches)
+
+    def fuzzy_candidates(self, query_grams: set, limit: int):
+        """Positions sharing the most trigrams with the query, best first."""
+        postings = sorted((self.by_trigram.get(gram, ()) for gram in query_grams), key=len)
+        # Very common trigrams (e.g. "  j") say little; skip them when rarer ones exist.
+        common = max(200, len(self.contacts) // 50)
+        selective = [p for p in postings if len(p) <= common] or postings[:1]
+        # Counter counts in C, which keeps this fast for long posting lists.
+        shared = Counter(chain.from_iterable(selective))
+        return [position for position, _ in shared.most_common(limit)]
+
+_store = _ContactsStore()
+
+
+def search_contacts(name: str, k: int = 5):
+    """
+    Fuzzy, ranked lookup over first/last name, nickname, 'File As' and
+    organization. Returns up to k matches as dicts with a 0-1 "score".
+    """
+    if not _store.refresh():
+        return []
+    query_grams = _trigrams(name)
+    if not query_grams:
+        return []
+
+    query_tokens = _tokens(name)
+    scored = []
+    # Only the contacts sharing the most trigrams are scored in full.
+    for position in _store.fuzzy_candidates(query_grams, max(20, k * 4)):
+        score, matched = max(
+            (_similarity(query_tokens, query_grams, grams, words), field)
+            for field, grams, words in _store.name_entries[position]
+        )
+        if score >= MATCH_THRESHOLD:
+            scored.append((score, position, _store.contacts[position], matched))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    return [
+        {"name": contact.full_name or contact.organization, "location": contact.location(),
+         "score": round(score, 3), "matched": matched}
+        for score, _, contact, matched in scored[:k]
+    ]
+
 def find_contact(name: str):
     """
-    Finds a single contact by name in the contacts.csv file.
+    Finds the best-matching contact by name, nickname or organization.
     This is primarily a helper for the 'add-friend' command.
     """
-    # This function's logic remains the same.
-    # It just finds the raw data.
-    if not os.path.exists(config.CONTACTS_FILE_PATH):
+    if not _store.refresh():
         return {"error": "Contacts file not found."}
-    
-    with open(config.CONTACTS_FILE_PATH, mode='r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            first_name = row.get("First Name", "").strip()
-            last_name = row.get("Last Name", "").strip()
-            full_name = f"{first_name} {last_name}".strip()
-
-            if name.lower() in full_name.lower():
-                # Get the formatted address if available, otherwise build from parts
-                location = row.get("Address 1 - Formatted", "").strip()
-                if not location:
-                    city = row.get("Address 1 - City", "").strip()
-                    region = row.get("Address 1 - Region", "").strip()
-                    if city and region:
-                        location = f"{city}, {region}"
-                
-                return {"name": full_name, "location": location}
-    return {}
+
+    matches = search_contacts(name, k=1)
+    if not matches:
+        return {}
+    best = matches[0]
+    return {"name": best["name"], "location": best["location"], "score": best["score"]}
+
+def resolve_contact(name: str):
+    """
+    Returns the contact `name` refers to when the match is clear (a high
+    score and no close runner-up), otherwise None.
+    """
+    matches = search_contacts(name, k=5)
+    if not matches or matches[0]["score"] < 0.75:
+        return None
+    # Duplicate entries for the same person don't make the match ambiguous.
+    others = [m for m in matches[1:] if m["name"] != matches[0]["name"]]
+    if others and matches[0]["score"] - others[0]["score"] < RESOLVE_MARGIN:
+        return None
+    return matches[0]
 
 
 def check_contacts(location_filter: str):
@@ -41,29 +283,147 @@ def check_contacts(location_filter: str):
     Searches the entire contacts.csv file for contacts in a specific location
     and returns a sanitized list for display.
     """
-    if not os.path.exists(config.CONTACTS_FILE_PATH):
+    if not _store.refresh():
         return "⚠️ Contacts file not found at 'contacts.csv'."
 
+    # Use regex to find the location_filter as a whole word, case-insensitively
+    pattern = re.compile(r'\b' + re.escape(location_filter) + r'\b', re.IGNORECASE)
+
     found_contacts = []
-    with open(config.CONTACTS_FILE_PATH, mode='r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            location = row.get("Address 1 - Formatted", "").strip()
-            
-            # --- NEW: Use the Privacy Agent to sanitize the location ---
-            sanitized_location = sanitize_contact_location(location)
-
-            # Use regex to find the location_filter as a whole word, case-insensitively
-            if re.search(r'\b' + re.escape(location_filter) + r'\b', location, re.IGNORECASE):
-                first_name = row.get("First Name", "").strip()
-                last_name = row.get("Last Name", "").strip()
-                full_name = f"{first_name} {last_name}".strip()
-                if full_name:
-                    # Append the *sanitized* location for display
-                    found_contacts.append(f"- {full_name} ({sanitized_location})")
+    for position in _store.candidates(_store.by_location, location_filter):
+        contact = _store.contacts[position]
+        if contact.full_name and pattern.search(contact.location_text()):
+            # --- Only the contacts we return are run through the Privacy Agent ---
+            sanitized_location = sanitize_contact_location(contact.formatted_address)
+            found_contacts.append(f"- {contact.full_name} ({sanitized_location})")
 
     if not found_contacts:
         return f"No contacts found matching '{location_filter}'."
     else:
         return f"Found {len(found_contacts)} contacts matching '{location_filter}':\n" + "\n".join(found_contacts)
+
+
+# --- Snapshot import ---
+
+def _normalize_phone(phone: str):
+    digits = re.sub(r"\D", "", phone)
+    return digits[1:] if len(digits) == 11 and digits.startswith("1") else digits
+
+def _identity_keys(contact: _Contact):
+    """Normalized identifiers that mark two rows as the same person."""
+    keys = [f"email:{e.lower()}" for e in contact.emails]
+    keys += [f"phone:{p}" for p in map(_normalize_phone, contact.phones) if len(p) >= 7]
+    if contact.full_name:
+        keys.append("name:" + " ".join(_tokens(contact.full_name)))
+    return keys
+
+def _merge_duplicates(contacts: list):
+    """
+    Groups rows that share a phone number, e-mail or full name and merges each
+    group into one contact. Earlier rows (and earlier files) win field by field.
+    Returns [(contact_key, contact)] in first-seen order.
+    """
+    parent = list(range(len(contacts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, contact in enumerate(contacts):
+        for key in _identity_keys(contact):
+            if key in owner:
+                parent[find(i)] = find(owner[key])
+            else:
+                owner[key] = i
+
+    groups = {} # root -> member positions, ascending
+    for i in range(len(contacts)):
+        groups.setdefault(find(i), []).append(i)
+
+    merged = []
+    seen = set()
+    for positions in sorted(groups.values(), key=lambda g: g[0]):
+        members = [contacts[i] for i in positions]
+        contact = _Contact.__new__(_Contact)
+        for field in _Contact.__slots__:
+            if field in ("phones", "emails"):
+                values = {}
+                for member in members:
+                    for value in getattr(member, field):
+                        normalized = _normalize_phone(value) if field == "phones" else value.lower()
+                        values.setdefault(normalized, value)
+                setattr(contact, field, tuple(values.values()))
+            else:
+                setattr(contact, field, next((getattr(m, field) for m in members if getattr(m, field)), ""))
+        keys = sorted(set(chain.from_iterable(_identity_keys(m) for m in members)),
+                      key=lambda k: (not k.startswith("email:"), not k.startswith("phone:"), k))
+        if not keys:
+            if not contact.organization:
+                continue # A row with no name, number, e-mail or organization is noise.
+            # Nothing identifies the person, so the row's contents do: two people
+            # at the same organization stay apart, and only identical rows merge.
+            values = json.dumps(contact.snapshot_values()).encode("utf-8")
+            keys = [f"org:{' '.join(_tokens(contact.organization))}:{hashlib.sha1(values).hexdigest()[:12]}"]
+            if keys[0] in seen:
+                continue
+        seen.add(keys[0])
+        merged.append((keys[0], contact))
+    return merged
+
+def import_contacts(*paths):
+    """
+    Merges one or more contact exports, removes duplicates, and writes the
+    result to the compiled snapshot. Re-imports compare row hashes and only
+    write the contacts that actually changed.
+    """
+    paths = paths or (config.CONTACTS_FILE_PATH,)
+    rows = []
+    for path in paths:
+        with open(path, mode='r', encoding='utf-8-sig', newline='') as f:
+            rows.extend(_Contact(row) for row in csv.DictReader(f))
+
+    merged = _merge_duplicates(rows)
+    columns = ", ".join(_Contact.__slots__)
+    incoming = {}
+    for position, (key, contact) in enumerate(merged):
+        values = contact.snapshot_values()
+        row_hash = hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest()
+        incoming[key] = (row_hash, position, values)
+
+    conn = sqlite3.connect(SNAPSHOT_PATH)
+    try:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS contacts (
+                contact_key TEXT PRIMARY KEY,
+                row_hash TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                {", ".join(f"{field} TEXT NOT NULL" for field in _Contact.__slots__)}
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        existing = dict(conn.execute("SELECT contact_key, row_hash FROM contacts"))
+
+        # Unchanged contacts are left alone (position only orders ties, so it may go stale).
+        changed = [(key, row_hash, position, *values) for key, (row_hash, position, values) in incoming.items()
+                   if existing.get(key) != row_hash]
+        removed = [(key,) for key in existing if key not in incoming]
+        added = sum(1 for key, *_ in changed if key not in existing)
+
+        if changed or removed:
+            conn.executemany(f"INSERT OR REPLACE INTO contacts (contact_key, row_hash, position, {columns}) "
+                             f"VALUES ({', '.join('?' * (len(_Contact.__slots__) + 3))})", changed)
+            conn.executemany("DELETE FROM contacts WHERE contact_key = ?", removed)
+            conn.execute("""
+                INSERT INTO snapshot_meta (key, value) VALUES ('generation', '1')
+                ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+
+    return (f"Imported {len(rows)} rows from {len(paths)} file(s) into {len(merged)} contacts "
+            f"({len(rows) - len(merged)} duplicates merged): {added} added, "
+            f"{len(changed) - added} updated, {len(removed)} removed.")
@@ -4,22 +4,27 @@ import os
 # Add parent directory to path to find other modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from agents.memory_agent import get_recent_conversations
+from agents.memory_agent import fetch_memories_by_category, format_memories, get_memory_cursor, set_memory_cursor
 from agents.llm_agent import decide_tool # We use the core LLM to summarize
 import config
 
+# Name of this job's "last processed memory" cursor in the memory database.
+_CURSOR_NAME = "context_agent"
+
 def update_context_from_chat(num_messages: int = 20):
     """
-    Summarizes the recent web chat history and appends the insights
-    to the main context_profile.md file.
+    Summarizes the web chat history since the last update and appends the
+    insights to the main context_profile.md file.
     """
-    print("   - Accessing recent conversation history from memory...")
-    # 1. Get recent chat history from the Memory Agent
-    recent_chats = get_recent_conversations("WebApp Conversation", num_messages)
+    print("   - Accessing new conversation history from memory...")
+    # 1. Get the chats we haven't analyzed yet from the Memory Agent
+    rows, _ = fetch_memories_by_category("WebApp Conversation", num_messages, since_id=get_memory_cursor(_CURSOR_NAME))
 
-    if "No memories found" in recent_chats:
+    if not rows:
         print("   - No recent web conversations to analyze.")
         return "No recent web conversations to analyze."
+    recent_chats = format_memories(rows)
+    last_id = rows[-1]['id']
 
     print("   - Summarizing conversation with LLM...")
     # 2. Create a prompt for the LLM to summarize the conversation
@@ -34,16 +39,25 @@ def update_context_from_chat(num_messages: int = 20):
     # 3. Use the LLM to get the summary
     # We call decide_tool here as a way to directly interface with the LLM
     llm_response = decide_tool(summarization_prompt)
+    if llm_response.get("error"):
+        # The cursor stays put, so these conversations are analyzed next time.
+        print("   - The LLM is unavailable; conversation left for the next update.")
+        return "Couldn't analyze the conversation right now; I'll try again next time."
     
     # The actual summary will be in the 'thought' or a 'conversation' arg
     summary = llm_response.get("thought")
     if not summary or "No new context" in summary:
         decision = llm_response.get("decision")
         if decision and decision.get("tool") == "conversation":
-            summary = " ".join(decision.get("args", []))
+            summary = " ".join(map(str, decision.get("args", [])))
+
+    if not summary or not summary.strip():
+        print("   - LLM returned no summary; conversation left for the next update.")
+        return "Couldn't analyze the conversation right now; I'll try again next time."
 
     if "No new context" in summary:
         print("   - LLM determined no new context was learned.")
+        set_memory_cursor(_CURSOR_NAME, last_id)
         return "Analyzed conversation, but no new context was learned."
 
     print("   - Appending summary to context profile...")
@@ -53,6 +67,7 @@ def update_context_from_chat(num_messages: int = 20):
             f.write("\n\n---\n")
             f.write(f"## Learned from Conversation ({config.get_current_timestamp('%Y-%m-%d')})\n")
             f.write(summary)
+        set_memory_cursor(_CURSOR_NAME, last_id)
         
         success_message = "Successfully analyzed conversation and updated my context profile."
         print(f"   - {success_message}")
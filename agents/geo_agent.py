@@ -0,0 +1,168 @@
+import sys
+import os
+import re
+import csv
+import math
+from functools import lru_cache
+
+# Add the parent directory to the path to find other modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import config
+
+# --- NEW: Offline geocoding and geohash helpers ---
+# Locations are resolved against a small bundled gazetteer (no network), and
+# points are indexed by geohash so "near" becomes a prefix range scan.
+
+GAZETTEER_PATH = getattr(config, "GAZETTEER_PATH",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'gazetteer.csv'))
+
+GEOHASH_PRECISION = 9 # ~5 m cells; shorter prefixes of it give coarser cells.
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_ZIP = re.compile(r"\b\d{5}(?:-\d{4})?\b")
+
+# Filled on first use by _load_gazetteer().
+_cities = None # (name, region or country code) -> (lat, lon); bare name -> first listed row
+_areas = None # region/country name or code -> (lat, lon); only used to recognise qualifiers
+_codes = None # region/country full name -> code
+
+def _norm(text: str):
+    return " ".join(text.lower().replace(".", " ").split())
+
+def _load_gazetteer():
+    """Reads the gazetteer once. Earlier rows win when a bare city name is ambiguous."""
+    global _cities, _areas, _codes
+    if _cities is not None:
+        return
+    cities, areas, codes = {}, {}, {}
+    try:
+        with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                point = (float(row["lat"]), float(row["lon"]))
+                name = _norm(row["name"])
+                region, country = _norm(row["region"]), _norm(row["country"])
+                if row["kind"] == "city":
+                    cities.setdefault(name, point)
+                    for qualifier in (region, country):
+                        if qualifier:
+                            cities.setdefault((name, qualifier), point)
+                else:
+                    areas.setdefault(name, point)
+                    areas.setdefault(region, point)
+                    codes.setdefault(name, region)
+    except FileNotFoundError:
+        print(f"   - [Geo] Gazetteer not found at {GAZETTEER_PATH}; proximity search is disabled.")
+    _cities, _areas, _codes = cities, areas, codes
+
+def _place_line(location: str):
+    """Picks the 'City, ST' part of a (possibly multi-line, multi-address) location."""
+    first_address = location.split(":::")[0]
+    lines = [line.strip() for line in first_address.split("\n") if line.strip()]
+    with_comma = [line for line in lines if "," in line]
+    line = with_comma[-1] if with_comma else (lines[-1] if lines else "")
+    return _ZIP.sub("", line)
+
+@lru_cache(maxsize=4096)
+def geocode(location: str):
+    """
+    Resolves a free-text location ("Cambridge, MA", "Las Vegas NV 89145",
+    "Dublin, Ireland", "Boston") to (lat, lon) using the bundled gazetteer.
+    Returns None for a city the gazetteer doesn't list: a state or country
+    centroid can be hundreds of km off, so callers fall back to matching text.
+    """
+    _load_gazetteer()
+    if not location or not location.strip():
+        return None
+    parts = [_norm(part) for part in _place_line(location).split(",")]
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+
+    last = parts[-1].split()
+    if len(last) > 1 and last[-1] in _areas and parts[-1] not in _areas:
+        # "Las Vegas NV" without the comma.
+        qualifier, words = last[-1], last[:-1]
+    elif len(parts) > 1:
+        qualifier, words = parts[-1], parts[-2].split()
+    else:
+        qualifier, words = None, last
+    code = _codes.get(qualifier, qualifier)
+
+    # Try the longest trailing run of words first, so "Suite 120 Las Vegas" finds "las vegas".
+    names = [" ".join(words[i:]) for i in range(len(words))]
+    for name in names:
+        if qualifier and (name, code) in _cities:
+            return _cities[(name, code)]
+    if qualifier and qualifier in _areas:
+        return None # A known state or country, but not a city we know there.
+    for name in names:
+        if name in _cities:
+            return _cities[name]
+    return None
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION):
+    """Standard base-32 geohash of a point."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit_count, even, out = 0, 0, True, []
+    while len(out) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            out.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(out)
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _cell_degrees(precision: int):
+    """(lat, lon) size in degrees of a geohash cell at this precision."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def cover_prefixes(lat: float, lon: float, radius_km: float):
+    """
+    Geohash prefixes whose cells together cover every point within radius_km:
+    the cell holding the point plus its 8 neighbours, at the finest precision
+    whose cells are still at least radius_km across. [""] means "everything".
+    """
+    precision = 0
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        dlat, dlon = _cell_degrees(p)
+        height_km = dlat * 110.57
+        width_km = dlon * 111.32 * max(math.cos(math.radians(lat)), 1e-6)
+        if height_km >= radius_km and width_km >= radius_km:
+            precision = p
+            break
+    if precision == 0:
+        return [""]
+    dlat, dlon = _cell_degrees(precision)
+    prefixes = set()
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            nlat = max(-89.999999, min(89.999999, lat + i * dlat))
+            nlon = (lon + j * dlon + 180.0) % 360.0 - 180.0
+            prefixes.add(geohash_encode(nlat, nlon, precision))
+    return sorted(prefixes)
+
+def locate(location: str):
+    """Returns (lat, lon, geohash) for a location, or (None, None, '') if it can't be placed."""
+    point = geocode(location or "")
+    if point is None:
+        return None, None, ""
+    return point[0], point[1], geohash_encode(*point)
@@ -0,0 +1,117 @@
+import re
+import threading
+import os
+import sys
+
+# Add the parent directory to the path to find other modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+# Budgets are in (estimated) LLM tokens.
+HISTORY_TOKEN_BUDGET = getattr(config, "HISTORY_TOKEN_BUDGET", 1200)
+SUMMARY_TOKEN_BUDGET = getattr(config, "HISTORY_SUMMARY_TOKEN_BUDGET", 250)
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str):
+    """
+    Cheap token estimate: one token per word or punctuation mark, which tracks
+    llama3's tokenizer closely enough for budgeting English chat.
+    """
+    return len(_TOKEN_PATTERN.findall(text))
+
+def _truncate_to_budget(text: str, budget: int):
+    """Keeps the most recent part of `text` that fits in `budget` tokens."""
+    tokens = list(_TOKEN_PATTERN.finditer(text))
+    if len(tokens) <= budget:
+        return text
+    return "..." + text[tokens[-budget].start():]
+
+
+class ConversationHistory:
+    """
+    Short-term conversational memory with a bounded prompt size.
+
+    The most recent turns are kept verbatim up to `token_budget`. Older turns
+    are folded into a running summary, which is updated by the LLM on a
+    background thread so that no turn ever waits on it.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summary_budget: int = SUMMARY_TOKEN_BUDGET, summarize: bool = True):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.summarize = summarize
+        self.summary = ""
+        self._turns = []          # [(line, tokens)]
+        self._turn_tokens = 0
+        self._folded = []         # lines waiting to be merged into the summary
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def add(self, line: str):
+        """Appends a turn, folding the oldest turns away once over budget."""
+        tokens = estimate_tokens(line)
+        with self._lock:
+            self._turns.append((line, tokens))
+            self._turn_tokens += tokens
+            while self._turn_tokens > self.token_budget and len(self._turns) > 1:
+                old_line, old_tokens = self._turns.pop(0)
+                self._turn_tokens -= old_tokens
+                self._folded.append(old_line)
+            needs_summary = bool(self._folded)
+        if needs_summary:
+            self._schedule_summary()
+
+    def render(self):
+        """The history block to put in front of the current prompt."""
+        with self._lock:
+            lines = [line for line, _ in self._turns]
+            summary = self.summary
+        if summary:
+            return f"[Summary of earlier conversation: {summary}]\n" + "\n".join(lines)
+        return "\n".join(lines)
+
+    def token_count(self):
+        """Estimated tokens that render() currently produces."""
+        with self._lock:
+            return self._turn_tokens + estimate_tokens(self.summary)
+
+    def _schedule_summary(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return # The running worker picks up the new lines when it loops.
+            self._worker = threading.Thread(target=self._summarize_pending, name="history-summary", daemon=True)
+            self._worker.start()
+
+    def _summarize_pending(self):
+        """Merges folded turns into the summary until none are left."""
+        while True:
+            with self._lock:
+                if not self._folded:
+                    return
+                folded, self._folded = self._folded, []
+                previous = self.summary
+            updated = self._merge_summary(previous, folded)
+            with self._lock:
+                self.summary = _truncate_to_budget(updated, self.summary_budget)
+
+    def _merge_summary(self, previous: str, lines: list):
+        """Asks the LLM to fold `lines` into `previous`; falls back to plain truncation."""
+        fallback = " ".join(filter(None, [previous] + lines))
+        if not self.summarize:
+            return fallback
+
+        summary_prompt = (
+            f"You are maintaining a running summary of a conversation between Kyle and Umbra. "
+            f"Update the summary with the new lines below. Keep names, places, decisions and open requests. "
+            f"Respond with the conversation tool, giving the updated summary in under {self.summary_budget} words.\n\n"
+            f"--- CURRENT SUMMARY ---\n{previous or '(none)'}\n\n"
+            f"--- NEW LINES ---\n" + "\n".join(lines)
+        )
+        from agents import llm_agent # Imported here so creating a history doesn't load the LLM client.
+        llm_response = llm_agent.decide_tool(summary_prompt)
+        decision = llm_response.get("decision")
+        if not llm_response.get("error") and decision and decision.get("tool") == "conversation" and decision.get("args"):
+            return " ".join(map(str, decision["args"]))
+        return fallback
@@ -0,0 +1,272 @@
+import sqlite3
+import hashlib
+import json
+import time
+import threading
+import os
+import sys
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Add the parent directory to the path to find the 'config' module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from agents import metrics
+
+# Shared HTTP layer for the agents: one keep-alive session, explicit timeouts,
+# and a persistent response cache with a TTL per endpoint. Fresh hits come
+# from an in-process LRU, so they cost microseconds instead of a round trip.
+
+CACHE_DB_PATH = getattr(config, "HTTP_CACHE_PATH", "http_cache.db")
+# Set to False in config.py to disable the response cache everywhere.
+CACHE_ENABLED = getattr(config, "HTTP_CACHE_ENABLED", True)
+# (connect, read) timeout in seconds for every request.
+TIMEOUT = getattr(config, "HTTP_TIMEOUT", (5, 20))
+# Seconds a cached response stays fresh, per endpoint. Endpoints not listed aren't cached.
+ENDPOINT_TTLS = {
+    "weather": 10 * 60,
+    "search": 24 * 3600,
+    **getattr(config, "HTTP_CACHE_TTLS", {}),
+}
+# After expiring, a response is still served for this many more seconds while
+# a background refresh fetches a new one (stale-while-revalidate).
+STALE_SECONDS = getattr(config, "HTTP_CACHE_STALE_SECONDS", 3600)
+# Point every request at a local stand-in server (see stub_server.py) instead of the real APIs.
+BASE_URL_OVERRIDE = getattr(config, "HTTP_BASE_URL_OVERRIDE", None)
+
+# Request fields that are credentials, not part of what is being asked.
+_SECRET_FIELDS = {"api_key", "appid", "key", "x-goog-api-key", "authorization"}
+# Request headers that change the response and so belong in the cache key.
+_KEYED_HEADERS = {"x-goog-fieldmask"}
+
+_MEMORY_MAX_ENTRIES = 512
+# Drop expired responses every this many stores. Each process also prunes once
+# when it first opens the cache, since short-lived runs may never get there.
+_PRUNE_INTERVAL = 50
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+_db_lock = threading.Lock()
+_db = None
+_memory = OrderedDict() # key -> (fetched_at, data)
+_memory_lock = threading.Lock()
+_refreshing = set() # keys with a background refresh in flight
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0, "expired": 0}
+_stores = 0 # responses written by this process, guarded by _db_lock
+_stats_lock = threading.Lock()
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        _stats[name] += amount
+    metrics.inc("umbra_cache_events_total", amount, cache="http", event=name)
+
+def get_session():
+    """Returns the shared pooled session, creating it on first use."""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                pool_size = getattr(config, "HTTP_POOL_SIZE", 8)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _SESSION = session
+    return _SESSION
+
+def _resolve_url(url: str):
+    if not BASE_URL_OVERRIDE:
+        return url
+    base = urlsplit(BASE_URL_OVERRIDE)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+def _normalize(value):
+    """Case- and whitespace-insensitive form of a request value, without credentials."""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items()) if k.lower() not in _SECRET_FIELDS}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def make_key(method: str, url: str, params: dict = None, json_body: dict = None, headers: dict = None):
+    """Hashes the normalized request into a cache key."""
+    keyed_headers = {k.lower(): v for k, v in (headers or {}).items() if k.lower() in _KEYED_HEADERS}
+    material = json.dumps(
+        [method.upper(), url, _normalize(params or {}), _normalize(json_body), keyed_headers],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def _get_db():
+    global _db
+    if _db is None:
+        conn = sqlite3.connect(CACHE_DB_PATH, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_endpoint ON responses(endpoint, fetched_at)")
+        conn.commit()
+        _prune(conn, time.time())
+        _db = conn
+    return _db
+
+def _prune(conn, now: float):
+    """Deletes responses too old to be served even stale, and ones for endpoints no longer cached."""
+    expired = 0
+    for endpoint, ttl in ENDPOINT_TTLS.items():
+        expired += conn.execute(
+            "DELETE FROM responses WHERE endpoint = ? AND fetched_at < ?",
+            (endpoint, now - ttl - STALE_SECONDS)
+        ).rowcount
+    cached = [endpoint for endpoint, ttl in ENDPOINT_TTLS.items() if ttl]
+    expired += conn.execute(
+        f"DELETE FROM responses WHERE endpoint NOT IN ({', '.join('?' * len(cached))})", cached
+    ).rowcount
+    conn.commit()
+    if expired:
+        _count("expired", expired)
+
+def _remember(key: str, fetched_at: float, data):
+    with _memory_lock:
+        _memory[key] = (fetched_at, data)
+        _memory.move_to_end(key)
+        while len(_memory) > _MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+def _lookup(key: str):
+    """Returns (fetched_at, data) from memory or disk, or None."""
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+            return entry
+    try:
+        with _db_lock:
+            row = _get_db().execute("SELECT fetched_at, body FROM responses WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"   - [HTTP Cache] Lookup failed: {e}")
+        return None
+    if row is None:
+        return None
+    entry = (row[0], json.loads(row[1]))
+    _remember(key, *entry)
+    return entry
+
+def _store(key: str, endpoint: str, data):
+    global _stores
+    fetched_at = time.time()
+    _remember(key, fetched_at, data)
+    try:
+        with _db_lock:
+            conn = _get_db()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, endpoint, json.dumps(data), fetched_at)
+            )
+            conn.commit()
+            _stores += 1
+            if _stores % _PRUNE_INTERVAL == 0:
+                _prune(conn, fetched_at)
+    except sqlite3.Error as e:
+        print(f"   - [HTTP Cache] Store failed: {e}")
+
+def _fetch(method: str, url: str, params, json_body, headers, timeout):
+    api = urlsplit(url).netloc
+    try:
+        with metrics.timer("umbra_http_request_seconds", api=api):
+            response = get_session().request(method, _resolve_url(url), params=params, json=json_body,
+                                             headers=headers, timeout=timeout or TIMEOUT)
+        response.raise_for_status() # Callers handle HTTPError exactly as with a bare requests call.
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        metrics.inc("umbra_http_errors_total", api=api)
+        raise
+
+def _refresh_in_background(key, endpoint, method, url, params, json_body, headers, timeout):
+    with _memory_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _store(key, endpoint, _fetch(method, url, params, json_body, headers, timeout))
+            _count("refreshes")
+        except Exception as e:
+            _count("errors")
+            print(f"   - [HTTP Cache] Background refresh of '{endpoint}' failed: {e}")
+        finally:
+            with _memory_lock:
+                _refreshing.discard(key)
+    threading.Thread(target=run, daemon=True).start()
+
+def request_json(method: str, url: str, endpoint: str = None, params: dict = None,
+                 json_body: dict = None, headers: dict = None, timeout=None):
+    """
+    Sends a request through the shared session and returns the decoded JSON.
+    If `endpoint` names an entry in ENDPOINT_TTLS, the response is cached:
+    fresh entries are returned directly, stale ones are returned while a
+    refresh runs in the background. Raises requests exceptions like requests does.
+    """
+    ttl = ENDPOINT_TTLS.get(endpoint)
+    if not CACHE_ENABLED or not ttl:
+        return _fetch(method, url, params, json_body, headers, timeout)
+
+    key = make_key(method, url, params, json_body, headers)
+    entry = _lookup(key)
+    if entry is not None:
+        age = time.time() - entry[0]
+        if age < ttl:
+            _count("hits")
+            return entry[1]
+        if age < ttl + STALE_SECONDS:
+            _count("stale_hits")
+            _refresh_in_background(key, endpoint, method, url, params, json_body, headers, timeout)
+            return entry[1]
+
+    _count("misses")
+    data = _fetch(method, url, params, json_body, headers, timeout)
+    _store(key, endpoint, data)
+    return data
+
+def get_json(url: str, endpoint: str = None, params: dict = None, headers: dict = None, timeout=None):
+    return request_json("GET", url, endpoint, params=params, headers=headers, timeout=timeout)
+
+def post_json(url: str, json_body: dict, endpoint: str = None, headers: dict = None, timeout=None):
+    return request_json("POST", url, endpoint, json_body=json_body, headers=headers, timeout=timeout)
+
+def clear_http_cache(endpoint: str = None):
+    """Deletes cached responses (for one endpoint, or all of them)."""
+    with _memory_lock:
+        _memory.clear()
+    with _db_lock:
+        conn = _get_db()
+        if endpoint:
+            deleted = conn.execute("DELETE FROM responses WHERE endpoint = ?", (endpoint,)).rowcount
+        else:
+            deleted = conn.execute("DELETE FROM responses").rowcount
+        conn.commit()
+    return deleted
+
+def get_http_cache_stats():
+    """Hit/miss counters plus the number of stored responses per endpoint."""
+    try:
+        with _db_lock:
+            rows = _get_db().execute("SELECT endpoint, COUNT(*) FROM responses GROUP BY endpoint").fetchall()
+    except sqlite3.Error:
+        rows = []
+    with _stats_lock:
+        stats = dict(_stats)
+    return {**stats, "entries": dict(rows)}
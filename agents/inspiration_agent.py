@@ -6,7 +6,7 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 # Import the specific tool we need from another agent
-from agents.knowledge_agent import tavily_search
+from agents.knowledge_agent import search_many
 import config
 
 def get_daily_quote():
@@ -22,15 +22,18 @@ def get_daily_quote():
         print(f"   - Searching for a quote from {author}...")
         query = f"profound or inspirational quote by {author} about life, work, or mindset"
         
-        # 3. Use the knowledge_agent's tool to perform the search
-        search_result = tavily_search(query)
+        # 3. Use the knowledge_agent's search to get structured results
+        search_result = search_many([query])[0]
         
         # 4. Clean up the result and format it
-        if "No search results found" in search_result:
+        if search_result["error"]:
+            print(f"   - {search_result['error']}")
+            return "Could not find a quote today due to an error."
+        if not search_result["results"] and not search_result["answer"]:
             return "Could not find a quote today. The web is quiet."
         
         # Take the first search result, which is usually the most relevant
-        first_result = search_result.split('\n- ')[1] 
+        first_result = search_result["results"][0]["content"] if search_result["results"] else search_result["answer"]
         
         return f'"{first_result.strip()}"\n   - {author}'
 
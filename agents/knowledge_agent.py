@@ -1,11 +1,14 @@
 import sys
 import os
 import requests
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Add the parent directory to the path to find the 'config' module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import config
+from agents import http_client
+from agents import tracing
 
 def get_weather(location=None):
     """Gets the current weather for a specified location."""
@@ -20,9 +23,8 @@ def get_weather(location=None):
         "units": "imperial" 
     }
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
-        data = response.json()
+        # Cached for a few minutes; raises an HTTPError for bad responses (4xx or 5xx)
+        data = http_client.get_json(base_url, endpoint="weather", params=params)
         
         weather_desc = data['weather'][0]['description']
         temp = data['main']['temp']
@@ -36,6 +38,20 @@ def get_weather(location=None):
         return f"An unexpected error occurred: {e}"
 
 
+_TAVILY_URL = "https://api.tavily.com/search"
+
+def _search(query: str, max_results: int = 5):
+    """Runs one Tavily search and returns the decoded response."""
+    payload = {
+        "api_key": config.TAVILY_API_KEY,
+        "query": query,
+        "search_depth": "basic",
+        "include_answer": True,
+        "max_results": max_results
+    }
+    # Repeated queries (briefing, quotes, concerts, research) are served from the cache.
+    return http_client.post_json(_TAVILY_URL, payload, endpoint="search")
+
 def tavily_search(*args):
     """
     Performs a web search using the Tavily API.
@@ -47,21 +63,8 @@ def tavily_search(*args):
     if not query:
         return "Search query cannot be empty."
 
-    api_key = config.TAVILY_API_KEY
-    url = "https://api.tavily.com/search"
-    payload = {
-        "api_key": api_key,
-        "query": query,
-        "search_depth": "basic",
-        "include_answer": True,
-        "max_results": 5
-    }
-    headers = {"Content-Type": "application/json"}
-
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        data = response.json()
+        data = _search(query)
         
         # Format the results into a clean string
         if "answer" in data and data["answer"]:
@@ -73,4 +76,75 @@ def tavily_search(*args):
             return "No search results found."
 
     except requests.exceptions.RequestException as e:
-        return f"Error performing search: {e}"
\ No newline at end of file
+        return f"Error performing search: {e}"
+
+
+# --- NEW: Concurrent multi-query search ---
+SEARCH_MAX_WORKERS = getattr(config, "SEARCH_MAX_WORKERS", 4)
+
+_search_pool = None
+_inflight = {} # normalized query -> Future shared by every caller asking it
+_inflight_lock = threading.Lock()
+
+def _get_search_pool():
+    global _search_pool
+    with _inflight_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+    return _search_pool
+
+def _structured_result(query: str, data: dict = None, error: str = None):
+    data = data or {}
+    return {
+        "query": query,
+        "answer": data.get("answer") or None,
+        "results": [
+            {"title": res.get("title", ""), "url": res.get("url", ""), "content": res.get("content", "")}
+            for res in data.get("results") or []
+        ],
+        "error": error,
+    }
+
+def _search_future(query: str, max_results: int):
+    """Starts a search, or joins the one already running for the same query."""
+    key = (" ".join(query.split()).casefold(), max_results)
+    pool = _get_search_pool()
+    with _inflight_lock:
+        future = _inflight.get(key)
+        started = future is None
+        if started:
+            future = pool.submit(tracing.bind(_search), query, max_results)
+            _inflight[key] = future
+    if started:
+        # Registered outside the lock: a search that has already finished (a
+        # cache hit) runs the callback right here, and it takes the lock itself.
+        future.add_done_callback(lambda f: _drop_inflight(key, f))
+    return future
+
+def _drop_inflight(key, future):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+def search_many(queries, max_results: int = 5, timeout: float = None):
+    """
+    Runs several searches concurrently on a bounded worker pool and returns one
+    structured result per query, in the same order:
+    {"query", "answer", "results": [{"title", "url", "content"}], "error"}.
+    Identical queries (including ones already in flight from another caller)
+    are only sent once.
+    """
+    queries = [str(q).strip() for q in queries]
+    futures = [_search_future(q, max_results) if q else None for q in queries]
+    results = []
+    for query, future in zip(queries, futures):
+        if future is None:
+            results.append(_structured_result(query, error="Search query cannot be empty."))
+            continue
+        try:
+            results.append(_structured_result(query, future.result(timeout=timeout)))
+        except FutureTimeoutError:
+            results.append(_structured_result(query, error="Search timed out."))
+        except Exception as e:
+            results.append(_structured_result(query, error=f"Error performing search: {e}"))
+    return results
@@ -2,6 +2,17 @@ import sys
 import os
 import sqlite3
 import datetime
+import hashlib
+import uuid
+import re
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError: # Aggregates fall back to the statistics module.
+    np = None
 
 # Add the parent directory to the path to find other agents
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,61 +32,476 @@ def _initialize_learning_log():
             source TEXT 
         )
     """)
+    # --- NEW: Incremental research bookkeeping ---
+    # Every source already synthesized, by URL and by content hash (the same
+    # article is often syndicated under several URLs).
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingested_sources (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            learning_id INTEGER,
+            ingested_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingested_sources_hash ON ingested_sources(content_hash)")
+    # One row per topic per run, so a crashed run resumes where it stopped.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS research_checkpoints (
+            run_id TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            learning_id INTEGER,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (run_id, topic)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_research_checkpoints_status ON research_checkpoints(status, run_id)")
+    # Whether a topic's insight has reached the memory database. Logs from
+    # before this column existed were logged by the run that produced them.
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(research_checkpoints)")}
+    if "memory_logged" not in columns:
+        cursor.execute("ALTER TABLE research_checkpoints ADD COLUMN memory_logged INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE research_checkpoints SET memory_logged = 1")
+    # --- NEW: Typed price time series for market research ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_observations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item TEXT NOT NULL,
+            price REAL NOT NULL,
+            currency TEXT NOT NULL,
+            observed_at TEXT NOT NULL,
+            source_url TEXT NOT NULL DEFAULT '',
+            fetched_at TEXT NOT NULL,
+            UNIQUE (item, observed_at, price, currency, source_url)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_observations_item_date ON price_observations(item, observed_at)")
+    # A sale is identified without its date: undated listings are stamped with
+    # the day they were fetched, so each refresh would otherwise add them again.
+    # Logs from before this index keep their earliest copy of each sale.
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_price_observations_sale'").fetchone() is None:
+        cursor.execute("""
+            DELETE FROM price_observations WHERE id NOT IN (
+                SELECT MIN(id) FROM price_observations GROUP BY item, price, currency, source_url
+            )
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX idx_price_observations_sale
+            ON price_observations(item, price, currency, source_url)
+        """)
     conn.commit()
     conn.close()
 
-# Initialize the database when the agent is loaded
-_initialize_learning_log()
+_log_ready = False
+
+def _connect(timeout: float = 5.0):
+    """Opens the learning log, creating its tables on first use."""
+    global _log_ready
+    if not _log_ready:
+        _initialize_learning_log()
+        _log_ready = True
+    return sqlite3.connect(config.LEARNING_LOG_PATH, timeout=timeout)
+
+# Topics researched by the morning routine.
+RESEARCH_TOPICS = getattr(config, "RESEARCH_TOPICS", ["finance books"])
+# How many topics are synthesized by the LLM at the same time.
+RESEARCH_MAX_WORKERS = getattr(config, "RESEARCH_MAX_WORKERS", 2)
+# How many search results are read per topic.
+RESEARCH_RESULTS_PER_TOPIC = getattr(config, "RESEARCH_RESULTS_PER_TOPIC", 5)
+# An interrupted run is only resumed within this many hours; after that a fresh run starts.
+RESEARCH_RESUME_HOURS = getattr(config, "RESEARCH_RESUME_HOURS", 12)
+
+def _content_hash(text: str):
+    return hashlib.sha256(" ".join(text.split()).casefold().encode('utf-8')).hexdigest()
+
+def _llm_summary(prompt: str, fallback: str):
+    """
+    Asks the LLM for a conversational answer and returns its text, or None
+    if the LLM couldn't be reached (its canned error reply isn't a summary).
+    """
+    llm_response = llm_agent.decide_tool(prompt)
+    if llm_response.get("error"):
+        return None
+    thought = llm_response.get("thought", "Analysis failed.")
+    decision = llm_response.get("decision")
+    if decision and decision.get("tool") == "conversation":
+        return " ".join(map(str, decision.get("args", [fallback])))
+    return f"{fallback} Raw thought: {thought}"
+
+def _new_material(conn, results):
+    """Drops search results whose URL or content has already been ingested."""
+    fresh, seen_hashes = [], set()
+    for result in results:
+        content = result.get("content", "").strip()
+        if not content:
+            continue
+        digest = _content_hash(content)
+        if digest in seen_hashes:
+            continue
+        known = conn.execute(
+            "SELECT 1 FROM ingested_sources WHERE url = ? OR content_hash = ? LIMIT 1",
+            (result.get("url") or digest, digest)
+        ).fetchone()
+        if known is None:
+            seen_hashes.add(digest)
+            fresh.append({**result, "content_hash": digest})
+    return fresh
+
+def _start_or_resume_run(topics):
+    """
+    Returns (run_id, pending_topics), resuming the last run if it was
+    interrupted recently. Topics that failed (search error, LLM down) are
+    marked 'failed' rather than left pending, so they don't keep an old run
+    alive: the next day's run starts fresh and researches every topic again.
+    """
+    now = datetime.datetime.now()
+    resume_cutoff = (now - datetime.timedelta(hours=RESEARCH_RESUME_HOURS)).isoformat()
+    now = now.isoformat()
+    conn = _connect()
+    try:
+        placeholders = ", ".join("?" for _ in topics)
+        row = conn.execute(
+            f"SELECT run_id FROM research_checkpoints WHERE status = 'pending' AND updated_at >= ? "
+            f"AND topic IN ({placeholders}) ORDER BY updated_at DESC LIMIT 1", [resume_cutoff, *topics]
+        ).fetchone()
+        if row:
+            run_id = row[0]
+            # Topics added to the config since the crash join the resumed run.
+            conn.executemany(
+                "INSERT OR IGNORE INTO research_checkpoints (run_id, topic, updated_at) VALUES (?, ?, ?)",
+                [(run_id, topic, now) for topic in topics]
+            )
+            print(f"   - Resuming unfinished research run {run_id}.")
+        else:
+            run_id = uuid.uuid4().hex[:12]
+            conn.executemany(
+                "INSERT INTO research_checkpoints (run_id, topic, updated_at) VALUES (?, ?, ?)",
+                [(run_id, topic, now) for topic in topics]
+            )
+        conn.commit()
+        pending = [r[0] for r in conn.execute(
+            "SELECT topic FROM research_checkpoints WHERE run_id = ? AND status IN ('pending', 'failed')", (run_id,)
+        )]
+    finally:
+        conn.close()
+    return run_id, [topic for topic in topics if topic in pending]
 
+def _mark_failed(run_id: str, topic: str):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE research_checkpoints SET status = 'failed', updated_at = ? WHERE run_id = ? AND topic = ?",
+            (datetime.datetime.now().isoformat(), run_id, topic)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _synthesize_topic(run_id: str, topic: str, results):
+    """
+    Summarizes only the material not seen before, then stores the learning,
+    the ingested sources and the checkpoint in one transaction.
+    Returns the insight, or None if there was nothing new. Raises if the LLM
+    is unavailable; nothing is stored, so the sources are summarized later.
+    """
+    conn = _connect(timeout=30)
+    try:
+        fresh = _new_material(conn, results)
+        insight, learning_id = None, None
+        now = datetime.datetime.now().isoformat()
+        if fresh:
+            print(f"   - {topic}: synthesizing {len(fresh)} new source(s)...")
+            material = "\n".join(f"- {r['content']} ({r.get('url', '')})" for r in fresh)
+            insight = _llm_summary(
+                f"You are a research assistant. In two or three sentences, tell Kyle the most useful new "
+                f"insight about '{topic}' from these sources.\n\nSOURCES:\n---\n{material}\n---",
+                "Research was inconclusive."
+            )
+            if insight is None:
+                raise RuntimeError("the LLM is unavailable")
+            cursor = conn.execute(
+                "INSERT INTO learnings (timestamp, topic, summary, source) VALUES (?, ?, ?, ?)",
+                (now, topic, insight, ", ".join(r.get("url", "") for r in fresh if r.get("url")))
+            )
+            learning_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO ingested_sources (url, content_hash, topic, learning_id, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(r.get("url") or r["content_hash"], r["content_hash"], topic, learning_id, now) for r in fresh]
+            )
+        else:
+            print(f"   - {topic}: nothing new since the last run.")
+        conn.execute(
+            "UPDATE research_checkpoints SET status = 'done', learning_id = ?, updated_at = ? WHERE run_id = ? AND topic = ?",
+            (learning_id, now, run_id, topic)
+        )
+        conn.commit()
+        return insight
+    finally:
+        conn.close()
+
+def run_research(topics=None):
+    """
+    Researches every topic (RESEARCH_TOPICS by default): all searches run
+    concurrently, and only sources not ingested on an earlier run are sent
+    to the LLM. Progress is checkpointed per topic, so calling this again
+    after a crash picks up the unfinished topics. Returns [(topic, insight)]
+    for the topics that produced a new insight.
+    """
+    topics = list(dict.fromkeys(topics or RESEARCH_TOPICS))
+    run_id, pending = _start_or_resume_run(topics)
+    if not pending:
+        return []
+    print(f"   - Researching {len(pending)} topic(s): {', '.join(pending)}")
+
+    queries = [f"latest news, research and insights about {topic}" for topic in pending]
+    searches = knowledge_agent.search_many(queries, max_results=RESEARCH_RESULTS_PER_TOPIC)
+
+    insights = []
+    with ThreadPoolExecutor(max_workers=RESEARCH_MAX_WORKERS, thread_name_prefix="research") as pool:
+        futures = {}
+        for topic, search in zip(pending, searches):
+            if search["error"]:
+                print(f"   - {topic}: {search['error']}; it will be retried on the next run.")
+                _mark_failed(run_id, topic)
+                continue
+            futures[topic] = pool.submit(_synthesize_topic, run_id, topic, search["results"])
+        for topic, future in futures.items():
+            try:
+                insight = future.result()
+            except Exception as e:
+                print(f"   - {topic}: research failed ({e}); it will be retried on the next run.")
+                _mark_failed(run_id, topic)
+                continue
+            if insight:
+                insights.append((topic, insight))
+    return insights
+
+def unlogged_insights():
+    """
+    Insights that were saved to the learning log but haven't been logged to
+    memory yet, e.g. because the process stopped in between. Returns
+    [(run_id, topic, insight)], oldest first.
+    """
+    conn = _connect()
+    try:
+        return conn.execute("""
+            SELECT c.run_id, c.topic, l.summary FROM research_checkpoints c
+            JOIN learnings l ON l.id = c.learning_id
+            WHERE c.status = 'done' AND c.memory_logged = 0
+            ORDER BY l.id
+        """).fetchall()
+    finally:
+        conn.close()
+
+def mark_insight_logged(run_id: str, topic: str):
+    conn = _connect()
+    try:
+        conn.execute("UPDATE research_checkpoints SET memory_logged = 1 WHERE run_id = ? AND topic = ?", (run_id, topic))
+        conn.commit()
+    finally:
+        conn.close()
+
+def research_and_learn(topic: str):
+    """Researches a single topic and returns the new insight, or None if nothing new was found."""
+    results = run_research([topic])
+    # The caller gets the insight directly; it isn't queued for the morning routine's memory log.
+    for run_id, logged_topic, _ in unlogged_insights():
+        if logged_topic == topic:
+            mark_insight_logged(run_id, topic)
+    return results[0][1] if results else None
+
+
+# --- NEW: Deterministic price extraction and a price time series ---
+# How long stored observations are trusted before an item is searched again.
+PRICE_REFRESH_HOURS = getattr(config, "PRICE_REFRESH_HOURS", 24)
+# Only observations this recent feed the aggregates.
+PRICE_WINDOW_DAYS = getattr(config, "PRICE_WINDOW_DAYS", 90)
+
+_CURRENCY_SYMBOLS = {"$": "USD", "US$": "USD", "£": "GBP", "€": "EUR", "C$": "CAD", "CA$": "CAD", "A$": "AUD", "¥": "JPY"}
+_AMOUNT = r"\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?"
+_PRICE_PATTERN = re.compile(
+    r"(?P<symbol>US\$|CA\$|C\$|A\$|[$£€¥])\s?(?P<amount>" + _AMOUNT + r")"
+    r"|(?P<amount2>" + _AMOUNT + r")\s?(?P<code>USD|EUR|GBP|CAD|AUD|JPY)\b"
+)
+# Amounts right before one of these words aren't sale prices.
+_NOT_A_PRICE = re.compile(r"\s*(?:\+\s*)?(?:shipping|postage|delivery|off\b|coupon|/mo\b|per month)", re.IGNORECASE)
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+_DATE_PATTERN = re.compile(
+    r"(?P<iso>\b\d{4}-\d{2}-\d{2}\b)"
+    r"|(?P<us>\b\d{1,2}/\d{1,2}/\d{2,4}\b)"
+    r"|\b(?P<mon>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})\b"
+    r"|\b(?P<day2>\d{1,2})\s+(?P<mon2>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+(?P<year2>\d{4})\b",
+    re.IGNORECASE
+)
+
+def _normalize_item(item_name: str):
+    return " ".join(item_name.split()).casefold()
+
+def _parse_date(match):
+    try:
+        if match.group("iso"):
+            return datetime.date.fromisoformat(match.group("iso"))
+        if match.group("us"):
+            month, day, year = (int(p) for p in match.group("us").split("/"))
+            return datetime.date(year + 2000 if year < 100 else year, month, day)
+        if match.group("mon"):
+            return datetime.date(int(match.group("year")), _MONTHS[match.group("mon").lower()], int(match.group("day")))
+        return datetime.date(int(match.group("year2")), _MONTHS[match.group("mon2").lower()], int(match.group("day2")))
+    except ValueError:
+        return None
+
+def extract_prices(text: str, default_date: datetime.date = None):
+    """
+    Pulls (price, currency, observed_on) out of free text. Each price is
+    dated with the nearest date mentioned in the same text (default_date if
+    there is none; the log keeps the first date a sale was seen under).
+    Shipping costs, discounts and monthly prices are skipped.
+    """
+    default_date = default_date or datetime.date.today()
+    dates = [(m.start(), d) for m in _DATE_PATTERN.finditer(text) if (d := _parse_date(m)) and d <= datetime.date.today()]
+    prices = []
+    for match in _PRICE_PATTERN.finditer(text):
+        if _NOT_A_PRICE.match(text, match.end()):
+            continue
+        amount = float((match.group("amount") or match.group("amount2")).replace(",", ""))
+        if amount <= 0:
+            continue
+        currency = _CURRENCY_SYMBOLS.get(match.group("symbol")) or match.group("code") or "USD"
+        observed_on = min(dates, key=lambda d: abs(d[0] - match.start()))[1] if dates else default_date
+        prices.append((amount, currency, observed_on))
+    return prices
+
+def _store_observations(item: str, results):
+    """Extracts prices from search results into price_observations; returns how many were new."""
+    today = datetime.date.today()
+    fetched_at = datetime.datetime.now().isoformat()
+    rows = []
+    for result in results:
+        for price, currency, observed_on in extract_prices(result.get("content", ""), today):
+            rows.append((item, price, currency, observed_on.isoformat(), result.get("url", ""), fetched_at))
+    conn = _connect()
+    try:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO price_observations (item, price, currency, observed_at, source_url, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
+def _load_observations(item: str, since: str):
+    conn = _connect()
+    try:
+        return conn.execute(
+            "SELECT price, currency, observed_at FROM price_observations "
+            "WHERE item = ? AND observed_at >= ? ORDER BY observed_at", (item, since)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def _last_fetched(item: str):
+    conn = _connect()
+    try:
+        return conn.execute("SELECT MAX(fetched_at) FROM price_observations WHERE item = ?", (item,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def price_statistics(observations):
+    """
+    Aggregates (price, currency, observed_at) rows in the most common currency:
+    count, mean, median, p10/p25/p75/p90, min, max and a least-squares trend
+    (change per 30 days). Returns None if there are no observations.
+    """
+    if not observations:
+        return None
+    currencies = Counter(currency for _, currency, _ in observations)
+    currency = currencies.most_common(1)[0][0]
+    rows = [(price, observed_at) for price, cur, observed_at in observations if cur == currency]
+    first_day = datetime.date.fromisoformat(min(day for _, day in rows))
+    days = [(datetime.date.fromisoformat(day) - first_day).days for _, day in rows]
+    prices = [price for price, _ in rows]
+
+    if np is not None:
+        values = np.asarray(prices, dtype=float)
+        p10, p25, median, p75, p90 = np.percentile(values, [10, 25, 50, 75, 90])
+        mean = float(values.mean())
+        x = np.asarray(days, dtype=float)
+        slope = float(np.polyfit(x, values, 1)[0]) if len(set(days)) > 1 else 0.0
+    else:
+        cuts = statistics.quantiles(prices, n=20, method="inclusive") if len(prices) > 1 else prices * 19
+        p10, p25, median, p75, p90 = cuts[1], cuts[4], statistics.median(prices), cuts[14], cuts[17]
+        mean = statistics.fmean(prices)
+        slope = statistics.linear_regression(days, prices).slope if len(set(days)) > 1 else 0.0
+
+    return {
+        "count": len(prices), "currency": currency, "mean": mean, "median": float(median),
+        "p10": float(p10), "p25": float(p25), "p75": float(p75), "p90": float(p90),
+        "min": min(prices), "max": max(prices),
+        "trend_per_30_days": slope * 30, "first_date": first_day.isoformat(), "last_date": max(day for _, day in rows),
+    }
+
+def _format_statistics(item_name: str, stats):
+    return (
+        f"{item_name}: {stats['count']} sales from {stats['first_date']} to {stats['last_date']}. "
+        f"Median {stats['median']:,.2f} {stats['currency']}, mean {stats['mean']:,.2f}, "
+        f"middle half {stats['p25']:,.2f}-{stats['p75']:,.2f}, range {stats['min']:,.2f}-{stats['max']:,.2f}, "
+        f"trend {stats['trend_per_30_days']:+,.2f} per 30 days."
+    )
 
 def research_market_trends(item_name: str):
     """
     This is an autonomous research tool. It researches the 'sold' listings for
-    an item on eBay, uses the LLM to analyze the data, and logs the findings.
+    an item on eBay, extracts the prices into a time series, computes the
+    statistics locally and has the LLM narrate them, then logs the findings.
     """
     print(f"   - Researching market trends for: {item_name}")
+    item = _normalize_item(item_name)
 
-    # 1. DISCOVER: Use the knowledge agent to find raw data
-    discover_prompt = f"Find the 5 most recent 'sold' listings for '{item_name}' on eBay.com. Include the price and date for each."
-    raw_data = knowledge_agent.tavily_search(discover_prompt)
-    
-    if "No search results found" in raw_data:
-        return f"Could not find any recent sold listings for '{item_name}'."
+    # 1. DISCOVER: reuse recent observations, otherwise search and extract prices
+    last_fetched = _last_fetched(item)
+    fresh_cutoff = (datetime.datetime.now() - datetime.timedelta(hours=PRICE_REFRESH_HOURS)).isoformat()
+    if last_fetched and last_fetched >= fresh_cutoff:
+        print("   - Using price observations stored earlier today.")
+    else:
+        discover_prompt = f"Find the 5 most recent 'sold' listings for '{item_name}' on eBay.com. Include the price and date for each."
+        search = knowledge_agent.search_many([discover_prompt], max_results=10)[0]
+        if search["error"]:
+            return f"Could not research '{item_name}': {search['error']}"
+        # Only the listings themselves: Tavily's synthesized answer quotes averages
+        # and ranges ("about $X-$Y") that would count as extra, undated sales.
+        added = _store_observations(item, search["results"])
+        print(f"   - Extracted {added} new price observation(s).")
 
-    # 2. SYNTHESIZE: Use the LLM to analyze the raw data
-    print("   - Synthesizing market analysis with LLM...")
-    synthesis_prompt = f"""
-    You are a market analyst. Based on the following raw data of recently sold eBay listings,
-    calculate the average sale price and provide a brief summary of the market activity for '{item_name}'.
+    # 2. ANALYZE: deterministic statistics over the stored time series
+    since = (datetime.date.today() - datetime.timedelta(days=PRICE_WINDOW_DAYS)).isoformat()
+    stats = price_statistics(_load_observations(item, since))
+    if stats is None:
+        return f"Could not find any recent sold listings for '{item_name}'."
+    facts = _format_statistics(item_name, stats)
 
-    RAW DATA:
-    ---
-    {raw_data}
-    ---
-    """
-    
-    llm_response = llm_agent.decide_tool(synthesis_prompt)
-    
-    # Extract the conversational response from the LLM's decision
-    thought = llm_response.get("thought", "Analysis failed.")
-    decision = llm_response.get("decision")
-    
-    if decision and decision.get("tool") == "conversation":
-        analysis_summary = " ".join(decision.get("args", ["Could not form a conclusion."]))
-    else:
-        analysis_summary = f"Analysis was inconclusive. Raw thought: {thought}"
+    # 3. NARRATE: the LLM only puts the finished numbers into words
+    print("   - Narrating market analysis with LLM...")
+    narration = _llm_summary(
+        f"You are a market analyst. In two sentences, summarize these eBay sold-listing statistics for Kyle. "
+        f"Use only these numbers; do not calculate anything new.\n\nSTATISTICS:\n{facts}",
+        facts
+    ) or facts
 
-    # 3. LOG: Save the structured findings to the learning log
+    # 4. LOG: Save the structured findings to the learning log
     print("   - Saving analysis to the Learning Log...")
-    conn = sqlite3.connect(config.LEARNING_LOG_PATH)
+    conn = _connect()
     cursor = conn.cursor()
     timestamp = datetime.datetime.now().isoformat()
     cursor.execute(
         "INSERT INTO learnings (timestamp, topic, summary, source) VALUES (?, ?, ?, ?)",
-        (timestamp, item_name, analysis_summary, "eBay Sold Listings")
+        (timestamp, item_name, f"{narration}\n{facts}", "eBay Sold Listings")
     )
     conn.commit()
     conn.close()
     
-    return f"Market research for '{item_name}' complete and logged."
-
+    return f"Market research for '{item_name}' complete and logged.\n{facts}"
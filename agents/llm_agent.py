@@ -1,63 +1,375 @@
 import requests
 import json
+import os
+import hashlib
+import threading
+import time
+from requests.adapters import HTTPAdapter
 import config
+from agents import llm_cache
+from agents import metrics
+from agents import tracing
+
+_PERSONA_PATH = 'personas/llm_agent_persona.md'
+_CONTEXT_PATH = 'context_profile.md'
+
+_MODEL = getattr(config, "OLLAMA_MODEL", "llama3")
+# How long Ollama should keep the model (and its evaluated system prompt) resident.
+_KEEP_ALIVE = getattr(config, "OLLAMA_KEEP_ALIVE", "30m")
+# Sampling options. Temperature 0.0 keeps decisions deterministic (and cacheable).
+_OPTIONS = {"temperature": 0.0}
 
 # This global variable will hold the combined system prompt after being loaded once.
 _SYSTEM_PROMPT = None
+# Short hash of the system prompt; changes whenever the persona or profile is edited.
+SYSTEM_PROMPT_VERSION = None
+# Modification times of the files the system prompt was built from.
+_SYSTEM_PROMPT_MTIMES = None
+
+# One pooled, keep-alive HTTP session shared by every call to Ollama.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def _get_session():
+    """Returns the shared Ollama session, creating it on first use."""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                pool_size = getattr(config, "OLLAMA_POOL_SIZE", 4)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _SESSION = session
+    return _SESSION
+
+def _chat_url():
+    """
+    The /api/chat endpoint. Sending the system prompt as a stable system message
+    lets Ollama reuse its already-evaluated KV cache for it on every turn.
+    """
+    chat_url = getattr(config, "OLLAMA_CHAT_URL", None)
+    if chat_url:
+        return chat_url
+    return config.OLLAMA_API_URL.replace("/api/generate", "/api/chat")
+
+def _source_mtimes():
+    """Modification times of the persona and profile files (None if missing)."""
+    mtimes = []
+    for path in (_PERSONA_PATH, _CONTEXT_PATH):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def _load_system_prompt():
+    """Reads the persona and context files and rebuilds the system prompt."""
+    global _SYSTEM_PROMPT, SYSTEM_PROMPT_VERSION, _SYSTEM_PROMPT_MTIMES
+    mtimes = _source_mtimes()
+    with open(_PERSONA_PATH, 'r', encoding='utf-8') as f:
+        persona = f.read()
+    with open(_CONTEXT_PATH, 'r', encoding='utf-8') as f:
+        context = f.read()
+
+    _SYSTEM_PROMPT = f"{persona}\n\n--- PRIME DIRECTIVE CONTEXT ---\n{context}"
+    SYSTEM_PROMPT_VERSION = hashlib.sha1(_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+    _SYSTEM_PROMPT_MTIMES = mtimes
 
 def initialize_llm_system():
     """
     Loads the persona and context files into a persistent system prompt.
+    Returns False if they are missing; the prompt stays unset, so every call
+    gets the configuration-error reply until the files exist.
     """
-    global _SYSTEM_PROMPT
     if _SYSTEM_PROMPT is not None:
         print("   - LLM system already initialized.")
         return True
 
     print("   - LLM is putting on its glasses...")
     try:
-        with open('personas/llm_agent_persona.md', 'r', encoding='utf-8') as f:
-            persona = f.read()
-        with open('context_profile.md', 'r', encoding='utf-8') as f:
-            context = f.read()
-
-        _SYSTEM_PROMPT = f"{persona}\n\n--- PRIME DIRECTIVE CONTEXT ---\n{context}"
+        _load_system_prompt()
         print("   - LLM glasses are on. System prompt initialized.")
         return True
     except FileNotFoundError as e:
         print(f"\n[CRITICAL ERROR] Could not initialize LLM. Missing file: {e.filename}")
-        _SYSTEM_PROMPT = "You are a helpful assistant." # Fallback
         return False
 
-def decide_tool(user_prompt: str):
+def _refresh_system_prompt():
     """
-    Consults the LLM to get a "thought" process and a final "decision" JSON.
+    Reloads the system prompt if the persona or context profile changed on disk
+    (e.g. after context_agent appends what it learned). The new prompt is a new
+    prefix, so Ollama re-evaluates it once and caches it again.
     """
-    if _SYSTEM_PROMPT is None:
-        if not initialize_llm_system():
-            return {"thought": "Critical system error.", "decision": {"tool": "conversation", "args": ["My core systems are not configured correctly."]}}
+    if _SYSTEM_PROMPT_MTIMES is None or _source_mtimes() == _SYSTEM_PROMPT_MTIMES:
+        return
+    try:
+        _load_system_prompt()
+        print("   - LLM context files changed. System prompt reloaded.")
+    except FileNotFoundError as e:
+        print(f"\n[WARNING] Could not reload LLM context. Missing file: {e.filename}")
 
-    full_prompt = f"{_SYSTEM_PROMPT}\n\nUser Prompt: \"{user_prompt}\"\n\nJSON Response:"
+def _ensure_system_prompt():
+    """Makes sure a current system prompt is loaded. Returns False if it couldn't be."""
+    if _SYSTEM_PROMPT is None:
+        return initialize_llm_system()
+    _refresh_system_prompt()
+    return True
 
-    try:
+def warm_up_llm(background: bool = True):
+    """
+    Loads the model and evaluates the system prompt ahead of the first real
+    turn, so the user's first prompt doesn't pay for it.
+    """
+    def _warm_up():
+        if not _ensure_system_prompt():
+            return
         payload = {
-            "model": "llama3",
-            "prompt": full_prompt,
-            "format": "json", # Tell Ollama to enforce JSON output
+            "model": _MODEL,
+            "messages": [{"role": "system", "content": _SYSTEM_PROMPT}],
             "stream": False,
-            "options": {"temperature": 0.0}
+            "keep_alive": _KEEP_ALIVE,
+            "options": {"temperature": 0.0, "num_predict": 1}
         }
-        response = requests.post(config.OLLAMA_API_URL, json=payload)
+        try:
+            _get_session().post(_chat_url(), json=payload).raise_for_status()
+            print("   - LLM warmed up. System prompt cached by Ollama.")
+        except requests.exceptions.RequestException as e:
+            print(f"   - LLM warm-up skipped: {e}")
+
+    if background:
+        threading.Thread(target=_warm_up, name="llm-warm-up", daemon=True).start()
+    else:
+        _warm_up()
+
+def _fallback_response(thought: str, message: str):
+    """
+    Builds a 'conversation' decision used whenever the LLM can't give a real one.
+    The "error" flag lets internal callers tell it apart from a real answer.
+    """
+    return {"thought": thought, "decision": {"tool": "conversation", "args": [message]}, "error": True}
+
+def _build_payload(user_prompt: str, stream: bool):
+    """Builds the Ollama request body shared by the blocking and streaming calls."""
+    return {
+        "model": _MODEL,
+        "messages": [
+            # The system message is byte-for-byte identical on every turn, so
+            # Ollama can skip re-evaluating it.
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": f"User Prompt: \"{user_prompt}\"\n\nJSON Response:"}
+        ],
+        "format": "json", # Tell Ollama to enforce JSON output
+        "stream": stream,
+        "keep_alive": _KEEP_ALIVE,
+        "options": _OPTIONS
+    }
+
+def _cache_key(user_prompt: str):
+    """Cache key for this prompt under the current model, options and system prompt."""
+    return llm_cache.make_key(_MODEL, _OPTIONS, SYSTEM_PROMPT_VERSION, user_prompt)
+
+def _record_timings(response: dict):
+    """Records Ollama's own timing fields (nanoseconds) from a finished response."""
+    prompt_eval_ns = response.get("prompt_eval_duration")
+    eval_ns = response.get("eval_duration")
+    if prompt_eval_ns:
+        metrics.observe("umbra_llm_prompt_eval_seconds", prompt_eval_ns / 1e9, model=_MODEL)
+    if eval_ns:
+        metrics.observe("umbra_llm_generation_seconds", eval_ns / 1e9, model=_MODEL)
+        tokens = response.get("eval_count", 0)
+        metrics.inc("umbra_llm_generated_tokens_total", tokens, model=_MODEL)
+        metrics.set_gauge("umbra_llm_tokens_per_second", tokens / (eval_ns / 1e9), model=_MODEL)
+
+@tracing.traced("llm decide_tool")
+def decide_tool(user_prompt: str, use_cache: bool = True):
+    """
+    Consults the LLM to get a "thought" process and a final "decision" JSON.
+    Identical prompts are answered from the decision cache unless use_cache is False.
+    """
+    if not _ensure_system_prompt():
+        return _fallback_response("Critical system error.", "My core systems are not configured correctly.")
+
+    cache_key = _cache_key(user_prompt) if use_cache else None
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        payload = _build_payload(user_prompt, stream=False)
+        with metrics.timer("umbra_llm_request_seconds", model=_MODEL, mode="blocking"):
+            response = _get_session().post(_chat_url(), json=payload)
         response.raise_for_status()
-        
+        ollama_response = response.json()
+        _record_timings(ollama_response)
+
         # The entire response from Ollama is now expected to be a single JSON string
-        response_json_str = response.json().get('response', '{}')
+        response_json_str = ollama_response.get('message', {}).get('content', '{}')
         # We parse this string to get the dictionary inside
-        return json.loads(response_json_str)
+        llm_response = json.loads(response_json_str)
+        if cache_key:
+            llm_cache.put(cache_key, llm_response)
+        return llm_response
+
+    except requests.exceptions.RequestException as e:
+        return _fallback_response(f"Connection error: {e}", "I can't connect to my core intelligence (Ollama).")
+    except json.JSONDecodeError:
+        metrics.inc("umbra_llm_parse_failures_total")
+        return _fallback_response("The LLM provided a malformed response.", "My thought process was interrupted. Could you rephrase that?")
+    except Exception as e:
+        return _fallback_response(f"An unexpected error occurred: {e}", "I encountered an unexpected internal error.")
+
+
+class _DecisionStreamParser:
+    """
+    Scans the LLM's JSON output as it streams in and reports each top-level
+    value (e.g. "thought", "decision") the moment it is complete, so callers
+    don't have to wait for the closing brace of the whole object.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expecting_key = False
+        self._key = None
+        self._value_start = None
+
+    def _complete(self, end: int):
+        """Decodes the top-level value that just closed at `end`."""
+        literal = self.buffer[self._value_start:end + 1]
+        self._value_start = None
+        try:
+            return [(self._key, json.loads(literal))]
+        except json.JSONDecodeError:
+            return []
+
+    def feed(self, text: str):
+        """Adds a chunk of streamed text and returns any (key, value) pairs it completed."""
+        self.buffer += text
+        completed = []
+        while self._pos < len(self.buffer):
+            i = self._pos
+            ch = self.buffer[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expecting_key:
+                        try:
+                            self._key = json.loads(self.buffer[self._string_start:i + 1])
+                        except json.JSONDecodeError:
+                            self._key = None
+                    elif self._depth == 1 and self._value_start == self._string_start:
+                        completed += self._complete(i)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and not self._expecting_key and self._value_start is None:
+                    self._value_start = i
+            elif ch in '{[':
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+                if self._depth == 1:
+                    self._expecting_key = True
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    completed += self._complete(i)
+            elif self._depth == 1 and ch == ':':
+                self._expecting_key = False
+            elif self._depth == 1 and ch == ',':
+                self._expecting_key = True
+        return completed
+
+
+def stream_decide_tool(user_prompt: str, use_cache: bool = True):
+    """
+    Streaming version of decide_tool. Yields events as the LLM generates:
+
+        {"type": "thought", "thought": str}     - as soon as the thought string closes
+        {"type": "decision", "decision": dict}  - as soon as the decision object closes
+        {"type": "done", "response": dict}      - once the stream ends, with the full response
+
+    Callers can act on the "decision" event straight away and simply stop
+    iterating; the connection to Ollama is closed when the generator is.
+    Cached decisions are replayed immediately without contacting Ollama.
+    """
+    if not _ensure_system_prompt():
+        fallback = _fallback_response("Critical system error.", "My core systems are not configured correctly.")
+        yield {"type": "decision", "decision": fallback["decision"]}
+        yield {"type": "done", "response": fallback}
+        return
+
+    cache_key = _cache_key(user_prompt) if use_cache else None
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            if cached.get("thought"):
+                yield {"type": "thought", "thought": cached["thought"]}
+            yield {"type": "decision", "decision": cached["decision"]}
+            yield {"type": "done", "response": cached}
+            return
+
+    parser = _DecisionStreamParser()
+    seen = {}
+    response = None
+    start = time.perf_counter()
+    try:
+        payload = _build_payload(user_prompt, stream=True)
+        response = _get_session().post(_chat_url(), json=payload, stream=True)
+        response.raise_for_status()
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            for key, value in parser.feed(chunk.get('message', {}).get('content', '')):
+                if key == "thought" and "thought" not in seen:
+                    seen["thought"] = value
+                    yield {"type": "thought", "thought": value}
+                elif key == "decision" and "decision" not in seen and isinstance(value, dict):
+                    seen["decision"] = value
+                    # Cache now: callers usually stop iterating right after this event.
+                    if cache_key:
+                        llm_cache.put(cache_key, {"thought": seen.get("thought", ""), "decision": value})
+                    yield {"type": "decision", "decision": value}
+            if chunk.get('done'):
+                _record_timings(chunk)
+                break
+
+        full_response = json.loads(parser.buffer or '{}')
 
     except requests.exceptions.RequestException as e:
-        return {"thought": f"Connection error: {e}", "decision": {"tool": "conversation", "args": ["I can't connect to my core intelligence (Ollama)."]}}
+        full_response = _fallback_response(f"Connection error: {e}", "I can't connect to my core intelligence (Ollama).")
     except json.JSONDecodeError:
-         return {"thought": "The LLM provided a malformed response.", "decision": {"tool": "conversation", "args": ["My thought process was interrupted. Could you rephrase that?"]}}
+        metrics.inc("umbra_llm_parse_failures_total")
+        full_response = _fallback_response("The LLM provided a malformed response.", "My thought process was interrupted. Could you rephrase that?")
     except Exception as e:
-        return {"thought": f"An unexpected error occurred: {e}", "decision": {"tool": "conversation", "args": ["I encountered an unexpected internal error."]} }
+        full_response = _fallback_response(f"An unexpected error occurred: {e}", "I encountered an unexpected internal error.")
+    finally:
+        # Callers usually stop at the decision, so this times the call up to that point.
+        metrics.observe("umbra_llm_request_seconds", time.perf_counter() - start, model=_MODEL, mode="stream")
+        tracing.add_span("llm_request stream", start, model=_MODEL, decided="decision" in seen)
+        if response is not None:
+            response.close()
+
+    # Whatever wasn't streamed out (e.g. on errors) is reported from the final response.
+    if "decision" not in seen and full_response.get("decision"):
+        if "thought" not in seen and full_response.get("thought"):
+            yield {"type": "thought", "thought": full_response["thought"]}
+        yield {"type": "decision", "decision": full_response["decision"]}
+    yield {"type": "done", "response": full_response}
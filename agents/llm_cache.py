@@ -0,0 +1,172 @@
+import sqlite3
+import hashlib
+import json
+import time
+import threading
+import os
+import sys
+
+# Add the parent directory to the path to find the 'config' module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from agents import metrics
+
+# decide_tool always runs at temperature 0.0, so the same model, options,
+# system prompt and user prompt always produce the same decision. This cache
+# stores those decisions on disk so repeated prompts skip inference entirely.
+
+CACHE_DB_PATH = getattr(config, "LLM_CACHE_PATH", "llm_cache.db")
+# Entries older than this many seconds are treated as expired.
+CACHE_TTL_SECONDS = getattr(config, "LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+# Least-recently-used entries are evicted past this many rows.
+CACHE_MAX_ENTRIES = getattr(config, "LLM_CACHE_MAX_ENTRIES", 5000)
+# Decisions for these tools are never cached (time-sensitive answers).
+CACHE_SKIP_TOOLS = set(getattr(config, "LLM_CACHE_SKIP_TOOLS", ()))
+# Set to False in config.py to disable the cache everywhere.
+CACHE_ENABLED = getattr(config, "LLM_CACHE_ENABLED", True)
+
+# Only check the size cap every this many stores, to keep writes cheap. Each
+# process also evicts once when it first opens the cache, since short-lived
+# runs (the morning routine, one orchestrator session) may never get there.
+_EVICTION_INTERVAL = 50
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+_stats_lock = threading.Lock()
+_schema_ready = False
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        _stats[name] += amount
+    metrics.inc("umbra_cache_events_total", amount, cache="llm", event=name)
+
+def _get_db_connection():
+    """Helper function to get a cache database connection."""
+    global _schema_ready
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=5)
+    if not _schema_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS decisions (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_decisions_last_used ON decisions(last_used)")
+        conn.commit()
+        _schema_ready = True
+        _evict(conn, time.time())
+    return conn
+
+def make_key(model: str, options: dict, system_prompt_version: str, prompt: str):
+    """Hashes everything that determines the LLM's answer into a cache key."""
+    material = json.dumps(
+        {"model": model, "options": options, "system": system_prompt_version, "prompt": prompt},
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def is_cacheable(response: dict):
+    """True if the response is a real decision for a tool that may be cached."""
+    if not isinstance(response, dict) or response.get("error"):
+        return False
+    decision = response.get("decision")
+    if not isinstance(decision, dict) or not decision.get("tool"):
+        return False
+    return decision.get("tool") not in CACHE_SKIP_TOOLS
+
+def get(key: str):
+    """Returns the cached response for `key`, or None on a miss."""
+    if not CACHE_ENABLED:
+        return None
+    now = time.time()
+    try:
+        with metrics.timer("umbra_sqlite_seconds", db="llm_cache", op="read"):
+            return _get(key, now)
+    except sqlite3.Error as e:
+        print(f"   - LLM cache unavailable: {e}")
+        return None
+
+def _get(key: str, now: float):
+    conn = _get_db_connection()
+    try:
+        row = conn.execute("SELECT response, created_at FROM decisions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _count("misses")
+            return None
+        response, created_at = row
+        if now - created_at > CACHE_TTL_SECONDS:
+            conn.execute("DELETE FROM decisions WHERE key = ?", (key,))
+            conn.commit()
+            _count("expired")
+            _count("misses")
+            return None
+        conn.execute("UPDATE decisions SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+    finally:
+        conn.close()
+    _count("hits")
+    return json.loads(response)
+
+def put(key: str, response: dict):
+    """Stores a response if it is cacheable."""
+    if not CACHE_ENABLED or not is_cacheable(response):
+        return
+    now = time.time()
+    try:
+        with metrics.timer("umbra_sqlite_seconds", db="llm_cache", op="write"):
+            _put(key, response, now)
+    except sqlite3.Error as e:
+        print(f"   - Could not store LLM decision in cache: {e}")
+
+def _put(key: str, response: dict, now: float):
+    conn = _get_db_connection()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO decisions (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(response), now, now)
+        )
+        conn.commit()
+        _count("stores")
+        if _stats["stores"] % _EVICTION_INTERVAL == 0:
+            _evict(conn, now)
+    finally:
+        conn.close()
+
+def _evict(conn, now: float):
+    """Drops expired rows, then the least-recently-used rows past the size cap."""
+    expired = conn.execute("DELETE FROM decisions WHERE created_at < ?", (now - CACHE_TTL_SECONDS,)).rowcount
+    overflow = conn.execute("SELECT COUNT(*) FROM decisions").fetchone()[0] - CACHE_MAX_ENTRIES
+    evicted = 0
+    if overflow > 0:
+        evicted = conn.execute("""
+            DELETE FROM decisions WHERE key IN (
+                SELECT key FROM decisions ORDER BY last_used ASC LIMIT ?
+            )
+        """, (overflow,)).rowcount
+    conn.commit()
+    _count("expired", expired)
+    _count("evicted", evicted)
+
+def clear_cache():
+    """Removes every cached decision."""
+    conn = _get_db_connection()
+    conn.execute("DELETE FROM decisions")
+    conn.commit()
+    conn.close()
+    return "LLM decision cache cleared."
+
+def get_cache_stats():
+    """Returns the hit/miss counters for this process plus the current entry count."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    try:
+        conn = _get_db_connection()
+        stats["entries"] = conn.execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+        conn.close()
+    except sqlite3.Error:
+        stats["entries"] = None
+    return stats
@@ -1,74 +1,244 @@
 import requests
+import sqlite3
+import threading
+import time
 import sys
 import os
 
 # Add the parent directory to the path to find the 'config' module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import config
+from agents import http_client
+from agents.geo_agent import geocode, haversine_km
 
-def get_route_info(args: list):
+# --- NEW: Route matrix with a per-pair cache ---
+_MATRIX_URL = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+_MATRIX_FIELDS = "originIndex,destinationIndex,duration,staticDuration,distanceMeters,status,condition"
+
+ROUTE_CACHE_PATH = getattr(config, "ROUTE_CACHE_PATH", "route_cache.db")
+# Traffic-aware durations go stale quickly; road distances hardly ever change.
+TRAFFIC_TTL_SECONDS = getattr(config, "ROUTE_TRAFFIC_TTL_SECONDS", 15 * 60)
+STATIC_TTL_SECONDS = getattr(config, "ROUTE_STATIC_TTL_SECONDS", 30 * 24 * 3600)
+# Google's per-request limits for traffic-aware matrices.
+_MAX_ELEMENTS = 100
+_MAX_WAYPOINTS = 50
+# Offline estimate: roads are ~25% longer than the straight line, at ~80 km/h on average.
+_ROAD_FACTOR = 1.25
+_ESTIMATE_SPEED_KMH = 80.0
+
+_cache_lock = threading.Lock()
+_cache_conn = None
+
+def _normalize_address(address: str):
+    return " ".join(str(address).replace(",", " , ").split()).casefold().replace(" ,", ",")
+
+def _get_cache():
+    global _cache_conn
+    if _cache_conn is None:
+        conn = sqlite3.connect(ROUTE_CACHE_PATH, check_same_thread=False, timeout=5)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS route_pairs (
+                origin TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                distance_meters INTEGER,
+                static_seconds INTEGER,
+                distance_fetched_at REAL,
+                traffic_seconds INTEGER,
+                traffic_fetched_at REAL,
+                PRIMARY KEY (origin, destination)
+            )
+        """)
+        conn.commit()
+        _cache_conn = conn
+    return _cache_conn
+
+def _cached_pairs(pairs, traffic: bool):
+    """Returns {(origin, destination): entry} for pairs with a fresh enough cached answer."""
+    now = time.time()
+    found = {}
+    with _cache_lock:
+        conn = _get_cache()
+        for origin, destination in pairs:
+            row = conn.execute("""
+                SELECT distance_meters, static_seconds, distance_fetched_at, traffic_seconds, traffic_fetched_at
+                FROM route_pairs WHERE origin = ? AND destination = ?
+            """, (origin, destination)).fetchone()
+            if row is None or row[2] is None or now - row[2] > STATIC_TTL_SECONDS:
+                continue
+            if traffic:
+                if row[4] is None or now - row[4] > TRAFFIC_TTL_SECONDS:
+                    continue
+                seconds = row[3]
+            else:
+                seconds = row[1]
+            found[(origin, destination)] = {"distance_meters": row[0], "duration_seconds": seconds, "source": "cache"}
+    return found
+
+def _store_pairs(entries, traffic: bool):
+    now = time.time()
+    with _cache_lock:
+        conn = _get_cache()
+        for (origin, destination), entry in entries.items():
+            conn.execute("""
+                INSERT INTO route_pairs (origin, destination, distance_meters, static_seconds, distance_fetched_at,
+                                         traffic_seconds, traffic_fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(origin, destination) DO UPDATE SET
+                distance_meters=excluded.distance_meters,
+                static_seconds=excluded.static_seconds,
+                distance_fetched_at=excluded.distance_fetched_at,
+                traffic_seconds=COALESCE(excluded.traffic_seconds, route_pairs.traffic_seconds),
+                traffic_fetched_at=COALESCE(excluded.traffic_fetched_at, route_pairs.traffic_fetched_at)
+            """, (origin, destination, entry["distance_meters"], entry["static_seconds"], now,
+                  entry["duration_seconds"] if traffic else None, now if traffic else None))
+        conn.commit()
+
+def _parse_seconds(value):
+    return int(float(str(value).rstrip("s"))) if value else None
+
+def _blocks(origins, destinations):
     """
-    This is a 'Tool' function.
-    It takes a list containing two arguments, a start and destination,
-    and returns the driving distance and duration using the Google Routes API.
+    Splits origins x destinations into tiles that each fit in one matrix
+    request, choosing the tile shape that needs the fewest requests.
     """
-    if len(args) < 2:
-        return "Please provide both a starting location and a destination."
-    
-    start, destination = args[0], args[1]
-    
-    print(f"   - Calculating route from {start} to {destination} using Google Routes API...")
+    best = None
+    for cols in range(1, min(len(destinations), _MAX_WAYPOINTS - 1) + 1):
+        rows = max(1, min(len(origins), _MAX_ELEMENTS // cols, _MAX_WAYPOINTS - cols))
+        calls = -(-len(origins) // rows) * -(-len(destinations) // cols)
+        if best is None or calls < best[0]:
+            best = (calls, rows, cols)
+    _, rows, cols = best
+    for i in range(0, len(origins), rows):
+        for j in range(0, len(destinations), cols):
+            yield origins[i:i + rows], destinations[j:j + cols]
 
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
-    
+def _fetch_block(origins, destinations, traffic: bool):
+    """One computeRouteMatrix call; returns {(origin, destination): entry}."""
     headers = {
-        'Content-Type': 'application/json',
         'X-Goog-Api-Key': config.Maps_API_KEY,
-        'X-Goog-FieldMask': 'routes.duration,routes.distanceMeters'
+        'X-Goog-FieldMask': _MATRIX_FIELDS,
     }
-
     payload = {
-        "origin": {"address": start},
-        "destination": {"address": destination},
+        "origins": [{"waypoint": {"address": o}} for o in origins],
+        "destinations": [{"waypoint": {"address": d}} for d in destinations],
         "travelMode": "DRIVE",
-        "routingPreference": "TRAFFIC_AWARE"
+        "routingPreference": "TRAFFIC_AWARE" if traffic else "TRAFFIC_UNAWARE",
     }
+    elements = http_client.post_json(_MATRIX_URL, payload, headers=headers)
+    if not isinstance(elements, list):
+        # An error body ({"error": {...}}) instead of the element stream; the caller falls back to estimates.
+        detail = elements.get("error", {}).get("message") if isinstance(elements, dict) else None
+        raise ValueError(detail or "unexpected response from computeRouteMatrix")
+    entries = {}
+    for element in elements:
+        pair = (origins[element.get("originIndex", 0)], destinations[element.get("destinationIndex", 0)])
+        if element.get("condition") != "ROUTE_EXISTS":
+            entries[pair] = {"error": "No drivable route between these places."}
+            continue
+        static_seconds = _parse_seconds(element.get("staticDuration") or element.get("duration"))
+        entries[pair] = {
+            "distance_meters": element.get("distanceMeters", 0),
+            "static_seconds": static_seconds,
+            "duration_seconds": _parse_seconds(element.get("duration")) or static_seconds,
+            "source": "api",
+        }
+    return entries
+
+def _estimate(origin: str, destination: str):
+    """Great-circle guess used when the Routes API can't answer."""
+    start, end = geocode(origin), geocode(destination)
+    if start is None or end is None:
+        return None
+    km = haversine_km(*start, *end) * _ROAD_FACTOR
+    return {"distance_meters": int(km * 1000), "duration_seconds": int(km / _ESTIMATE_SPEED_KMH * 3600),
+            "source": "estimate"}
+
+def compute_route_matrix(origins, destinations, traffic: bool = True):
+    """
+    Driving distance and duration for every origin x destination pair, as
+    matrix[i][j] = {"origin", "destination", "distance_meters",
+    "duration_seconds", "source", "error"}. Cached pairs are reused, the rest
+    are fetched in as few computeRouteMatrix calls as the API limits allow.
+    If the API is unreachable, pairs fall back to a great-circle estimate
+    ("source": "estimate").
+    """
+    origins, destinations = list(origins), list(destinations)
+    norm_origins = [_normalize_address(o) for o in origins]
+    norm_destinations = [_normalize_address(d) for d in destinations]
+    unique_origins = list(dict.fromkeys(norm_origins))
+    unique_destinations = list(dict.fromkeys(norm_destinations))
+    wanted = [(o, d) for o in unique_origins for d in unique_destinations]
+
+    found = _cached_pairs(wanted, traffic)
+    missing = [pair for pair in wanted if pair not in found]
+    error = None
+    if missing:
+        missing_origins = list(dict.fromkeys(o for o, _ in missing))
+        missing_destinations = list(dict.fromkeys(d for _, d in missing))
+        fetched = {}
+        try:
+            for block_origins, block_destinations in _blocks(missing_origins, missing_destinations):
+                fetched.update(_fetch_block(block_origins, block_destinations, traffic))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error = f"Routes API unavailable ({e})."
+            print(f"   - [Logistics] {error} Using offline estimates.")
+        routes = {pair: entry for pair, entry in fetched.items() if "error" not in entry}
+        if routes:
+            _store_pairs(routes, traffic)
+        found.update(fetched)
+
+    matrix = []
+    for origin, norm_origin in zip(origins, norm_origins):
+        row = []
+        for destination, norm_destination in zip(destinations, norm_destinations):
+            entry = found.get((norm_origin, norm_destination)) or _estimate(origin, destination)
+            cell = {"origin": origin, "destination": destination, "distance_meters": None,
+                    "duration_seconds": None, "source": None, "error": None}
+            if entry and "error" in entry:
+                cell["error"] = entry["error"]
+            elif entry:
+                cell.update({k: entry[k] for k in ("distance_meters", "duration_seconds", "source")})
+            else:
+                cell["error"] = error or "No route found."
+            row.append(cell)
+        matrix.append(row)
+    return matrix
+
+def format_duration(duration_seconds: int):
+    """Turns seconds into something human-readable, e.g. '1 hour 5 minutes'."""
+    days, remainder = divmod(int(duration_seconds), 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, _ = divmod(remainder, 60)
+
+    duration_str = ""
+    if days > 0:
+        duration_str += f"{days} day{'s' if days > 1 else ''} "
+    if hours > 0:
+        duration_str += f"{hours} hour{'s' if hours > 1 else ''} "
+    if minutes > 0:
+        duration_str += f"{minutes} minute{'s' if minutes > 1 else ''}"
+    return duration_str.strip() or "under a minute"
+
+def get_route_info(*args):
+    """
+    This is a 'Tool' function.
+    It takes a start and a destination (or a single [start, destination] list)
+    and returns the driving distance and duration using the Google Routes API.
+    """
+    if len(args) == 1 and isinstance(args[0], (list, tuple)):
+        args = tuple(args[0])
+    if len(args) < 2:
+        return "Please provide both a starting location and a destination."
+
+    start, destination = args[0], args[1]
+
+    print(f"   - Calculating route from {start} to {destination} using Google Routes API...")
+    route = compute_route_matrix([start], [destination])[0][0]
+    if route["error"]:
+        return f"\nCould not find a route. Reason: {route['error']}"
 
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status() # Raise an exception for bad status codes
-        data = response.json()
-
-        if 'routes' in data and len(data['routes']) > 0:
-            route = data['routes'][0]
-            distance_meters = route.get('distanceMeters', 0)
-            duration_seconds_str = route.get('duration', '0s')
-
-            # Convert distance to miles
-            distance_miles = round(distance_meters * 0.000621371)
-
-            # Parse duration (e.g., "3600s") into something human-readable
-            duration_seconds = int(duration_seconds_str.replace('s', ''))
-            days, remainder = divmod(duration_seconds, 86400)
-            hours, remainder = divmod(remainder, 3600)
-            minutes, _ = divmod(remainder, 60)
-
-            duration_str = ""
-            if days > 0:
-                duration_str += f"{days} day{'s' if days > 1 else ''} "
-            if hours > 0:
-                duration_str += f"{hours} hour{'s' if hours > 1 else ''} "
-            if minutes > 0:
-                duration_str += f"{minutes} minute{'s' if minutes > 1 else ''}"
-            
-            return f"\nRoute Information:\n- Distance: {distance_miles:,} mi\n- Est. Duration: {duration_str.strip()}"
-
-        else:
-            return "Could not find a route between the specified locations."
-
-    except requests.exceptions.HTTPError as http_err:
-        # Try to get a more specific error message from the response
-        error_details = response.json().get('error', {}).get('message', str(http_err))
-        return f"\nCould not find a route. Reason: {error_details}"
-    except Exception as e:
-        return f"\nAn unexpected error occurred: {e}"
\ No newline at end of file
+    # Convert distance to miles
+    distance_miles = round(route["distance_meters"] * 0.000621371)
+    note = " (offline estimate)" if route["source"] == "estimate" else ""
+    return (f"\nRoute Information{note}:\n- Distance: {distance_miles:,} mi\n"
+            f"- Est. Duration: {format_duration(route['duration_seconds'])}")
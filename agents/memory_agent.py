@@ -1,12 +1,20 @@
 import sqlite3
 import datetime
+import re
 import random
 import os
 import sys
+import queue
+import threading
+import atexit
+import time
+from contextlib import contextmanager
 
 # Add the parent directory to the path to find other modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from agents import metrics
+from agents import tracing
 from agents import llm_agent # Import the LLM agent to be used for analysis
 
 def _get_db_connection():
@@ -15,8 +23,70 @@ def _get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+# How many matches 'recall' returns by default.
+SEARCH_RESULT_LIMIT = getattr(config, "MEMORY_SEARCH_LIMIT", 10)
+
+# --- Write-behind settings ---
+# Memories waiting to be written; add_memory blocks only when this is full.
+WRITE_QUEUE_SIZE = getattr(config, "MEMORY_WRITE_QUEUE_SIZE", 1000)
+# Queued writes are committed together, at most this many per transaction...
+WRITE_BATCH_SIZE = getattr(config, "MEMORY_WRITE_BATCH_SIZE", 100)
+# ...after waiting at most this long (seconds) for more writes to group with.
+WRITE_BATCH_WINDOW = getattr(config, "MEMORY_WRITE_BATCH_WINDOW", 0.05)
+# SQLite 'synchronous' level for the writer: "OFF", "NORMAL" (default) or "FULL".
+# NORMAL in WAL mode survives application crashes; FULL also survives power loss.
+WRITE_SYNCHRONOUS = getattr(config, "MEMORY_SYNCHRONOUS", "NORMAL")
+# If True, add_memory waits until its row is committed before returning.
+WRITE_WAIT_FOR_COMMIT = getattr(config, "MEMORY_WAIT_FOR_COMMIT", False)
+# Number of pooled read-only connections.
+READ_POOL_SIZE = getattr(config, "MEMORY_READ_POOL_SIZE", 4)
+
+# Set by setup_database() (run on first use) once it knows whether this SQLite build has FTS5.
+_FTS_ENABLED = False
+
+def _fts5_supported(conn):
+    """Checks whether this SQLite build includes the FTS5 extension."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _migrate_full_text_index(cursor):
+    """
+    Creates the FTS5 index over memories, keeps it in sync with triggers, and
+    backfills it from existing rows the first time it is created.
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'memories_fts'")
+    is_new = cursor.fetchone() is None
+
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts
+        USING fts5(memory, content='memories', content_rowid='id')
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+            INSERT INTO memories_fts(rowid, memory) VALUES (new.id, new.memory);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+            INSERT INTO memories_fts(memories_fts, rowid, memory) VALUES ('delete', old.id, old.memory);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS memories_fts_update AFTER UPDATE OF memory ON memories BEGIN
+            INSERT INTO memories_fts(memories_fts, rowid, memory) VALUES ('delete', old.id, old.memory);
+            INSERT INTO memories_fts(rowid, memory) VALUES (new.id, new.memory);
+        END
+    """)
+    if is_new:
+        cursor.execute("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')")
+
 def setup_database():
     """Sets up the database tables if they don't exist."""
+    global _FTS_ENABLED
     conn = _get_db_connection()
     cursor = conn.cursor()
     
@@ -25,6 +95,7 @@ def setup_database():
     
     if 'category' not in columns:
         cursor.execute("DROP TABLE IF EXISTS memories")
+        cursor.execute("DROP TABLE IF EXISTS memories_fts")
         cursor.execute('''
             CREATE TABLE memories (
                 id INTEGER PRIMARY KEY,
@@ -42,35 +113,306 @@ def setup_database():
                 memory TEXT NOT NULL
             )
         ''')
+
+    # WAL lets the pooled readers run while the writer thread commits.
+    cursor.execute("PRAGMA journal_mode=WAL")
+
+    # --- Indexes and full-text search ---
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_timestamp ON memories(timestamp)")
+    # Category listings filter and sort on the index alone (the id comes for free as the rowid).
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_memories_category_timestamp ON memories(category, timestamp)")
+    # Remembers the last memory id each background job has already processed.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS memory_cursors (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """)
+    _FTS_ENABLED = _fts5_supported(conn)
+    if _FTS_ENABLED:
+        _migrate_full_text_index(cursor)
     
     conn.commit()
     conn.close()
 
-# Ensure the database is set up when the module is imported
-setup_database()
+_INSERT_MEMORY = 'INSERT INTO memories (timestamp, category, memory) VALUES (?, ?, ?)'
+
+_ready_lock = threading.Lock()
+_writer = None
+_read_pool = None
+
+def ensure_database():
+    """
+    Sets up the database and starts the writer on first use, rather than at
+    import time. Returns the writer.
+    """
+    global _writer, _read_pool
+    if _writer is None:
+        with _ready_lock:
+            if _writer is None:
+                setup_database()
+                _read_pool = _ReadPool(READ_POOL_SIZE)
+                _writer = _MemoryWriter()
+    return _writer
+
+
+class _PendingWrite(threading.Event):
+    """Set once the writer has handled a row; `error` holds the exception if it wasn't stored."""
+
+    def __init__(self):
+        super().__init__()
+        self.error = None
+
+
+class _MemoryWriter:
+    """
+    Owns the only writable connection to the memory database. add_memory()
+    hands rows to it through a bounded queue; a single background thread
+    writes them in batches, one commit (and one fsync) per batch.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Queues a (timestamp, category, memory) row. Returns a _PendingWrite set once handled."""
+        pending = _PendingWrite()
+        self._queue.put((row, pending))
+        return pending
+
+    def flush(self, timeout: float = None):
+        """Blocks until everything queued so far has been committed."""
+        self.submit(None).wait(timeout)
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def _next_batch(self):
+        """Waits for one write, then gathers more until the batch is full or the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + WRITE_BATCH_WINDOW
+        while len(batch) < WRITE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _open(self):
+        conn = sqlite3.connect(config.MEMORY_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={WRITE_SYNCHRONOUS}")
+        return conn
+
+    def _write(self, conn, entries):
+        """
+        Writes the rows in one transaction. If that fails, they are retried one
+        at a time, so a bad row only fails its own caller.
+        """
+        try:
+            with metrics.timer("umbra_sqlite_seconds", db="memory", op="write"):
+                conn.executemany(_INSERT_MEMORY, [row for row, _ in entries])
+                conn.commit()
+            return
+        except sqlite3.Error as e:
+            conn.rollback()
+            if len(entries) == 1:
+                entries[0][1].error = e
+                print(f"\nError adding memory to database: {e}")
+                return
+        for row, pending in entries:
+            try:
+                conn.execute(_INSERT_MEMORY, row)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                pending.error = e
+                print(f"\nError adding memory to database: {e}")
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._next_batch()
+            entries = [(row, pending) for row, pending in batch if row is not None]
+            try:
+                if entries:
+                    # (Re)opened here, so a database that can't be opened fails
+                    # these writes instead of killing the thread.
+                    conn = conn or self._open()
+                    self._write(conn, entries)
+            except Exception as e:
+                print(f"\nError adding {len(entries)} memories to database: {e}")
+                for _, pending in entries:
+                    pending.error = pending.error or e
+                if conn is not None:
+                    conn.close()
+                conn = None
+            for _, pending in batch:
+                pending.set()
+                self._queue.task_done()
+
+
+class _ReadPool:
+    """A small pool of read-only connections shared by the query functions."""
 
+    def __init__(self, size: int):
+        self._connections = queue.Queue()
+        self._size = size
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        uri = f"file:{os.path.abspath(config.MEMORY_DB_PATH)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._connections.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self._size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+
+@contextmanager
+def _read_connection():
+    """
+    Borrows a pooled read-only connection. Writes queued by this process are
+    committed first, so a 'recall' right after a 'log' sees the new memory.
+    """
+    writer = ensure_database()
+    if writer.pending():
+        writer.flush(timeout=5)
+    with _read_pool.connection() as conn:
+        yield conn
+
+def _read_rows(sql: str, params=()):
+    """Runs a query on a pooled read connection. Only the query itself is timed as a SQLite read."""
+    with _read_connection() as conn:
+        with metrics.timer("umbra_sqlite_seconds", db="memory", op="read"):
+            return conn.execute(sql, params).fetchall()
+
+def flush_memories(timeout: float = None):
+    """Waits until every queued memory has been written to disk."""
+    if _writer is not None:
+        _writer.flush(timeout)
+
+# Don't lose queued memories when the process exits normally.
+atexit.register(flush_memories, 5)
+
+@tracing.traced("memory add_memory")
 def add_memory(text_to_log: str, category: str):
     """Logs a new memory to the database with a specific category."""
-    conn = _get_db_connection()
-    try:
-        current_timestamp = datetime.datetime.now().isoformat()
-        conn.execute(
-            'INSERT INTO memories (timestamp, category, memory) VALUES (?, ?, ?)',
-            (current_timestamp, category, text_to_log)
-        )
-        conn.commit()
-        print("\n💾 Memory stored in the database.")
-    except Exception as e:
-        print(f"\nError adding memory to database: {e}")
-    finally:
-        conn.close()
+    current_timestamp = datetime.datetime.now().isoformat()
+    pending = ensure_database().submit((current_timestamp, category, text_to_log))
+    if WRITE_WAIT_FOR_COMMIT:
+        pending.wait()
+        if pending.error is not None:
+            print(f"\n⚠️ Memory could not be stored: {pending.error}")
+        else:
+            print("\n💾 Memory stored in the database.")
+    else:
+        print("\n💾 Memory queued for the database.")
+
+def _build_fts_query(text: str):
+    """
+    Turns a user's search text into a safe FTS5 query. "Quoted text" becomes a
+    phrase, a trailing * makes a prefix query (e.g. "bost*"), and everything
+    else is matched word by word. Returns None if nothing is searchable.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|([\w\']+\*?)', text):
+        if phrase:
+            words = re.findall(r"[\w']+", phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+        elif word.endswith("*"):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return " ".join(terms) if terms else None
+
+def query_memories(query: str = None, category: str = None, since: str = None, until: str = None,
+                   limit: int = SEARCH_RESULT_LIMIT, cursor: str = None):
+    """
+    Searches memories and returns (rows, next_cursor).
+
+    Matches are ranked by BM25 relevance, newest first among equally relevant
+    rows (and simply newest first without a query).
+    `category`, `since` and `until` (ISO timestamps) narrow the results, and
+    passing back `next_cursor` fetches the following page.
+    """
+    ensure_database() # Decides whether full-text search is available.
+    conditions, params = [], []
+    if category:
+        conditions.append("m.category = ?")
+        params.append(category)
+    if since:
+        conditions.append("m.timestamp >= ?")
+        params.append(since)
+    if until:
+        conditions.append("m.timestamp <= ?")
+        params.append(until)
+
+    fts_query = _build_fts_query(query) if query else None
+    if query and fts_query is None:
+        return [], None
+
+    if fts_query and _FTS_ENABLED:
+        conditions.insert(0, "memories_fts MATCH ?")
+        params.insert(0, fts_query)
+        if cursor:
+            last_rank, last_id = cursor.split("|")
+            conditions.append("(bm25(memories_fts) > ? OR (bm25(memories_fts) = ? AND m.id < ?))")
+            params += [float(last_rank), float(last_rank), int(last_id)]
+        sql = f"""
+            SELECT m.id, m.timestamp, m.category, m.memory, bm25(memories_fts) AS score
+            FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid
+            WHERE {" AND ".join(conditions)}
+            ORDER BY score, m.id DESC
+            LIMIT ?
+        """
+    else:
+        if query:
+            # No FTS5 in this SQLite build: fall back to a substring scan.
+            conditions.append("m.memory LIKE ?")
+            params.append(f"%{query}%")
+        if cursor:
+            conditions.append("m.id < ?")
+            params.append(int(cursor))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT m.id, m.timestamp, m.category, m.memory, 0.0 AS score
+            FROM memories m {where}
+            ORDER BY m.id DESC
+            LIMIT ?
+        """
+    params.append(limit + 1)
+
+    rows = _read_rows(sql, params)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{last['score']!r}|{last['id']}" if fts_query and _FTS_ENABLED else str(last['id'])
+    return rows, next_cursor
 
 def search_memories(keyword: str):
-    """Searches the memory database for a specific keyword."""
-    conn = _get_db_connection()
-    cursor = conn.execute('SELECT * FROM memories WHERE memory LIKE ? ORDER BY timestamp DESC', (f'%{keyword}%',))
-    memories = cursor.fetchall()
-    conn.close()
+    """Searches the memory database for a keyword and returns the best matches."""
+    memories, next_cursor = query_memories(keyword)
 
     if not memories:
         return f"No memories found containing the keyword: '{keyword}'"
@@ -79,8 +421,100 @@ def search_memories(keyword: str):
     for row in memories:
         timestamp = datetime.datetime.fromisoformat(row['timestamp']).strftime('%Y-%m-%d %H:%M')
         result += f"- [{timestamp}] {row['memory']}\n"
+    if next_cursor:
+        result += f"(Showing the {len(memories)} most relevant matches.)\n"
     return result
 
+def fetch_memories_by_category(category: str, limit: int = 20, before: str = None, since_id: int = None):
+    """
+    Reads one page of memories in a category using the (category, timestamp) index.
+
+    Without `since_id` the page is newest first; pass the returned `next_before`
+    back as `before` to get the next (older) page. With `since_id` only rows
+    with a higher id are returned, in id order, so a job can process them and
+    save the last id it handled. (Timestamps can disagree with id order when
+    several processes write, which would make a full page skip or repeat rows.)
+    Returns (rows, next_before).
+    """
+    if since_id is not None:
+        sql = """
+            SELECT id, timestamp, category, memory FROM memories
+            WHERE category = ? AND id > ?
+            ORDER BY id ASC LIMIT ?
+        """
+        params = (category, since_id, limit)
+    elif before:
+        before_timestamp, before_id = before.rsplit("|", 1)
+        sql = """
+            SELECT id, timestamp, category, memory FROM memories
+            WHERE category = ? AND (timestamp, id) < (?, ?)
+            ORDER BY timestamp DESC, id DESC LIMIT ?
+        """
+        params = (category, before_timestamp, int(before_id), limit)
+    else:
+        sql = """
+            SELECT id, timestamp, category, memory FROM memories
+            WHERE category = ?
+            ORDER BY timestamp DESC, id DESC LIMIT ?
+        """
+        params = (category, limit)
+
+    rows = _read_rows(sql, params)
+
+    next_before = None
+    if since_id is None and len(rows) == limit:
+        next_before = f"{rows[-1]['timestamp']}|{rows[-1]['id']}"
+    return rows, next_before
+
+def get_memory_cursor(name: str):
+    """Returns the last memory id the named job has processed (0 if it never ran)."""
+    rows = _read_rows("SELECT last_id FROM memory_cursors WHERE name = ?", (name,))
+    return rows[0]['last_id'] if rows else 0
+
+def set_memory_cursor(name: str, last_id: int):
+    """Records that the named job has processed every memory up to `last_id`."""
+    ensure_database()
+    conn = _get_db_connection()
+    try:
+        conn.execute("""
+            INSERT INTO memory_cursors (name, last_id) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)
+        """, (name, last_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def format_memories(rows):
+    """Formats memory rows as a chronological transcript."""
+    lines = []
+    for row in sorted(rows, key=lambda r: (r['timestamp'], r['id'])):
+        timestamp = datetime.datetime.fromisoformat(row['timestamp']).strftime('%Y-%m-%d %H:%M')
+        lines.append(f"- [{timestamp}] {row['memory']}")
+    return "\n".join(lines)
+
+def get_recent_conversations(category: str, num_messages: int = 20, since_id: int = None):
+    """
+    Returns the most recent memories in a category as a transcript. With
+    `since_id`, only memories newer than that id are included.
+    """
+    rows, _ = fetch_memories_by_category(category, num_messages, since_id=since_id)
+    if not rows:
+        return f"No memories found in category: '{category}'"
+    return format_memories(rows)
+
+def review_memories(category: str):
+    """
+    Lists the memories in a category added since the last review, so each
+    review only reads new rows.
+    """
+    cursor_name = f"review:{category}"
+    rows, _ = fetch_memories_by_category(category, 20, since_id=get_memory_cursor(cursor_name))
+    if not rows:
+        return f"No new memories in '{category}' since your last review."
+
+    set_memory_cursor(cursor_name, rows[-1]['id'])
+    return f"{len(rows)} new memories in '{category}':\n" + format_memories(rows)
+
 def get_daily_memory_insight():
     """Gets a random, insightful memory from the database for the daily briefing."""
     # This function's logic remains the same
@@ -0,0 +1,154 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from agents import tracing
+
+# In-process metrics: latency histograms, counters and gauges, keyed by name
+# and labels. Recording is a dict update under a lock, cheap enough to leave
+# on everywhere; timed blocks double as trace spans (see tracing.py). server.py
+# exposes them at GET /metrics in the Prometheus text format; the orchestrator
+# prints a summary with the 'metrics' command.
+
+# Histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# HELP text for each metric Umbra records.
+_HELP = {
+    "umbra_llm_request_seconds": "Wall-clock time of a call to Ollama.",
+    "umbra_llm_prompt_eval_seconds": "Time Ollama spent evaluating the prompt.",
+    "umbra_llm_generation_seconds": "Time Ollama spent generating the response.",
+    "umbra_llm_tokens_per_second": "Generation speed of the most recent LLM call.",
+    "umbra_llm_generated_tokens_total": "Tokens generated by the LLM.",
+    "umbra_llm_parse_failures_total": "LLM responses that were not valid JSON.",
+    "umbra_tool_seconds": "Time spent running each tool.",
+    "umbra_tool_errors_total": "Tool calls that raised an exception.",
+    "umbra_tool_arity_mismatches_total": "Tool calls rejected for having the wrong number of arguments.",
+    "umbra_sqlite_seconds": "Time spent in SQLite reads and writes.",
+    "umbra_http_request_seconds": "Time spent on requests to external APIs.",
+    "umbra_http_errors_total": "Requests to external APIs that failed.",
+    "umbra_cache_events_total": "Cache hits, misses and other cache events.",
+}
+
+_lock = threading.Lock()
+_histograms = {} # (name, labels) -> [bucket counts..., +Inf count], sum
+_counters = {}   # (name, labels) -> value
+_gauges = {}     # (name, labels) -> value
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name: str, seconds: float, **labels):
+    """Records one latency observation."""
+    key = _key(name, labels)
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        entry[0][index] += 1
+        entry[1] += seconds
+
+def inc(name: str, amount: float = 1, **labels):
+    """Adds to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def set_gauge(name: str, value: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+@contextmanager
+def timer(name: str, **labels):
+    """
+    Times the enclosed block into the named histogram, even if it raises. The
+    block is also a span of the current trace, e.g. "sqlite memory write".
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        observe(name, end - start, **labels)
+        span_name = name.removeprefix("umbra_").removesuffix("_seconds")
+        tracing.add_span(" ".join([span_name, *map(str, labels.values())]), start, end, **labels)
+
+def reset():
+    """Forgets everything recorded so far."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+def _escape(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _header(lines, name, kind, seen):
+    if name not in seen:
+        seen.add(name)
+        lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} {kind}")
+
+def render_prometheus():
+    """Everything recorded so far, in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: (list(counts), total) for key, (counts, total) in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    lines, seen = [], set()
+    for (name, labels), (counts, total) in sorted(histograms.items()):
+        _header(lines, name, "histogram", seen)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+        cumulative += counts[-1]
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for (name, labels), value in sorted(counters.items()):
+        _header(lines, name, "counter", seen)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), value in sorted(gauges.items()):
+        _header(lines, name, "gauge", seen)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+def _quantile(counts, q: float):
+    """Upper bound of the bucket holding the q-th observation (an estimate, like Prometheus')."""
+    target = q * sum(counts)
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+def summarize():
+    """A human-readable table of where the time went, for the REPL."""
+    with _lock:
+        histograms = {key: (list(counts), total) for key, (counts, total) in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    if not (histograms or counters or gauges):
+        return "No metrics recorded yet."
+
+    lines = [f"{'stage':<58} {'count':>6} {'mean':>9} {'p50 <=':>8} {'p95 <=':>8} {'total':>9}"]
+    for (name, labels), (counts, total) in sorted(histograms.items(), key=lambda item: -item[1][1]):
+        count = sum(counts)
+        label = f"{name.replace('umbra_', '').replace('_seconds', '')}{_format_labels(labels)}"
+        lines.append(f"{label:<58} {count:>6} {total / count * 1000:>7.1f}ms "
+                     f"{_quantile(counts, 0.5):>7g}s {_quantile(counts, 0.95):>7g}s {total:>8.2f}s")
+    for (name, labels), value in sorted({**counters, **gauges}.items()):
+        lines.append(f"{name.replace('umbra_', '')}{_format_labels(labels)}: {value:g}")
+    return "\n".join(lines)
@@ -1,5 +1,9 @@
 import re
 
+# A run of digits at the start of the string usually means a street address.
+# e.g., "123 Main St" matches, but "Boston, MA" does not.
+_STREET_NUMBER = re.compile(r'^\d+\s')
+
 def sanitize_address(address: str):
     """
     Checks if an address string likely contains a specific street number
@@ -14,10 +18,7 @@ def sanitize_address(address: str):
     if not isinstance(address, str):
         return ""
 
-    # This regular expression looks for a pattern of numbers at the start
-    # of the string, which usually indicates a street address.
-    # e.g., "123 Main St" matches, but "Boston, MA" does not.
-    if re.search(r'^\d+\s', address.strip()):
+    if _STREET_NUMBER.search(address.strip()):
         return "[REDACTED - Street Address]"
     else:
         # If no street number is found, the address is considered safe to display.
@@ -48,3 +49,186 @@ def sanitize_contact_location(location: str):
         
     # Join them back together for display
     return " ::: ".join(sanitized_parts)
+
+
+# --- Redaction engine ---
+# One precompiled pattern finds every kind of PII in a single pass over the
+# text; the name of the group that matched decides the replacement.
+
+_STREET_SUFFIXES = (r"St|Street|Ave|Avenue|Rd|Road|Blvd|Boulevard|Dr|Drive|Ln|Lane|Way|Ct|Court|"
+                    r"Hwy|Highway|Pl|Place|Ter|Terrace|Pkwy|Parkway|Cir|Circle")
+
+_PII_PATTERN = re.compile(
+    r"(?P<email>(?<![\w.+-])[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b)"
+    r"|(?P<phone>(?<![\w+])(?:\+?1[\s.-]?)?(?:\(\d{3}\)|\d{3})[\s.-]?\d{3}[\s.-]?\d{4}\b)"
+    r"|(?P<zip>\b\d{5}-\d{4}\b)"
+    r"|(?P<state_zip>\b[A-Z]{2} \d{5}\b)"
+    r"|(?P<street>\b\d{1,6}(?: [A-Z][\w.'-]*){1,4} (?:" + _STREET_SUFFIXES + r")\b\.?)"
+)
+
+_REPLACEMENTS = {
+    "email": "[REDACTED - Email]",
+    "phone": "[REDACTED - Phone]",
+    "zip": "[REDACTED - ZIP]",
+    "street": "[REDACTED - Street Address]",
+    "known": "[REDACTED]",
+}
+
+# Every pattern above (and every known value) contains a digit or an "@", so
+# text without either can skip the full scan.
+_TRIGGER = re.compile(r"[\d@]")
+
+# Optional second pattern for exact PII values we already know (see load_known_pii).
+_known_pattern = None
+# Every proper prefix of a known value, so a stream can tell when its tail
+# might be the start of one; and the longest known value.
+_known_prefixes = frozenset()
+_known_max_length = 0
+
+def _replace(match):
+    if match.lastgroup == "state_zip":
+        # Keep the state ("MA 02333" -> "MA [REDACTED - ZIP]").
+        return match.group()[:3] + _REPLACEMENTS["zip"]
+    return _REPLACEMENTS[match.lastgroup]
+
+def _trie_regex(values):
+    """
+    Builds a regex that matches any of `values`, structured as a trie so the
+    engine walks shared prefixes once instead of trying each value in turn.
+    """
+    trie = {}
+    for value in values:
+        node = trie
+        for ch in value:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+    return build(trie)
+
+def load_known_pii(values):
+    """
+    Registers exact PII strings (phone numbers, e-mails, street lines...) to
+    redact wherever they appear, even in formats the patterns miss.
+    """
+    global _known_pattern, _known_prefixes, _known_max_length
+    values = sorted({v.strip() for v in values if v and len(v.strip()) >= 6 and _TRIGGER.search(v)})
+    _known_pattern = re.compile(f"(?P<known>{_trie_regex(values)})") if values else None
+    _known_prefixes = frozenset(v[:i] for v in values for i in range(1, len(v)))
+    _known_max_length = max(map(len, values), default=0)
+    return len(values)
+
+def load_known_pii_from_contacts():
+    """Loads every phone number, e-mail and street line from the contacts store."""
+    from agents import contacts_agent # Imported here: contacts_agent imports this module.
+    if not contacts_agent._store.refresh():
+        return 0
+    values = []
+    for contact in contacts_agent._store.contacts:
+        values.extend(contact.phones)
+        values.extend(contact.emails)
+        for address in contact.formatted_address.split(":::"):
+            street = address.strip().split("\n")[0].strip()
+            if _STREET_NUMBER.match(street):
+                values.append(street)
+    return load_known_pii(values)
+
+def redact(text: str):
+    """Replaces every e-mail, phone number, ZIP code, street address and known PII value."""
+    if not isinstance(text, str) or not _TRIGGER.search(text):
+        return text
+    if _known_pattern is not None:
+        text = _known_pattern.sub(_replace, text)
+    return _PII_PATTERN.sub(_replace, text)
+
+def redact_many(texts):
+    """
+    Batch version of redact() for whole columns of values. The values are
+    joined and scanned in one pass, which is much cheaper than one call each.
+    """
+    results = ["" if t is None else str(t) for t in texts]
+    # Only values that could contain PII are scanned, all in one pass.
+    positions = [i for i, t in enumerate(results) if _TRIGGER.search(t)]
+    candidates = [results[i] for i in positions]
+    if any("\x00" in t for t in candidates):
+        redacted = [redact(t) for t in candidates]
+    else:
+        redacted = redact("\x00".join(candidates)).split("\x00")
+    for i, text in zip(positions, redacted):
+        results[i] = text
+    return results
+
+
+class RedactingStream:
+    """
+    Redacts text that arrives in chunks (tool output, LLM tokens) without
+    buffering all of it. Only a short tail is held back, cut at whitespace, so
+    a phone number or e-mail split across two chunks is still caught.
+    """
+
+    def __init__(self, holdback: int = 32, max_buffer: int = 4096, min_emit: int = 64):
+        self.holdback = holdback
+        self.max_buffer = max_buffer
+        self.min_emit = min_emit  # batch tiny chunks (single tokens) into one scan
+        self._buffer = ""
+
+    def feed(self, chunk: str):
+        """Adds a chunk and returns the redacted text that is now safe to emit."""
+        self._buffer += chunk
+        cut = len(self._buffer) - self.holdback
+        if cut < self.min_emit:
+            return ""
+        # Never cut inside a word (an e-mail has no spaces), unless the buffer is huge.
+        space = max(self._buffer.rfind(" ", 0, cut), self._buffer.rfind("\n", 0, cut))
+        if space >= 0:
+            cut = space + 1
+        elif len(self._buffer) < self.max_buffer:
+            return ""
+        cut = self._safe_cut(cut)
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return redact(ready)
+
+    def _safe_cut(self, cut: int):
+        """
+        Moves the cut back until no match straddles it, and before any tail that
+        could be the start of a known value still arriving (known values may
+        contain spaces, so cutting at whitespace alone can split them).
+        """
+        window = max(100, _known_max_length) # No pattern match is longer than ~100 chars.
+        patterns = [p for p in (_known_pattern, _PII_PATTERN) if p is not None]
+        moved = True
+        while moved and cut > 0:
+            moved = False
+            for pattern in patterns:
+                for match in pattern.finditer(self._buffer, max(0, cut - window)):
+                    if match.start() < cut < match.end():
+                        cut, moved = match.start(), True
+                        break
+            if _known_prefixes:
+                end = len(self._buffer)
+                for start in range(max(0, end - _known_max_length), cut):
+                    if self._buffer[start:] in _known_prefixes:
+                        cut, moved = start, True
+                        break
+        return cut
+
+    def flush(self):
+        """Returns whatever is still held back, redacted. Call once the stream ends."""
+        rest, self._buffer = self._buffer, ""
+        return redact(rest)
+
+def redact_stream(chunks):
+    """Wraps an iterable of text chunks, yielding redacted chunks as they become safe."""
+    stream = RedactingStream()
+    for chunk in chunks:
+        ready = stream.feed(chunk)
+        if ready:
+            yield ready
+    rest = stream.flush()
+    if rest:
+        yield rest
@@ -0,0 +1,199 @@
+import sqlite3
+import inspect
+import threading
+import math
+import re
+import ast
+import os
+import sys
+from collections import Counter
+
+# Add the parent directory to the path to find the 'config' module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+# The router sits in front of the LLM. Prompts that are already a direct tool
+# command ("weather Boston", "list-friends") are answered without inference.
+# Everything else falls through to llm_agent.
+
+# Tools the parser never claims: their "arguments" are free-form language.
+_FREE_TEXT_TOOLS = {"conversation"}
+# "weather is nice today" is a sentence, not a weather command.
+_SENTENCE_WORDS = {"is", "are", "was", "were", "will", "would", "should", "could", "can", "do", "does", "did"}
+
+# Confidence the optional classifier needs before it may skip the LLM.
+CLASSIFIER_THRESHOLD = getattr(config, "ROUTER_CLASSIFIER_THRESHOLD", 0.9)
+# Set ROUTER_USE_CLASSIFIER = True in config.py to train it from past turns.
+USE_CLASSIFIER = getattr(config, "ROUTER_USE_CLASSIFIER", False)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_classifier = None
+
+def tool_arity(tool_function):
+    """Returns (min_args, max_args) for a tool; max_args is None for *args tools."""
+    if tool_function is None:
+        return 0, 0
+    minimum, maximum = 0, 0
+    for param in inspect.signature(tool_function).parameters.values():
+        if param.kind == param.VAR_POSITIONAL:
+            return max(minimum, 1), None
+        if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+            maximum += 1
+            if param.default is param.empty:
+                minimum += 1
+    return minimum, maximum
+
+def accepts_arg_count(tool_function, count: int):
+    """True if the tool can be called with `count` positional arguments."""
+    minimum, maximum = tool_arity(tool_function)
+    return count >= minimum and (maximum is None or count <= maximum)
+
+def describe_arity(tool_function):
+    """How many arguments a tool takes, in words: "exactly 2", "1 to 3", "at least 1"."""
+    minimum, maximum = tool_arity(tool_function)
+    if maximum is None:
+        return f"at least {minimum}"
+    if minimum == maximum:
+        return f"exactly {minimum}"
+    return f"{minimum} to {maximum}"
+
+def _split_args(rest: str, minimum: int, maximum):
+    """Splits the text after a tool name into arguments, or returns None if it can't."""
+    rest = rest.strip()
+    if not rest:
+        return [] if minimum == 0 else None
+    if maximum == 0 or rest.endswith("?") or rest.split()[0].lower() in _SENTENCE_WORDS:
+        return None
+    if maximum == 1 or (maximum is None and minimum <= 1):
+        return [rest.strip('"\'')]
+    # Multi-argument tools need explicit separators, e.g. "distance Boston, NYC".
+    parts = [part.strip().strip('"\'') for part in re.split(r'\s*[,|;]\s*', rest)]
+    if minimum <= len(parts) and (maximum is None or len(parts) <= maximum):
+        return parts
+    return None
+
+def parse_command(user_prompt: str, tool_map: dict):
+    """
+    Deterministic parser: matches a tool name at the start of the prompt
+    ("list-friends", "list friends", "weather Boston") and checks the rest
+    against the tool's signature. Returns a decision or None.
+    """
+    text = user_prompt.strip()
+    lowered = text.lower()
+    for tool_name in sorted(tool_map, key=len, reverse=True):
+        if tool_name in _FREE_TEXT_TOOLS:
+            continue
+        for spelling in {tool_name, tool_name.replace("-", " ")}:
+            if lowered == spelling or lowered.startswith(spelling + " "):
+                minimum, maximum = tool_arity(tool_map[tool_name])
+                args = _split_args(text[len(spelling):], minimum, maximum)
+                if args is not None:
+                    return {"tool": tool_name, "args": args}
+    return None
+
+
+class _NaiveBayesRouter:
+    """A tiny multinomial Naive Bayes classifier over prompt words."""
+
+    def __init__(self, examples):
+        self.word_counts = {}
+        self.tool_counts = Counter()
+        self.vocabulary = set()
+        for prompt, tool in examples:
+            words = _tokenize(prompt)
+            self.tool_counts[tool] += 1
+            self.word_counts.setdefault(tool, Counter()).update(words)
+            self.vocabulary.update(words)
+        self.totals = {tool: sum(counts.values()) for tool, counts in self.word_counts.items()}
+
+    def predict(self, prompt: str):
+        """Returns (tool, probability) for the most likely tool."""
+        words = _tokenize(prompt)
+        if not self.tool_counts or not words:
+            return None, 0.0
+        examples = sum(self.tool_counts.values())
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for tool, tool_count in self.tool_counts.items():
+            score = math.log(tool_count / examples)
+            counts, total = self.word_counts[tool], self.totals[tool]
+            for word in words:
+                score += math.log((counts[word] + 1) / (total + vocabulary_size))
+            scores[tool] = score
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / normalizer
+
+def _tokenize(text: str):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+_LOGGED_TURN = re.compile(r"User: '(?P<prompt>.*?)' \| Thought: .* \| Action: (?P<action>\{.*\})$", re.DOTALL)
+
+def train_classifier_from_memories(tool_map: dict, limit: int = 5000):
+    """
+    Trains the classifier on past turns logged in the memory database. Only
+    decisions for tools that need no arguments are learned, since the
+    classifier can't extract arguments.
+    """
+    global _classifier
+    examples = []
+    try:
+        conn = sqlite3.connect(config.MEMORY_DB_PATH)
+        rows = conn.execute(
+            "SELECT memory FROM memories WHERE category IN ('User Command', 'WebApp Conversation') ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"   - Router classifier not trained: {e}")
+        return 0
+
+    for (memory,) in rows:
+        match = _LOGGED_TURN.search(memory)
+        if not match:
+            continue
+        try:
+            decision = ast.literal_eval(match.group("action"))
+        except (ValueError, SyntaxError):
+            continue
+        tool = decision.get("tool") if isinstance(decision, dict) else None
+        if tool in tool_map and tool not in _FREE_TEXT_TOOLS and not decision.get("args") \
+                and tool_arity(tool_map[tool])[0] == 0:
+            examples.append((match.group("prompt"), tool))
+
+    _classifier = _NaiveBayesRouter(examples) if examples else None
+    print(f"   - Router classifier trained on {len(examples)} past commands.")
+    return len(examples)
+
+def _record(path: str):
+    with _stats_lock:
+        _stats[path] += 1
+
+def route(user_prompt: str, tool_map: dict):
+    """
+    Tries to answer the prompt without the LLM. Returns (decision, path) where
+    path is "parser", "classifier" or "llm"; decision is None for "llm".
+    """
+    decision = parse_command(user_prompt, tool_map)
+    if decision:
+        _record("parser")
+        return decision, "parser"
+
+    if USE_CLASSIFIER and _classifier is not None:
+        tool, confidence = _classifier.predict(user_prompt)
+        if tool in tool_map and confidence >= CLASSIFIER_THRESHOLD:
+            _record("classifier")
+            return {"tool": tool, "args": []}, "classifier"
+
+    _record("llm")
+    return None, "llm"
+
+def get_router_stats():
+    """Counts of requests served by each path and the share that skipped the LLM."""
+    with _stats_lock:
+        stats = {path: _stats[path] for path in ("parser", "classifier", "llm")}
+    total = sum(stats.values())
+    stats["total"] = total
+    stats["skipped_llm_share"] = round((stats["parser"] + stats["classifier"]) / total, 3) if total else 0.0
+    return stats
@@ -0,0 +1,246 @@
+import sqlite3
+import hashlib
+import datetime
+import threading
+import math
+import re
+import os
+import sys
+import requests
+
+try:
+    import numpy as np
+except ImportError: # Semantic recall is optional; keyword recall works without NumPy.
+    np = None
+
+# Add the parent directory to the path to find other modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from agents import memory_agent
+
+# "ollama" uses the local embeddings endpoint; "hash" is a deterministic
+# stand-in that needs no model (useful offline and in tests).
+EMBEDDER = getattr(config, "MEMORY_EMBEDDER", "ollama")
+EMBEDDING_MODEL = getattr(config, "OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+HASH_EMBEDDING_DIM = 256
+# Past this many vectors, searches use an approximate (IVF) index instead of a full scan.
+ANN_THRESHOLD = getattr(config, "SEMANTIC_ANN_THRESHOLD", 20000)
+# Number of IVF clusters searched per query; more is slower but more accurate.
+ANN_PROBES = getattr(config, "SEMANTIC_ANN_PROBES", 8)
+# New rows are embedded in batches of this size.
+EMBED_BATCH_SIZE = 64
+# Cosine similarity a memory needs to count as a semantic match; below it,
+# the nearest memories are just the least unrelated ones.
+MIN_SIMILARITY = getattr(config, "SEMANTIC_MIN_SIMILARITY", 0.3)
+
+
+def _embedding_url():
+    url = getattr(config, "OLLAMA_EMBEDDINGS_URL", None)
+    return url or config.OLLAMA_API_URL.replace("/api/generate", "/api/embed")
+
+def _ollama_embed(texts: list):
+    """Embeds a batch of texts with the local Ollama embeddings endpoint."""
+    response = requests.post(_embedding_url(), json={"model": EMBEDDING_MODEL, "input": texts}, timeout=60)
+    response.raise_for_status()
+    return np.asarray(response.json()["embeddings"], dtype=np.float32)
+
+def _hash_embed(texts: list):
+    """
+    Deterministic stand-in embedder: hashes words and character trigrams into
+    a fixed-size signed vector. Captures lexical overlap only, not meaning.
+    """
+    vectors = np.zeros((len(texts), HASH_EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            padded = f"#{word}#"
+            for feature in [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+                digest = hashlib.md5(feature.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % HASH_EMBEDDING_DIM
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+    return vectors
+
+def _embedder_name():
+    return f"hash-{HASH_EMBEDDING_DIM}" if EMBEDDER == "hash" else f"ollama:{EMBEDDING_MODEL}"
+
+def embed(texts: list):
+    """Embeds texts with the configured embedder and L2-normalizes the vectors."""
+    vectors = _hash_embed(texts) if EMBEDDER == "hash" else _ollama_embed(texts)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _IVFIndex:
+    """
+    Inverted-file approximate index: vectors are clustered with k-means and a
+    query only scores the members of its few nearest clusters.
+    """
+
+    def __init__(self, matrix, iterations: int = 10):
+        count = matrix.shape[0]
+        n_lists = max(1, int(math.sqrt(count)))
+        rng = np.random.default_rng(0)
+        centroids = matrix[rng.choice(count, n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = matrix[assignment == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == cluster) for cluster in range(n_lists)]
+        self.size = count
+
+    def add(self, positions, vectors):
+        """Assigns newly appended rows to their nearest cluster."""
+        for position, cluster in zip(positions, np.argmax(vectors @ self.centroids.T, axis=1)):
+            self.lists[cluster] = np.append(self.lists[cluster], position)
+
+    def candidates(self, query):
+        probes = np.argsort(self.centroids @ query)[::-1][:ANN_PROBES]
+        return np.concatenate([self.lists[cluster] for cluster in probes])
+
+
+class _SemanticIndex:
+    """In-memory matrix of memory embeddings, kept in step with the database."""
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.matrix = None
+        self.last_id = 0
+        self.ann = None
+        self.model = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        memory_agent.ensure_database()
+        conn = sqlite3.connect(config.MEMORY_DB_PATH, timeout=30)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS memory_embeddings (
+                memory_id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )
+        """)
+        return conn
+
+    def _append(self, ids, vectors):
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        start = 0 if self.matrix is None else self.matrix.shape[0]
+        self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+        if self.ann is not None:
+            self.ann.add(range(start, start + len(ids)), vectors)
+        self.last_id = max(self.last_id, int(max(ids)))
+
+    def sync(self):
+        """Loads stored embeddings and embeds only the memories added since the last sync."""
+        with self._lock:
+            model = _embedder_name()
+            if model != self.model:
+                self.__init__()
+                self.model = model
+            conn = self._connect()
+            try:
+                stored = conn.execute(
+                    "SELECT memory_id, vector FROM memory_embeddings WHERE model = ? AND memory_id > ? ORDER BY memory_id",
+                    (model, self.last_id)
+                ).fetchall()
+                if stored:
+                    self._append([row[0] for row in stored],
+                                 np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in stored]))
+
+                missing = conn.execute("""
+                    SELECT m.id, m.memory FROM memories m
+                    LEFT JOIN memory_embeddings e ON e.memory_id = m.id AND e.model = ?
+                    WHERE m.id > ? AND e.memory_id IS NULL
+                    ORDER BY m.id
+                """, (model, self.last_id)).fetchall()
+                for start in range(0, len(missing), EMBED_BATCH_SIZE):
+                    batch = missing[start:start + EMBED_BATCH_SIZE]
+                    vectors = embed([text for _, text in batch])
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO memory_embeddings (memory_id, model, vector) VALUES (?, ?, ?)",
+                        [(memory_id, model, vector.tobytes()) for (memory_id, _), vector in zip(batch, vectors)]
+                    )
+                    conn.commit()
+                    self._append([memory_id for memory_id, _ in batch], vectors)
+            finally:
+                conn.close()
+
+            size = 0 if self.matrix is None else self.matrix.shape[0]
+            if size >= ANN_THRESHOLD and (self.ann is None or size > 1.5 * self.ann.size):
+                self.ann = _IVFIndex(self.matrix)
+            return size
+
+    def search(self, query_vector, limit: int):
+        """Returns [(memory_id, cosine_similarity)] for the nearest memories."""
+        with self._lock:
+            if self.matrix is None:
+                return []
+            if self.ann is not None:
+                positions = self.ann.candidates(query_vector)
+                scores = self.matrix[positions] @ query_vector
+            else:
+                positions = None
+                scores = self.matrix @ query_vector
+            top = np.argpartition(-scores, min(limit, len(scores) - 1))[:limit]
+            top = top[np.argsort(-scores[top])]
+            chosen = top if positions is None else positions[top]
+            return [(int(self.ids[i]), float(s)) for i, s in zip(chosen, scores[top])]
+
+_index = _SemanticIndex()
+
+def index_new_memories():
+    """Embeds memories that don't have an embedding yet. Cheap to run nightly."""
+    if np is None:
+        return "Semantic indexing needs NumPy (pip install numpy)."
+    size = _index.sync()
+    return f"Semantic index holds {size} memories."
+
+def semantic_search(query: str, limit: int = memory_agent.SEARCH_RESULT_LIMIT, hybrid: bool = False,
+                    min_similarity: float = None):
+    """
+    Finds memories by meaning. Returns [(memory_id, score)], best first,
+    leaving out memories less similar than min_similarity (MIN_SIMILARITY
+    by default). With hybrid=True the semantic ranking is fused with keyword
+    (BM25) results using reciprocal rank fusion.
+    """
+    min_similarity = MIN_SIMILARITY if min_similarity is None else min_similarity
+    _index.sync()
+    matches = _index.search(embed([query])[0], limit if not hybrid else limit * 3)
+    matches = [(memory_id, score) for memory_id, score in matches if score >= min_similarity]
+    if not hybrid:
+        return matches
+
+    keyword_rows, _ = memory_agent.query_memories(query, limit=limit * 3)
+    fused = {}
+    for rank, (memory_id, _) in enumerate(matches):
+        fused[memory_id] = fused.get(memory_id, 0.0) + 1.0 / (60 + rank)
+    for rank, row in enumerate(keyword_rows):
+        fused[row['id']] = fused.get(row['id'], 0.0) + 1.0 / (60 + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def semantic_recall(query: str):
+    """Searches memories by meaning as well as keywords (e.g. 'Boston trip' finds 'Massachusetts visit')."""
+    if np is None:
+        return "Semantic recall needs NumPy (pip install numpy). Try 'recall' for keyword search."
+    try:
+        matches = semantic_search(query, hybrid=True)
+    except requests.exceptions.RequestException as e:
+        return f"I couldn't reach the embeddings model: {e}"
+    if not matches:
+        return f"No memories found related to: '{query}'"
+
+    ids = [memory_id for memory_id, _ in matches]
+    rows = memory_agent._read_rows(
+        f"SELECT id, timestamp, memory FROM memories WHERE id IN ({','.join('?' * len(ids))})", ids
+    )
+    by_id = {row[0]: row for row in rows}
+
+    result = f"Found {len(rows)} memories related to '{query}':\n"
+    for memory_id in ids:
+        if memory_id in by_id:
+            _, timestamp, memory = by_id[memory_id]
+            timestamp = datetime.datetime.fromisoformat(timestamp).strftime('%Y-%m-%d %H:%M')
+            result += f"- [{timestamp}] {memory}\n"
+    return result
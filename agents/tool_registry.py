@@ -0,0 +1,100 @@
+import importlib
+import inspect
+import threading
+import os
+import sys
+
+# Add the parent directory to the path to find the 'config' module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+# Tool maps hold lazy references ("agents.travel_agent:add_friend") instead of
+# the functions themselves, so starting Umbra doesn't import every agent (and
+# the Google client stack, numpy, ...) before the first prompt. A tool's
+# module is imported the first time the tool is called or inspected.
+
+# True: after the prompt appears, a background thread runs the startup steps
+# and imports every tool's module. False: the startup steps run before the
+# prompt and each tool is imported on first use.
+WARM_UP_IN_BACKGROUND = getattr(config, "STARTUP_WARM_UP", True)
+
+class LazyTool:
+    """A tool function that is imported on first use."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.module_name, _, self.attr = spec.partition(":")
+        self._function = None
+
+    def resolve(self):
+        """Imports the tool's module (once) and returns the real function."""
+        if self._function is None:
+            module = importlib.import_module(self.module_name)
+            self._function = getattr(module, self.attr)
+        return self._function
+
+    @property
+    def loaded(self):
+        return self._function is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    @property
+    def __signature__(self):
+        # Used by router_agent.tool_arity. A tool whose module can't be imported
+        # accepts anything here, so calling it reports the import error instead.
+        try:
+            return inspect.signature(self.resolve())
+        except ImportError:
+            return inspect.Signature([inspect.Parameter("args", inspect.Parameter.VAR_POSITIONAL)])
+
+    def __repr__(self):
+        return f"<LazyTool {self.spec}{' (loaded)' if self.loaded else ''}>"
+
+def lazy_tool(spec: str):
+    """A LazyTool for "module:function", e.g. lazy_tool("agents.knowledge_agent:get_weather")."""
+    return LazyTool(spec)
+
+def preload(tool_map: dict):
+    """Imports the module behind every lazy tool. Returns how many loaded."""
+    loaded = 0
+    for name, tool in tool_map.items():
+        if not isinstance(tool, LazyTool):
+            continue
+        try:
+            tool.resolve()
+            loaded += 1
+        except Exception as e:
+            print(f"   - Tool '{name}' could not be preloaded: {e}")
+    return loaded
+
+def run_steps(steps):
+    """Runs startup steps in order, reporting (not raising) any that fail."""
+    for step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"   - Startup step '{getattr(step, '__name__', step)}' failed: {e}")
+
+def warm_up(tool_map: dict, steps=(), background: bool = None):
+    """
+    Runs the startup steps (callables such as warm_up_llm) and then preloads
+    every tool, on a background thread unless background is False. In the
+    foreground only the steps run; the tools still load on first use. Steps
+    that must finish before the first request (e.g. loading known PII for
+    redaction) belong in run_steps() instead.
+    """
+    background = WARM_UP_IN_BACKGROUND if background is None else background
+
+    def _run():
+        run_steps(steps)
+        if background:
+            preload(tool_map)
+
+    if not background:
+        _run()
+        return None
+    thread = threading.Thread(target=_run, name="tool-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,186 @@
+import contextvars
+import datetime
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Add the parent directory to the path to find the 'config' module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+# Request-scoped span tracing. server.py and the orchestrator open a trace per
+# turn; everything that runs inside it (the LLM call, the tool, its HTTP and
+# SQLite work, add_memory) adds spans through a contextvar, so nothing has to
+# pass a trace object around. Each finished turn is written as one line of
+# TRACE_PATH holding a complete Chrome trace-event document; export one with
+#
+#   python agents/tracing.py [trace_id] [out.json]
+#
+# and open it in chrome://tracing, Perfetto or speedscope.
+
+TRACE_PATH = getattr(config, "TRACE_PATH", "umbra_traces.jsonl")
+# Share of turns that are traced: 1.0 traces every turn, 0.0 turns tracing off.
+SAMPLE_RATE = getattr(config, "TRACE_SAMPLE_RATE", 1.0)
+# Spans shorter than this many milliseconds are dropped, to keep traces small.
+MIN_SPAN_MS = getattr(config, "TRACE_MIN_SPAN_MS", 0.0)
+# The trace file rolls over at this size, keeping TRACE_BACKUPS old files.
+MAX_BYTES = getattr(config, "TRACE_MAX_BYTES", 5 * 1024 * 1024)
+BACKUPS = getattr(config, "TRACE_BACKUPS", 3)
+
+_current = contextvars.ContextVar("umbra_trace", default=None)
+_writer = None
+_writer_lock = threading.Lock()
+
+class _Trace:
+    def __init__(self, name: str):
+        self.id = os.urandom(8).hex()
+        self.name = name
+        self.started_at = datetime.datetime.now().isoformat()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, args: dict):
+        if (end - start) * 1000 < MIN_SPAN_MS:
+            return
+        thread = threading.current_thread()
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": thread.native_id,
+                 "ts": round((start - self.origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                 "args": {k: str(v) for k, v in args.items()}}
+        with self.lock:
+            self.events.append(event)
+            self.threads[thread.native_id] = thread.name
+
+    def document(self):
+        """The whole trace as a Chrome trace-event JSON object."""
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"{self.name} {self.id}"}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in self.threads.items()]
+        return {"traceEvents": metadata + self.events, "displayTimeUnit": "ms",
+                "otherData": {"trace_id": self.id, "name": self.name, "started_at": self.started_at}}
+
+def _get_writer():
+    global _writer
+    # Imported on first write; logging.handlers is slow to import.
+    import logging
+    from logging.handlers import RotatingFileHandler
+    with _writer_lock:
+        if _writer is None:
+            directory = os.path.dirname(os.path.abspath(TRACE_PATH))
+            os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(TRACE_PATH, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _writer = logging.getLogger("umbra.traces")
+            _writer.propagate = False
+            _writer.setLevel(logging.INFO)
+            _writer.addHandler(handler)
+    return _writer
+
+@contextmanager
+def start_trace(name: str, **args):
+    """
+    Opens a trace for one turn (if this turn is sampled) and writes it out
+    when the block ends. Yields the trace id, or None if the turn isn't traced.
+    """
+    if SAMPLE_RATE <= 0 or random.random() >= SAMPLE_RATE:
+        token = _current.set(None)
+        try:
+            yield None
+        finally:
+            _current.reset(token)
+        return
+
+    trace = _Trace(name)
+    token = _current.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace.id
+    finally:
+        _current.reset(token)
+        trace.add(name, start, time.perf_counter(), args)
+        try:
+            _get_writer().info(json.dumps(trace.document()))
+        except OSError as e:
+            print(f"   - [Tracing] Could not write trace {trace.id}: {e}")
+
+@contextmanager
+def span(name: str, **args):
+    """
+    Records the enclosed block as a span of the current trace. Yields a dict
+    the block can add args to. Costs one contextvar lookup when not tracing.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield {}
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        trace.add(name, start, time.perf_counter(), args)
+
+def traced(name: str):
+    """Decorator that records every call of the function as a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def add_span(name: str, start: float, end: float = None, **args):
+    """Records a span timed by the caller with time.perf_counter()."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, start, time.perf_counter() if end is None else end, args)
+
+def current_trace_id():
+    trace = _current.get()
+    return trace.id if trace else None
+
+def bind(func):
+    """
+    Returns func bound to the caller's trace, for work handed to a thread pool
+    (executor threads don't inherit contextvars on their own).
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+def _trace_files():
+    """The trace file and its backups, newest first."""
+    return [TRACE_PATH] + [f"{TRACE_PATH}.{n}" for n in range(1, BACKUPS + 1)]
+
+def export_trace(trace_id: str = None, out_path: str = None):
+    """
+    Writes one turn's trace (the latest if no id is given) to its own JSON
+    file for a flame-chart viewer. Returns the path, or None if not found.
+    """
+    for path in _trace_files():
+        try:
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        for line in reversed(lines):
+            if trace_id is None or f'"trace_id": "{trace_id}"' in line:
+                document = json.loads(line)
+                out_path = out_path or f"trace_{document['otherData']['trace_id']}.json"
+                with open(out_path, 'w', encoding='utf-8') as out:
+                    json.dump(document, out)
+                return out_path
+    return None
+
+if __name__ == "__main__":
+    path = export_trace(sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] != "last" else None,
+                        sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"--- Trace written to {path} ---" if path else "--- No matching trace found ---")
@@ -2,17 +2,26 @@ import sys
 import os
 import sqlite3
 import random
+import threading
+from contextlib import contextmanager
 
 # Add the parent directory to the path to find other modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import config
+from agents import metrics
 from agents.knowledge_agent import tavily_search
+from agents.contacts_agent import resolve_contact
+from agents.geo_agent import locate, cover_prefixes, haversine_km
+from agents.logistics_agent import compute_route_matrix, format_duration
 
-def _ensure_db_and_table_exist():
-    """Ensures the travel database and all necessary tables exist."""
-    conn = sqlite3.connect(config.TRAVEL_DB_PATH)
-    cursor = conn.cursor()
-    # Create friends table
+# Default radius for find_friend_poi_opportunities.
+NEARBY_RADIUS_KM = getattr(config, "TRAVEL_NEARBY_RADIUS_KM", 50)
+
+# --- NEW: One cached connection, migrated once ---
+_conn = None
+_conn_lock = threading.RLock()
+
+def _create_tables(cursor):
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS friends (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -21,7 +30,6 @@ def _ensure_db_and_table_exist():
             notes TEXT
         )
     """)
-    # Create points_of_interest table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS points_of_interest (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -31,39 +39,129 @@ def _ensure_db_and_table_exist():
             notes TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+
+def _add_coordinates(cursor):
+    """Coordinates, geocoded once at insert time; existing rows are backfilled here."""
+    for table in ("friends", "points_of_interest"):
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        for column, kind in (("lat", "REAL"), ("lon", "REAL"), ("geohash", "TEXT")):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_geohash ON {table}(geohash)")
+        # '' marks a location we couldn't place.
+        pending = cursor.execute(f"SELECT id, location FROM {table} WHERE geohash IS NULL").fetchall()
+        cursor.executemany(f"UPDATE {table} SET lat = ?, lon = ?, geohash = ? WHERE id = ?",
+                           [(*locate(location), row_id) for row_id, location in pending])
+
+def _add_lookup_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_friends_name_nocase ON friends(name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_friends_location ON friends(location)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_poi_location_type ON points_of_interest(location, type)")
+
+def _drop_centroid_coordinates(cursor):
+    """Re-geocodes every row: places missing from the gazetteer used to get a state or country centroid."""
+    for table in ("friends", "points_of_interest"):
+        rows = cursor.execute(f"SELECT id, location FROM {table}").fetchall()
+        cursor.executemany(f"UPDATE {table} SET lat = ?, lon = ?, geohash = ? WHERE id = ?",
+                           [(*locate(location), row_id) for row_id, location in rows])
+
+# Applied in order; PRAGMA user_version records how many have run.
+_MIGRATIONS = [_create_tables, _add_coordinates, _add_lookup_indexes, _drop_centroid_coordinates]
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, step in enumerate(_MIGRATIONS[version:], start=version + 1):
+        with conn:
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+
+@contextmanager
+def _travel_db():
+    """
+    Yields the shared travel DB connection inside a transaction (committed on
+    success, rolled back on error). The schema is brought up to date on first use.
+    """
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            conn = sqlite3.connect(config.TRAVEL_DB_PATH, check_same_thread=False)
+            _migrate(conn)
+            _conn = conn
+        with _conn, metrics.timer("umbra_sqlite_seconds", db="travel", op="transaction"):
+            yield _conn
+
+def _location_from_contacts(name: str):
+    """Looks the friend up in contacts and returns their city and region, if clear."""
+    contact = resolve_contact(name)
+    if not contact:
+        return ""
+    # Keep only the last line with a city in it; street addresses stay out of the travel DB.
+    first_address = contact["location"].split(":::")[0]
+    lines = [line.strip() for line in first_address.split("\n") if "," in line]
+    return lines[-1] if lines else ""
+
+_UPSERT_FRIEND = """
+    INSERT INTO friends (name, location, notes, lat, lon, geohash) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+    location=excluded.location,
+    notes=excluded.notes,
+    lat=excluded.lat,
+    lon=excluded.lon,
+    geohash=excluded.geohash
+"""
+
+_INSERT_POI = """
+    INSERT INTO points_of_interest (name, type, location, notes, lat, lon, geohash) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
 
 def add_friend(name: str, location: str, notes: str):
     """Adds or updates a friend in the travel database."""
-    _ensure_db_and_table_exist()
-    conn = sqlite3.connect(config.TRAVEL_DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO friends (name, location, notes) VALUES (?, ?, ?)
-        ON CONFLICT(name) DO UPDATE SET
-        location=excluded.location,
-        notes=excluded.notes
-    """, (name, location, notes))
-    conn.commit()
-    conn.close()
+    if not location or not location.strip():
+        location = _location_from_contacts(name)
+        if location:
+            print(f"   - Found {name} in your contacts: {location}")
+    with _travel_db() as conn:
+        conn.execute(_UPSERT_FRIEND, (name, location, notes, *locate(location)))
     print(f"\n✅ Friend '{name}' added to the database.")
 
+def _bulk_rows(items, fields):
+    """Normalizes dicts or tuples into value tuples in `fields` order, skipping rows without a name."""
+    rows = []
+    for item in items:
+        if isinstance(item, dict):
+            values = tuple(item.get(field) or "" for field in fields)
+        else:
+            values = (tuple(item) + ("",) * len(fields))[:len(fields)]
+        if values[0]:
+            rows.append(values)
+    return rows
+
+def add_friends(friends):
+    """
+    Adds or updates many friends in a single transaction. Each friend is a
+    (name, location, notes) tuple or a dict with those keys.
+    """
+    rows = _bulk_rows(friends, ("name", "location", "notes"))
+    with _travel_db() as conn:
+        conn.executemany(_UPSERT_FRIEND, [(*row, *locate(row[1])) for row in rows])
+    return f"✅ Added or updated {len(rows)} friends in the travel database."
+
 def update_friend_location(name: str, new_location: str):
     """Updates a specific friend's location in the database."""
-    _ensure_db_and_table_exist()
-    conn = sqlite3.connect(config.TRAVEL_DB_PATH)
-    cursor = conn.cursor()
-    # Use a case-insensitive search to find the friend
-    cursor.execute("UPDATE friends SET location = ? WHERE name LIKE ?", (new_location, f'%{name}%'))
-    
+    values = (new_location, *locate(new_location))
+    with _travel_db() as conn:
+        # Exact (case-insensitive) name first; it's an index lookup.
+        cursor = conn.execute("UPDATE friends SET location = ?, lat = ?, lon = ?, geohash = ? WHERE name = ? COLLATE NOCASE",
+                              (*values, name))
+        if cursor.rowcount == 0:
+            # Fall back to a partial match ("Kevin" for "Kevin Flanagan").
+            cursor = conn.execute("UPDATE friends SET location = ?, lat = ?, lon = ?, geohash = ? WHERE name LIKE ?",
+                                  (*values, f'%{name}%'))
+
     if cursor.rowcount == 0:
         print(f"\nCould not find a friend named '{name}' to update.")
     else:
         print(f"\n✅ Updated location for '{name}' to '{new_location}'.")
-        
-    conn.commit()
-    conn.close()
 
 
 def list_friends(location_filter: str = None):
@@ -71,21 +169,16 @@ def list_friends(location_filter: str = None):
     Lists all friends in the database.
     If a location_filter is provided, it will only list friends in that location.
     """
-    _ensure_db_and_table_exist()
-    conn = sqlite3.connect(config.TRAVEL_DB_PATH)
-    cursor = conn.cursor()
-    
-    if location_filter:
-        # Search for friends where the location contains the filter string
-        cursor.execute("SELECT name, location, notes FROM friends WHERE location LIKE ?", (f'%{location_filter}%',))
-        title = f"--- Umbra's Friends in {location_filter} ---"
-    else:
-        # Get all friends
-        cursor.execute("SELECT name, location, notes FROM friends")
-        title = "--- Umbra's Friends List ---"
-        
-    results = cursor.fetchall()
-    conn.close()
+    with _travel_db() as conn:
+        if location_filter:
+            # Search for friends where the location contains the filter string
+            results = conn.execute("SELECT name, location, notes FROM friends WHERE location LIKE ?",
+                                   (f'%{location_filter}%',)).fetchall()
+            title = f"--- Umbra's Friends in {location_filter} ---"
+        else:
+            # Get all friends
+            results = conn.execute("SELECT name, location, notes FROM friends").fetchall()
+            title = "--- Umbra's Friends List ---"
 
     if not results:
         if location_filter:
@@ -103,41 +196,90 @@ def list_friends(location_filter: str = None):
 
 def add_poi(name: str, poi_type: str, location: str, notes: str):
     """Adds a point of interest to the travel database."""
-    _ensure_db_and_table_exist()
-    conn = sqlite3.connect(config.TRAVEL_DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO points_of_interest (name, type, location, notes) VALUES (?, ?, ?, ?)
-    """, (name, poi_type, location, notes))
-    conn.commit()
-    conn.close()
+    with _travel_db() as conn:
+        conn.execute(_INSERT_POI, (name, poi_type, location, notes, *locate(location)))
     print(f"\n✅ POI '{name}' added to the database.")
 
+def add_pois(pois):
+    """
+    Adds many points of interest in a single transaction. Each POI is a
+    (name, type, location, notes) tuple or a dict with those keys.
+    """
+    rows = _bulk_rows(pois, ("name", "type", "location", "notes"))
+    with _travel_db() as conn:
+        conn.executemany(_INSERT_POI, [(*row, *locate(row[2])) for row in rows])
+    return f"✅ Added {len(rows)} points of interest to the travel database."
 
-def find_friend_poi_opportunities():
-    """Finds friends who live in or near a Point of Interest."""
-    _ensure_db_and_table_exist()
-    conn = sqlite3.connect(config.TRAVEL_DB_PATH)
-    cursor = conn.cursor()
-    # This query joins the two tables on the location column
-    cursor.execute("""
-        SELECT f.name, f.location, p.name, p.type
-        FROM friends f
-        JOIN points_of_interest p ON f.location LIKE '%' || p.location || '%'
-    """)
-    results = cursor.fetchall()
-    conn.close()
+
+def find_friend_poi_opportunities(radius_km: float = None):
+    """
+    Finds friends who live within radius_km of a Point of Interest, closest first.
+    Each POI looks up only the friends in the geohash cells around it, so this
+    stays fast with thousands of rows; places the gazetteer couldn't resolve
+    fall back to matching the location text.
+    """
+    radius_km = float(radius_km) if radius_km not in (None, "") else NEARBY_RADIUS_KM
+    results = [] # (distance_km or None, friend_name, friend_loc, poi_name, poi_type)
+    with _travel_db() as conn:
+        pois = conn.execute("SELECT name, type, location, lat, lon FROM points_of_interest").fetchall()
+        for poi_name, poi_type, poi_loc, poi_lat, poi_lon in pois:
+            if poi_lat is None:
+                rows = conn.execute("SELECT name, location FROM friends WHERE location LIKE ?", (f'%{poi_loc}%',))
+                results.extend((None, f_name, f_loc, poi_name, poi_type) for f_name, f_loc in rows)
+                continue
+            for prefix in cover_prefixes(poi_lat, poi_lon, radius_km):
+                # A prefix match is a range scan on idx_friends_geohash ('{' sorts after every geohash character).
+                rows = conn.execute("""
+                    SELECT name, location, lat, lon FROM friends
+                    WHERE geohash >= ? AND geohash < ? AND geohash != ''
+                """, (prefix, prefix + "{"))
+                for f_name, f_loc, f_lat, f_lon in rows:
+                    distance = haversine_km(poi_lat, poi_lon, f_lat, f_lon)
+                    if distance <= radius_km:
+                        results.append((distance, f_name, f_loc, poi_name, poi_type))
+            # Friends the gazetteer couldn't place are still matched by text.
+            rows = conn.execute("SELECT name, location FROM friends WHERE geohash = '' AND location LIKE ?", (f'%{poi_loc}%',))
+            results.extend((None, f_name, f_loc, poi_name, poi_type) for f_name, f_loc in rows)
 
     if not results:
         return "No friendly opportunities found near your points of interest right now."
 
-    formatted_results = "Found the following opportunities:\n"
-    for friend_name, friend_loc, poi_name, poi_type in results:
-        formatted_results += f"- You could visit your friend **{friend_name}** in **{friend_loc}** and also check out the {poi_type}: **{poi_name}**.\n"
+    results.sort(key=lambda r: (r[0] is None, r[0] or 0.0, r[1], r[3]))
+    formatted_results = f"Found the following opportunities (within {radius_km:g} km):\n"
+    for distance, friend_name, friend_loc, poi_name, poi_type in results:
+        away = f" ({distance:.0f} km away)" if distance is not None else ""
+        formatted_results += f"- You could visit your friend **{friend_name}** in **{friend_loc}** and also check out the {poi_type}: **{poi_name}**{away}.\n"
     
     return formatted_results.strip()
 
 
+def rank_friends_by_travel_time(origin: str = None):
+    """
+    Ranks every friend by driving time from `origin` (your home city by default),
+    using one batched route-matrix lookup instead of a request per friend.
+    """
+    origin = origin or config.HOME_CITY
+    with _travel_db() as conn:
+        friends = conn.execute("SELECT name, location FROM friends WHERE location != ''").fetchall()
+    if not friends:
+        return "You haven't added any friends with a location yet."
+
+    routes = compute_route_matrix([origin], [location for _, location in friends])[0]
+    reachable = sorted(
+        ((route["duration_seconds"], name, route) for (name, _), route in zip(friends, routes) if not route["error"]),
+        key=lambda r: (r[0], r[1])
+    )
+    if not reachable:
+        return f"Couldn't work out driving times from {origin} to any of your friends."
+
+    formatted = f"--- Friends by driving time from {origin} ---\n"
+    for seconds, name, route in reachable:
+        miles = round(route["distance_meters"] * 0.000621371)
+        estimate = " (estimate)" if route["source"] == "estimate" else ""
+        formatted += f"- **{name}** in {route['destination']}: {format_duration(seconds)}, {miles:,} mi{estimate}\n"
+    return formatted.strip()
+
+
 def find_concerts():
     """Picks a random artist and searches for their tour dates."""
     if not config.FAVORITE_ARTISTS:
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import sys
+import os
+
+# Add project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import config
+import server
+from agents import router_agent
+from agents import metrics
+from agents import tracing
+
+# An ASGI front end for the same /status, /chat, /chat/stream and /metrics
+# endpoints as server.py. Requests share one event loop; the blocking work
+# (Ollama, tool HTTP calls, SQLite) runs on worker threads, and at most
+# ASGI_INFERENCE_CONCURRENCY prompts are in front of the LLM at once. Past
+# that, requests wait in a bounded queue, and anything beyond the queue is
+# turned away immediately instead of piling up behind a slow model.
+#
+# Usage: pip install uvicorn, then: python asgi_server.py [port]
+
+# Prompts the LLM works on at the same time. Ollama serves one at a time by default.
+INFERENCE_CONCURRENCY = getattr(config, "ASGI_INFERENCE_CONCURRENCY", 1)
+# Requests allowed to wait for the LLM; more than this get a 429.
+MAX_QUEUE_DEPTH = getattr(config, "ASGI_MAX_QUEUE_DEPTH", 8)
+# Seconds a request may wait for the LLM before giving up with a 503.
+QUEUE_TIMEOUT_SECONDS = getattr(config, "ASGI_QUEUE_TIMEOUT_SECONDS", 30)
+# Seconds a whole /chat request may take before it gets a 504.
+REQUEST_TIMEOUT_SECONDS = getattr(config, "ASGI_REQUEST_TIMEOUT_SECONDS", 60)
+MAX_BODY_BYTES = 1024 * 1024
+
+_CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type"),
+]
+
+class QueueFull(Exception):
+    """Too many requests are already waiting for the LLM."""
+
+class QueueTimeout(Exception):
+    """A request waited longer than QUEUE_TIMEOUT_SECONDS for the LLM."""
+
+class _InferenceGate:
+    """
+    Bounds how many LLM calls run at once and how many may wait for a slot.
+    A slot is only released when the LLM call itself finishes, so a request
+    that times out doesn't let another prompt onto a model that is still busy.
+    """
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._semaphore = None # Created on first use, inside the server's event loop.
+        self.waiting = 0
+        self.running = 0
+        self.stats = {"completed": 0, "rejected": 0, "timed_out": 0}
+
+    async def acquire(self):
+        """Waits for a free slot; raises QueueFull or QueueTimeout instead of waiting too long."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if not self._semaphore.locked():
+            await self._semaphore.acquire() # A slot is free; this doesn't wait.
+        elif self.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFull()
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), QUEUE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                raise QueueTimeout()
+            finally:
+                self.waiting -= 1
+
+    def start(self, func, *args):
+        """Starts func(*args) on a worker thread in a slot taken with acquire(); returns its task."""
+        self.running += 1
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        task.add_done_callback(self._release)
+        return task
+
+    async def run(self, func, *args):
+        """Runs func(*args) on a worker thread once a slot is free."""
+        await self.acquire()
+        # Shielded: if the request is cancelled, the call still owns its slot until it returns.
+        return await asyncio.shield(self.start(func, *args))
+
+    def _release(self, task):
+        self.running -= 1
+        self.stats["completed"] += 1
+        self._semaphore.release()
+
+    def snapshot(self):
+        return {"concurrency": self.concurrency, "max_queue": self.max_queue,
+                "running": self.running, "waiting": self.waiting, **self.stats}
+
+_gate = _InferenceGate(INFERENCE_CONCURRENCY, MAX_QUEUE_DEPTH)
+
+async def _send(send, status: int, body: bytes, content_type: bytes, extra_headers=()):
+    headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode()),
+               *_CORS_HEADERS, *extra_headers]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_json(send, status: int, payload, extra_headers=()):
+    await _send(send, status, json.dumps(payload).encode('utf-8'), b"application/json", extra_headers)
+
+async def _read_body(receive):
+    """Reads the request body, or returns None if it is larger than MAX_BODY_BYTES."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b""
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def status():
+    """A simple endpoint to check if the server is running."""
+    return 200, {"status": "ok", "routing": router_agent.get_router_stats(), "inference": _gate.snapshot()}
+
+async def chat(data):
+    """Handles chat messages from the UI, including history."""
+    user_prompt = data.get('prompt')
+    if not user_prompt:
+        return 400, {"error": "No prompt provided"}
+    history = server._get_history(data)
+
+    print(f"\n[ASGI Server] Received prompt: {user_prompt}")
+    full_prompt_with_history = server._build_prompt(user_prompt, history)
+
+    # Worker threads started with asyncio.to_thread inherit the trace.
+    with tracing.start_trace("chat") as trace_id:
+        thought, decision, route = server._fast_path(user_prompt)
+        if decision is None:
+            print("   - Consulting LLM with conversation history...")
+            with tracing.span("llm queue and decide"):
+                thought, decision = await _gate.run(server._llm_decision, full_prompt_with_history)
+        print(f"   - Route: {route}")
+        print(f"   - LLM Thought: {thought}")
+        print(f"   - LLM Decision: {decision}")
+
+        umbra_response = await asyncio.to_thread(server._finish_turn, data, history, user_prompt, thought, decision)
+    return 200, {"response": umbra_response, "route": route, "trace_id": trace_id}
+
+async def _read_json(receive, send):
+    """Reads the request body as a JSON object, or sends a 4xx and returns None."""
+    body = await _read_body(receive)
+    if body is None:
+        return await _send_json(send, 413, {"error": "Request body too large"})
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return await _send_json(send, 400, {"error": "Request body is not valid JSON"})
+    if not isinstance(data, dict):
+        return await _send_json(send, 400, {"error": "Request body must be a JSON object"})
+    return data
+
+def _retry_after():
+    return [(b"retry-after", str(max(1, int(QUEUE_TIMEOUT_SECONDS // 2))).encode())]
+
+async def _handle_chat(receive, send):
+    data = await _read_json(receive, send)
+    if data is None:
+        return
+
+    retry_after = _retry_after()
+    try:
+        code, payload = await asyncio.wait_for(chat(data), REQUEST_TIMEOUT_SECONDS)
+    except QueueFull:
+        print("   - [ASGI Server] LLM queue is full; request rejected.")
+        return await _send_json(send, 429, {"error": "Umbra is busy. Please try again shortly."}, retry_after)
+    except QueueTimeout:
+        print("   - [ASGI Server] Gave up waiting for the LLM.")
+        return await _send_json(send, 503, {"error": "Umbra is overloaded. Please try again shortly."}, retry_after)
+    except asyncio.TimeoutError:
+        print(f"   - [ASGI Server] Request exceeded {REQUEST_TIMEOUT_SECONDS}s.")
+        return await _send_json(send, 504, {"error": "Umbra took too long to answer."})
+    except Exception as e:
+        print(f"   - [ASGI Server] Request failed: {e}")
+        return await _send_json(send, 500, {"error": "An unexpected error occurred."})
+    await _send_json(send, code, payload)
+
+def _relay_llm_decision(full_prompt, loop, frames):
+    """
+    Runs server._stream_llm_decision on a worker thread, handing each SSE
+    frame to the event loop as it arrives. Returns (thought, decision).
+    """
+    stream = server._stream_llm_decision(full_prompt)
+    try:
+        while True:
+            loop.call_soon_threadsafe(frames.put_nowait, next(stream))
+    except StopIteration as finished:
+        return finished.value
+    finally:
+        loop.call_soon_threadsafe(frames.put_nowait, None)
+
+async def _handle_chat_stream(receive, send):
+    """
+    Streaming version of /chat, like server.py's /chat/stream: 'thought' as
+    soon as Umbra has reasoned, then 'response', then 'done'. The LLM call
+    goes through the same gate as /chat, and a full queue is still answered
+    with a 429/503 before the stream starts.
+    """
+    data = await _read_json(receive, send)
+    if data is None:
+        return
+    user_prompt = data.get('prompt')
+    if not user_prompt:
+        return await _send_json(send, 400, {"error": "No prompt provided"})
+    history = server._get_history(data)
+
+    print(f"\n[ASGI Server] Received streaming prompt: {user_prompt}")
+    full_prompt_with_history = server._build_prompt(user_prompt, history)
+
+    with tracing.start_trace("chat/stream") as trace_id:
+        thought, decision, route = server._fast_path(user_prompt)
+        print(f"   - Route: {route}")
+        decided = None
+        if decision is None:
+            try:
+                await _gate.acquire()
+            except QueueFull:
+                print("   - [ASGI Server] LLM queue is full; request rejected.")
+                return await _send_json(send, 429, {"error": "Umbra is busy. Please try again shortly."}, _retry_after())
+            except QueueTimeout:
+                print("   - [ASGI Server] Gave up waiting for the LLM.")
+                return await _send_json(send, 503, {"error": "Umbra is overloaded. Please try again shortly."}, _retry_after())
+            frames = asyncio.Queue()
+            decided = _gate.start(_relay_llm_decision, full_prompt_with_history, asyncio.get_running_loop(), frames)
+
+        headers = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                   (b"x-accel-buffering", b"no"), *_CORS_HEADERS]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+        async def emit(frame: str):
+            await send({"type": "http.response.body", "body": frame.encode('utf-8'), "more_body": True})
+
+        try:
+            if decided is not None:
+                async def relay():
+                    while (frame := await frames.get()) is not None:
+                        await emit(frame)
+                    return await asyncio.shield(decided)
+                thought, decision = await asyncio.wait_for(relay(), REQUEST_TIMEOUT_SECONDS)
+
+            print(f"   - LLM Decision: {decision}")
+            umbra_response = "I'm not sure how to respond to that."
+            if decision and decision.get("tool"):
+                umbra_response = await asyncio.to_thread(server.execute_tool, decision.get("tool"), decision.get("args", []))
+            await emit(server._sse("response", {"response": str(umbra_response), "route": route, "trace_id": trace_id}))
+
+            await asyncio.to_thread(server._remember_turn, data, history, user_prompt, umbra_response)
+            await asyncio.to_thread(server._log_turn, user_prompt, thought, decision)
+        except asyncio.TimeoutError:
+            print(f"   - [ASGI Server] Request exceeded {REQUEST_TIMEOUT_SECONDS}s.")
+            await emit(server._sse("error", {"error": "Umbra took too long to answer."}))
+        except Exception as e:
+            print(f"   - [ASGI Server] Request failed: {e}")
+            await emit(server._sse("error", {"error": "An unexpected error occurred."}))
+    await send({"type": "http.response.body", "body": server._sse("done", {}).encode('utf-8')})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            server.start_up()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": list(_CORS_HEADERS)})
+        await send({"type": "http.response.body", "body": b""})
+    elif path == "/status" and method == "GET":
+        await _send_json(send, *await status())
+    elif path == "/metrics" and method == "GET":
+        await _send(send, 200, metrics.render_prometheus().encode('utf-8'), b"text/plain; version=0.0.4")
+    elif path == "/chat" and method == "POST":
+        await _handle_chat(receive, send)
+    elif path == "/chat/stream" and method == "POST":
+        await _handle_chat_stream(receive, send)
+    else:
+        await _send_json(send, 404, {"error": f"No route for {method} {path}"})
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The ASGI server needs uvicorn: pip install uvicorn")
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else getattr(config, "ASGI_PORT", 5000)
+    uvicorn.run(app, host="127.0.0.1", port=port)
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+import tempfile
+
+# Add the project root to the path to find the agents
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents import http_client
+from agents.knowledge_agent import get_weather, tavily_search
+from stub_server import start_stub_server, request_counts
+
+_QUERIES = ["best personal finance books", "Hozier tour dates", "Seneca quote about time"]
+
+def _timed(label: str, calls: int, func):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"   - {label:<32} {elapsed / calls * 1e6:10.1f} µs/call")
+
+def run_benchmark(latency_ms: float = 50.0, calls: int = 2000):
+    """Compares uncached calls against memory and disk cache hits, using the local stub server."""
+    server, url = start_stub_server(latency_ms=latency_ms)
+    http_client.BASE_URL_OVERRIDE = url
+    http_client.CACHE_DB_PATH = os.path.join(tempfile.mkdtemp(), "http_cache.db")
+    print(f"--- HTTP cache benchmark: stub server at {url}, {latency_ms:g} ms simulated latency ---")
+
+    _timed("miss (network round trip)", len(_QUERIES), lambda: tavily_search(_QUERIES[request_counts().get("/search", 0)]))
+    _timed("search, memory hit", calls, lambda: tavily_search(_QUERIES[0]))
+    _timed("search, normalized-query hit", calls, lambda: tavily_search("  BEST personal   finance books "))
+    get_weather("Boston")
+    _timed("weather, memory hit", calls, lambda: get_weather("Boston"))
+
+    with http_client._memory_lock:
+        http_client._memory.clear()
+    _timed("search, disk hit (cold process)", 1, lambda: tavily_search(_QUERIES[1]))
+
+    print(f"   - Requests that reached the server: {sum(request_counts().values())}")
+    print(f"   - Cache stats: {http_client.get_http_cache_stats()}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    run_benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 50.0)
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import random
+
+# Add the project root to the path to find the agents
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents import privacy_agent
+
+_SAMPLES = [
+    "Call Kevin at (508) 399-6111 when you land.",
+    "Her e-mail is jane.doe+umbra@example.com, reply by Friday.",
+    "Ship it to 433 Union St, East Bridgewater, MA 02333.",
+    "The weather in Boston is 54°F with light rain.",
+    "Found 3 contacts matching 'Gardner'.",
+    "Mailing address ZIP is 01440-1333, PO box pending.",
+    "Umbra: I searched the web and found five results about finance books.",
+]
+
+def _corpus(lines: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [rng.choice(_SAMPLES) for _ in range(lines)]
+
+def _throughput(label: str, megabytes: float, seconds: float):
+    print(f"   - {label:<28} {megabytes / seconds:8.1f} MB/s  ({seconds * 1000:.1f} ms)")
+
+def run_benchmark(lines: int = 50000):
+    """Measures redaction throughput for single, batch and streaming use."""
+    texts = _corpus(lines)
+    megabytes = sum(len(t) for t in texts) / 1e6
+    print(f"--- Redaction benchmark: {lines} lines, {megabytes:.2f} MB ---")
+
+    start = time.perf_counter()
+    for text in texts:
+        privacy_agent.redact(text)
+    _throughput("redact() per line", megabytes, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    privacy_agent.redact_many(texts)
+    _throughput("redact_many() batch", megabytes, time.perf_counter() - start)
+
+    document = "\n".join(texts)
+    chunks = [document[i:i + 16] for i in range(0, len(document), 16)] # ~LLM token-sized
+    start = time.perf_counter()
+    for _ in privacy_agent.redact_stream(chunks):
+        pass
+    _throughput("redact_stream() 16-char chunks", megabytes, time.perf_counter() - start)
+
+    known = privacy_agent.load_known_pii_from_contacts()
+    start = time.perf_counter()
+    privacy_agent.redact_many(texts)
+    _throughput(f"batch + {known} known values", megabytes, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
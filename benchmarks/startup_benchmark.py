@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import datetime
+import platform
+import statistics
+import subprocess
+
+# Add the project root to the path to find the agents
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Every run is appended here, so startup time can be compared across changes.
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_history.jsonl")
+_TARGETS = ["orchestrator", "server"]
+
+def _git_revision():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def _parse_importtime(stderr: str, module: str):
+    """
+    Reads `python -X importtime` output. Returns (total_us, {direct import: cumulative_us})
+    for `module`, or (None, {}) if it never finished importing.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative)))
+
+    # Children are printed before their parent, so the target's direct imports
+    # are the depth-1 entries just above its own line.
+    for index, (depth, name, cumulative) in enumerate(entries):
+        if depth == 0 and name == module:
+            direct = {}
+            for child_depth, child, child_cumulative in reversed(entries[:index]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    direct[child] = child_cumulative
+            return cumulative, direct
+    return None, {}
+
+def measure_import(module: str, runs: int = 5):
+    """Imports `module` in fresh interpreters and returns the median run's numbers."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    samples = []
+    for run in range(runs + 1):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=ROOT, env=env, capture_output=True, text=True)
+        total, direct = _parse_importtime(result.stderr, module)
+        if result.returncode != 0 or total is None:
+            error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+            return {"module": module, "error": error}
+        if run > 0: # The first run only warms __pycache__ and the OS file cache.
+            samples.append((total, direct))
+
+    total, direct = sorted(samples, key=lambda sample: sample[0])[len(samples) // 2]
+    slowest = sorted(direct.items(), key=lambda item: -item[1])[:8]
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "spread_ms": round(statistics.pstdev(s[0] for s in samples) / 1000, 1),
+        "slowest_imports_ms": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+def _previous(module: str):
+    """The last successful recorded result for `module`, or None."""
+    try:
+        with open(HISTORY_PATH, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return None
+    matching = [r for r in records if r.get("module") == module and "total_ms" in r]
+    return matching[-1] if matching else None
+
+def run_benchmark(runs: int = 5, save: bool = True):
+    """Measures the import time of each entry point and appends the results to the history."""
+    revision = _git_revision()
+    print(f"--- Startup benchmark: python -X importtime, median of {runs} runs (revision {revision}) ---")
+    results = []
+    for module in _TARGETS:
+        result = measure_import(module, runs)
+        result.update({"date": datetime.datetime.now().isoformat(timespec="seconds"), "revision": revision,
+                       "python": platform.python_version()})
+        if "error" in result:
+            print(f"   - {module:<14} could not be imported: {result['error']}")
+        else:
+            previous = _previous(module)
+            change = ""
+            if previous:
+                delta = (result["total_ms"] - previous["total_ms"]) / previous["total_ms"] * 100
+                change = f"  (was {previous['total_ms']:.1f} ms at {previous.get('revision')}, {delta:+.0f}%)"
+            print(f"   - {module:<14} {result['total_ms']:8.1f} ms ± {result['spread_ms']:.1f}{change}")
+            for name, ms in result["slowest_imports_ms"].items():
+                print(f"       {name:<40} {ms:8.1f} ms")
+        results.append(result)
+
+    if save:
+        with open(HISTORY_PATH, 'a', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        print(f"   - Results appended to {HISTORY_PATH}")
+    return results
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:] if arg.isdigit()]
+    run_benchmark(counts[0] if counts else 5, save="--no-save" not in sys.argv)
@@ -0,0 +1,16 @@
+import sys
+from agents.contacts_agent import import_contacts
+
+def run_import(paths):
+    """
+    Compiles one or more Google contact exports into Umbra's contacts snapshot.
+    Run it again whenever you export a fresh copy; only changed contacts are written.
+
+    Usage: python import_contacts.py contact.csv contacts.csv
+    """
+    print(f"--- Importing contacts from: {', '.join(paths) or 'config.CONTACTS_FILE_PATH'} ---")
+    print(f"   - {import_contacts(*paths)}")
+    print("--- Import Complete ---")
+
+if __name__ == "__main__":
+    run_import(sys.argv[1:])
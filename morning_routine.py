@@ -8,20 +8,28 @@ def run_learning_routine():
     """
     print(f"--- Running Umbra's Morning Research Routine at {datetime.datetime.now()} ---")
     
-    # 1. Define the research topic for the day
-    # In the future, this could be randomly selected from a list in config.py
-    topic_of_the_day = "finance books"
+    # 1. Research every topic in config.RESEARCH_TOPICS. Only sources that
+    # weren't ingested on an earlier run are synthesized, and a crashed run
+    # resumes from its checkpoint.
+    learning_agent.run_research()
     
-    # 2. Perform the research task
-    insight = learning_agent.research_and_learn(topic_of_the_day)
-    
-    # 3. Log the synthesized insight to memory with a special tag
-    memory_to_log = f"Learned Insight on '{topic_of_the_day}': {insight}"
-    memory_agent.add_memory(memory_to_log)
-    print("   - Research findings logged to memory.")
+    # 2. Log each synthesized insight to memory with a special tag. They are read
+    # back from the learning log, so an insight a crash kept out of memory last
+    # time is logged now; each is marked only once its memory is committed.
+    logged = 0
+    writer = memory_agent.ensure_database()
+    for run_id, topic, insight in learning_agent.unlogged_insights():
+        memory_to_log = f"Learned Insight on '{topic}': {insight}"
+        pending = writer.submit((datetime.datetime.now().isoformat(), "Learned Insight", memory_to_log))
+        pending.wait()
+        if pending.error is not None:
+            print(f"   - Couldn't log the insight on '{topic}' ({pending.error}); it will be retried on the next run.")
+            continue
+        learning_agent.mark_insight_logged(run_id, topic)
+        logged += 1
+    print(f"   - {logged} new research finding(s) logged to memory.")
     
     print("--- Morning Routine Complete ---")
 
 if __name__ == "__main__":
     run_learning_routine()
-
@@ -1,40 +1,39 @@
 import sys
-import json
-import datetime
-import inspect
+import functools
 
 # --- Agent Imports ---
-from agents.memory_agent import add_memory, get_daily_memory_insight, search_memories, review_memories
-from agents.knowledge_agent import get_weather, tavily_search
-from agents.comms_agent import send_email
-from agents.travel_agent import (
-    add_friend, add_poi, update_friend_location, list_friends,
-    find_friend_poi_opportunities
-)
-from agents.contacts_agent import find_contact, check_contacts
-from agents.inspiration_agent import get_daily_quote
-from agents.logistics_agent import get_route_info
-from agents.llm_agent import initialize_llm_system, decide_tool
+# Only what the prompt loop itself needs; every tool's agent is imported on
+# first use (or by the background warm-up), see agents/tool_registry.py.
+from agents import router_agent
+from agents import metrics
+from agents import tracing
+from agents.tool_registry import lazy_tool, run_steps, warm_up
+from agents.history_agent import ConversationHistory
+from agents.privacy_agent import redact, load_known_pii_from_contacts
 
 # --- Local Imports ---
 import config
 
+add_memory = lazy_tool("agents.memory_agent:add_memory")
+
 # The master dictionary mapping tool names to their functions
 tool_map = {
-    "add-friend": add_friend,
-    "add-poi": add_poi,
-    "check-contacts": check_contacts,
+    "add-friend": lazy_tool("agents.travel_agent:add_friend"),
+    "add-poi": lazy_tool("agents.travel_agent:add_poi"),
+    "check-contacts": lazy_tool("agents.contacts_agent:check_contacts"),
     "debug": None,
-    "discover": find_friend_poi_opportunities,
-    "distance": get_route_info,
-    "list-friends": list_friends,
+    "discover": lazy_tool("agents.travel_agent:find_friend_poi_opportunities"),
+    "distance": lazy_tool("agents.logistics_agent:get_route_info"),
+    "list-friends": lazy_tool("agents.travel_agent:list_friends"),
     "log": add_memory,
-    "quote": get_daily_quote,
-    "recall": search_memories,
-    "review-memories": review_memories,
-    "search": tavily_search,
-    "update-friend": update_friend_location,
-    "weather": get_weather,
+    "quote": lazy_tool("agents.inspiration_agent:get_daily_quote"),
+    "recall": lazy_tool("agents.memory_agent:search_memories"),
+    "review-memories": lazy_tool("agents.memory_agent:review_memories"),
+    "search": lazy_tool("agents.knowledge_agent:tavily_search"),
+    "semantic-recall": lazy_tool("agents.semantic_memory:semantic_recall"),
+    "travel-times": lazy_tool("agents.travel_agent:rank_friends_by_travel_time"),
+    "update-friend": lazy_tool("agents.travel_agent:update_friend_location"),
+    "weather": lazy_tool("agents.knowledge_agent:get_weather"),
     "briefing": None,
     "conversation": None,
 }
@@ -73,41 +72,122 @@ def execute_action(decision):
 
     try:
         tool_function = tool_map[tool_name]
-        sig = inspect.signature(tool_function)
-        required_args_count = len(sig.parameters)
-        
-        if len(args) != required_args_count:
+        if not router_agent.accepts_arg_count(tool_function, len(args)):
+            metrics.inc("umbra_tool_arity_mismatches_total", tool=tool_name)
             error_message = (
                 f"\n[SELF-DEBUG] Tool Mismatch Error:\n"
                 f"  - The LLM tried to call the tool '{tool_name}' with {len(args)} arguments.\n"
-                f"  - However, the tool's function requires exactly {required_args_count} arguments."
+                f"  - However, the tool's function takes {router_agent.describe_arity(tool_function)} arguments."
             )
             print(error_message)
             return
 
-        result = tool_function(*args)
+        with metrics.timer("umbra_tool_seconds", tool=tool_name):
+            result = tool_function(*args)
         if result:
-            print(f"\n{result}")
+            print(f"\n{redact(str(result))}")
         print(f"   - Tool '{tool_name}' executed successfully.")
 
     except Exception as e:
+        metrics.inc("umbra_tool_errors_total", tool=tool_name)
         print(f"\nAn unexpected error occurred with tool '{tool_name}': {e}")
 
+def consult_llm(full_prompt):
+    """
+    Streams the LLM's answer, showing the thought as soon as it is formed and
+    returning the moment the decision is complete.
+    """
+    from agents.llm_agent import stream_decide_tool
+    thought = "The LLM did not provide a thought."
+    decision = None
+    events = stream_decide_tool(full_prompt)
+    try:
+        for event in events:
+            if event["type"] == "thought":
+                thought = event["thought"]
+                print(f"   🤔 Umbra's Thought: {thought}")
+            elif event["type"] == "decision":
+                decision = event["decision"]
+                break
+    finally:
+        events.close()
+    return thought, decision
+
 def run_briefing():
-    """Assembles and sends the daily briefing email."""
-    # (This function's logic remains the same)
-    pass
+    """Assembles and sends the daily briefing email, using the same pipeline as send_briefing.py."""
+    from send_briefing import run_briefing_and_send # Pulls in the Gmail client; only needed here.
+    run_briefing_and_send()
+
+def handle_turn(user_prompt, conversation_history):
+    """Decides on and runs one turn of the conversation, traced as a unit."""
+    with tracing.start_trace("turn"):
+        # --- NEW: Prepend conversation history to the prompt ---
+        history_context = conversation_history.render()
+        full_prompt = f"--- Recent Conversation History ---\n{history_context}\n\n--- Current Prompt ---\n{user_prompt}"
+
+        # --- NEW: Direct commands skip the LLM entirely ---
+        with tracing.span("route"):
+            decision, route = router_agent.route(user_prompt, tool_map)
+        if decision:
+            thought = f"Direct '{decision['tool']}' command; no LLM needed."
+            print(f"   ⚡ Served by the {route}.")
+        else:
+            print("\n   - Consulting LLM with conversation history...")
+            thought, decision = consult_llm(full_prompt)
+
+        # --- NEW: Update conversation history ---
+        # Add user prompt to history
+        conversation_history.add(f"Kyle: {user_prompt}")
+
+        # Add Umbra's response to history
+        if decision and decision.get("tool") == "conversation":
+             umbra_response = " ".join(map(str, decision.get("args", [])))
+             conversation_history.add(f"Umbra: {umbra_response}")
+        else:
+             conversation_history.add(f"Umbra: [Executed tool: {decision.get('tool') if decision else 'None'}]")
+        # Older turns are folded into a background summary once over budget.
+
+
+        if decision and decision.get("tool"):
+            execute_action(decision)
+            log_category = "User Command"
+        else:
+            print("\nUmbra: I'm not sure which tool to use. Let's talk about it.")
+            log_category = "User Conversation"
+
+        log_entry = f"User: '{user_prompt}' | Thought: '{thought}' | Action: {decision}"
+        add_memory(redact(log_entry), log_category)
+        print(f"💾 Memory stored in database: {config.MEMORY_DB_PATH}")
+
+def required_steps():
+    """What has to be ready before the first prompt: redaction of known PII and the memory DB."""
+    return [
+        load_known_pii_from_contacts,
+        lazy_tool("agents.memory_agent:ensure_database"),
+    ]
+
+def startup_steps():
+    """What can finish while Kyle types, in order."""
+    steps = [
+        functools.partial(lazy_tool("agents.llm_agent:warm_up_llm"), background=False),
+    ]
+    if router_agent.USE_CLASSIFIER:
+        steps.append(functools.partial(router_agent.train_classifier_from_memories, tool_map))
+    return steps
 
 def main():
     """The main application loop."""
     print("--- Umbra OS v3.2 (Conversational Memory) Activated ---")
-    if not initialize_llm_system():
+    if not lazy_tool("agents.llm_agent:initialize_llm_system")():
         return
-    
     print_help()
     
-    # --- NEW: Short-Term Conversational Memory ---
-    conversation_history = []
+    # --- NEW: Short-Term Conversational Memory (token-budgeted) ---
+    conversation_history = ConversationHistory()
+
+    # --- NEW: Load the LLM and agents while Kyle types ---
+    run_steps(required_steps())
+    warm_up(tool_map, steps=startup_steps())
 
     while True:
         try:
@@ -118,44 +198,14 @@ def main():
             if user_prompt.lower() == "help":
                 print_help()
                 continue
+            if user_prompt.lower() == "routing":
+                print(f"\n{router_agent.get_router_stats()}\n")
+                continue
+            if user_prompt.lower() == "metrics":
+                print(f"\n{metrics.summarize()}\n")
+                continue
 
-            # --- NEW: Prepend conversation history to the prompt ---
-            history_context = "\n".join(conversation_history)
-            full_prompt = f"--- Recent Conversation History ---\n{history_context}\n\n--- Current Prompt ---\n{user_prompt}"
-
-            print("\n   - Consulting LLM with conversation history...")
-            llm_response = decide_tool(full_prompt)
-
-            thought = llm_response.get("thought", "The LLM did not provide a thought.")
-            decision = llm_response.get("decision")
-            print(f"   🤔 Umbra's Thought: {thought}")
-            
-            # --- NEW: Update conversation history ---
-            # Add user prompt to history
-            conversation_history.append(f"Kyle: {user_prompt}")
-            
-            # Add Umbra's response to history
-            if decision and decision.get("tool") == "conversation":
-                 umbra_response = " ".join(map(str, decision.get("args", [])))
-                 conversation_history.append(f"Umbra: {umbra_response}")
-            else:
-                 conversation_history.append(f"Umbra: [Executed tool: {decision.get('tool') if decision else 'None'}]")
-            
-            # Keep history to a manageable size (e.g., last 40 exchanges)
-            if len(conversation_history) > 40:
-                conversation_history = conversation_history[-40:]
-
-
-            if decision and decision.get("tool"):
-                execute_action(decision)
-                log_category = "User Command"
-            else:
-                print("\nUmbra: I'm not sure which tool to use. Let's talk about it.")
-                log_category = "User Conversation"
-
-            log_entry = f"User: '{user_prompt}' | Thought: '{thought}' | Action: {decision}"
-            add_memory(log_entry, log_category)
-            print(f"💾 Memory stored in database: {config.MEMORY_DB_PATH}")
+            handle_turn(user_prompt, conversation_history)
 
         except KeyboardInterrupt:
             print("\n\nDeactivating Umbra. Goodbye.")
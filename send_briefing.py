@@ -1,5 +1,108 @@
 import datetime
-from agents import inspiration_agent, knowledge_agent, memory_agent, comms_agent
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from agents import inspiration_agent, knowledge_agent, memory_agent, comms_agent, tracing
+import config
+
+# Seconds each section may take before the briefing goes out without it.
+SECTION_DEADLINES = {
+    "quote": 8.0,
+    "insight": 3.0,
+    "weather": 5.0,
+    **getattr(config, "BRIEFING_SECTION_DEADLINES", {}),
+}
+# Last good value of every section, used when a section misses its deadline.
+BRIEFING_CACHE_PATH = getattr(config, "BRIEFING_CACHE_PATH", "briefing_cache.json")
+
+def _learned_insight():
+    """Today's most recent insight logged by the morning routine."""
+    midnight = datetime.datetime.combine(datetime.date.today(), datetime.time.min).isoformat()
+    rows, _ = memory_agent.query_memories("Learned Insight", since=midnight, limit=20)
+    if not rows:
+        return "No new insights learned this morning."
+    newest = max(rows, key=lambda row: row['id'])
+    return newest['memory']
+
+# (key, heading, producer, placeholder). A producer that returns nothing or an error message has failed.
+_SECTIONS = [
+    ("quote", "Thought for the Day", inspiration_agent.get_daily_quote, "No quote today. The web is quiet."),
+    ("insight", "Today's Learning", _learned_insight, "No new insights learned this morning."),
+    ("weather", "Weather", knowledge_agent.get_weather, "The weather report is unavailable right now."),
+]
+
+def _failed(value):
+    return not value or str(value).startswith(("Error", "An unexpected error", "Could not"))
+
+def _timed(producer):
+    start = time.monotonic()
+    return producer(), time.monotonic() - start
+
+def _load_cache():
+    try:
+        with open(BRIEFING_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    try:
+        with open(BRIEFING_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"   - Could not save the briefing cache: {e}")
+
+def assemble_briefing():
+    """
+    Runs every section producer concurrently, each with its own deadline.
+    A section that times out or fails falls back to its last good value
+    (marked with its date) or a placeholder, so one slow API can't hold up
+    the briefing. Returns (sections, timings): {key: text} and
+    {key: {"seconds", "status"}} with status ok, cached, placeholder, timeout or error.
+    """
+    cache = _load_cache()
+    sections, timings = {}, {}
+    start = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(_SECTIONS), thread_name_prefix="briefing")
+    futures = {key: pool.submit(tracing.bind(_timed), producer) for key, _, producer, _ in _SECTIONS}
+
+    for key, _, _, placeholder in _SECTIONS:
+        deadline = SECTION_DEADLINES.get(key, 5.0)
+        status = "ok"
+        try:
+            value, elapsed = futures[key].result(timeout=max(0.0, deadline - (time.monotonic() - start)))
+            if _failed(value):
+                status = "error"
+        except FutureTimeoutError:
+            value, elapsed, status = None, deadline, "timeout"
+        except Exception as e:
+            print(f"   - Briefing section '{key}' failed: {e}")
+            value, elapsed, status = None, time.monotonic() - start, "error"
+
+        if status == "ok":
+            cache[key] = {"value": value, "date": datetime.date.today().isoformat()}
+        elif key in cache:
+            value = f"{cache[key]['value']}\n(from {cache[key]['date']})"
+            status = f"cached after {status}"
+        else:
+            value = placeholder
+            status = f"placeholder after {status}"
+        sections[key] = value
+        timings[key] = {"seconds": round(elapsed, 3), "status": status}
+
+    # Don't wait for producers that overran their deadline.
+    pool.shutdown(wait=False, cancel_futures=True)
+    _save_cache(cache)
+    return sections, timings
+
+def compose_briefing(sections):
+    """Builds the email (subject, body) from the assembled sections."""
+    subject = f"Umbra's Daily Briefing - {datetime.date.today().strftime('%A, %B %d')}"
+    body = "Good morning.\n\nHere is your daily briefing:\n\n"
+    for key, heading, _, _ in _SECTIONS:
+        body += f"--- {heading} ---\n{sections[key]}\n\n"
+    body += "Have a productive day.\n- Umbra"
+    return subject, body
 
 def run_briefing_and_send():
     """
@@ -7,37 +110,21 @@ def run_briefing_and_send():
     It assembles and sends the daily briefing email.
     """
     print(f"--- Assembling and Sending Briefing at {datetime.datetime.now()} ---")
-    
-    # 1. Gather all the components for the email
-    daily_quote = inspiration_agent.get_daily_quote()
-    weather_report = knowledge_agent.get_weather()
-    
-    # 2. Recall the specific insights logged by the morning routine
-    learned_insight = memory_agent.search_memories("Learned Insight:")
-    # Remove the "No memories found" default message if nothing is there yet
-    if "No memories found" in learned_insight:
-        learned_insight = "No new insights learned this morning."
-    else:
-        # Clean up the output from search_memories
-        learned_insight = learned_insight.replace("Found 1 memories containing 'Learned Insight:':\n", "")
-        learned_insight = learned_insight.split("] ", 1)[1] # Get text after the timestamp
-
-    # 3. Assemble the email
-    subject = f"Umbra's Daily Briefing - {datetime.date.today().strftime('%A, %B %d')}"
-    body = (
-        f"Good morning.\n\n"
-        f"Here is your daily briefing:\n\n"
-        f"--- Thought for the Day ---\n{daily_quote}\n\n"
-        f"--- Today's Learning ---\n{learned_insight}\n\n"
-        f"--- Weather ---\n{weather_report}\n\n"
-        f"Have a productive day.\n- Umbra"
-    )
-    
-    # 4. Send the email
+
+    # 1. Gather all the components for the email, in parallel
+    sections, timings = assemble_briefing()
+    for key, timing in timings.items():
+        print(f"   - {key}: {timing['seconds']:.2f}s ({timing['status']})")
+
+    # 2. Assemble the email
+    subject, body = compose_briefing(sections)
+
+    # 3. Send the email
     email_status = comms_agent.send_email(subject, body)
     print(f"   - {email_status}")
 
     print("--- Briefing Sent ---")
+    return timings
 
 
 if __name__ == "__main__":
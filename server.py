@@ -1,47 +1,66 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import sys
 import os
 import json
-import inspect
+import functools
+import threading
+from collections import OrderedDict
 
 # Add project root to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# --- Import all of Umbra's agents and tools ---
-from agents.llm_agent import initialize_llm_system, decide_tool
+# --- Import Umbra's core; each tool's agent is imported on first use ---
+from agents.llm_agent import initialize_llm_system, decide_tool, stream_decide_tool, warm_up_llm
 from agents import memory_agent 
-from agents.knowledge_agent import get_weather, tavily_search
-from agents.travel_agent import add_friend, add_poi, update_friend_location, list_friends, find_friend_poi_opportunities
-from agents.contacts_agent import check_contacts
-from agents.logistics_agent import get_route_info
-from agents.inspiration_agent import get_daily_quote
-from agents.learning_agent import research_market_trends
+from agents import router_agent
+from agents import metrics
+from agents import tracing
+from agents.tool_registry import lazy_tool, run_steps, warm_up
+from agents.history_agent import ConversationHistory
+from agents.privacy_agent import redact, load_known_pii_from_contacts
 import config
 
-# Initialize Flask App and Umbra's "Brain"
+# Initialize Flask App; Umbra's "Brain" is loaded by start_up()
 app = Flask(__name__)
 CORS(app)
-initialize_llm_system()
 
 # --- The Complete Tool Map for the Web Server ---
 tool_map = {
-    "add-friend": add_friend,
-    "add-poi": add_poi,
-    "check-contacts": check_contacts,
-    "discover": find_friend_poi_opportunities,
-    "distance": get_route_info,
-    "list-friends": list_friends,
+    "add-friend": lazy_tool("agents.travel_agent:add_friend"),
+    "add-poi": lazy_tool("agents.travel_agent:add_poi"),
+    "check-contacts": lazy_tool("agents.contacts_agent:check_contacts"),
+    "discover": lazy_tool("agents.travel_agent:find_friend_poi_opportunities"),
+    "distance": lazy_tool("agents.logistics_agent:get_route_info"),
+    "list-friends": lazy_tool("agents.travel_agent:list_friends"),
     "log": lambda *args: memory_agent.add_memory(args[0], "Manual Log from Web"),
-    "quote": get_daily_quote,
+    "quote": lazy_tool("agents.inspiration_agent:get_daily_quote"),
     "recall": memory_agent.search_memories,
-    "research": research_market_trends,
-    "search": tavily_search,
-    "update-friend": update_friend_location,
-    "weather": get_weather,
+    "research": lazy_tool("agents.learning_agent:research_market_trends"),
+    "search": lazy_tool("agents.knowledge_agent:tavily_search"),
+    "semantic-recall": lazy_tool("agents.semantic_memory:semantic_recall"),
+    "travel-times": lazy_tool("agents.travel_agent:rank_friends_by_travel_time"),
+    "update-friend": lazy_tool("agents.travel_agent:update_friend_location"),
+    "weather": lazy_tool("agents.knowledge_agent:get_weather"),
     "conversation": lambda *args: " ".join(map(str, args)),
 }
 
+def start_up(background: bool = None):
+    """
+    Loads known PII from contacts and sets up the memory DB before returning,
+    so no response is redacted without the known values. Then loads the
+    system prompt, warms up Ollama and preloads every tool, in the background
+    unless STARTUP_WARM_UP is False; requests arriving first load what they need.
+    """
+    run_steps([load_known_pii_from_contacts, memory_agent.ensure_database])
+    steps = [
+        initialize_llm_system,
+        functools.partial(warm_up_llm, background=False),
+    ]
+    if router_agent.USE_CLASSIFIER:
+        steps.append(functools.partial(router_agent.train_classifier_from_memories, tool_map))
+    return warm_up(tool_map, steps=steps, background=background)
+
 def execute_tool(tool_name, args):
     """Finds and executes the correct tool from the tool_map."""
     if tool_name not in tool_map:
@@ -50,61 +69,197 @@ def execute_tool(tool_name, args):
     tool_function = tool_map[tool_name]
     
     try:
-        sig = inspect.signature(tool_function)
-        required_args_count = len(sig.parameters)
-        
         # --- ENHANCED SELF-DEBUGGING ---
         # If the LLM provides the wrong number of arguments, catch it and respond gracefully.
-        if len(args) != required_args_count:
+        if not router_agent.accepts_arg_count(tool_function, len(args)):
+            metrics.inc("umbra_tool_arity_mismatches_total", tool=tool_name)
             # Formulate a helpful, conversational error message from Umbra's perspective.
             return (f"I tried to use my '{tool_name}' tool, but I didn't have all the information I needed. "
-                    f"That tool requires {required_args_count} pieces of information, but I only found {len(args)}. "
+                    f"That tool takes {router_agent.describe_arity(tool_function)} pieces of information, but I found {len(args)}. "
                     f"Could you please rephrase your request with all the necessary details?")
 
-        result = tool_function(*args)
-        return result if result else f"Successfully executed: {tool_name}"
+        with metrics.timer("umbra_tool_seconds", tool=tool_name):
+            result = tool_function(*args)
+        # Tool output goes straight to the browser; scrub any PII first.
+        return redact(str(result)) if result else f"Successfully executed: {tool_name}"
 
     except Exception as e:
+        metrics.inc("umbra_tool_errors_total", tool=tool_name)
         return f"An error occurred while executing '{tool_name}': {e}"
 
 
 @app.route('/status', methods=['GET'])
 def status():
     """A simple endpoint to check if the server is running."""
-    return jsonify({"status": "ok"})
+    return jsonify({"status": "ok", "routing": router_agent.get_router_stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms and counters for every stage of a turn, in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# Token-budgeted conversation histories, one per chat session.
+_MAX_SESSIONS = 100
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def _get_history(data):
+    """
+    Returns the ConversationHistory for this request. Browsers that send a
+    session_id get a server-side history that persists between turns; any raw
+    'history' array is only used to seed a session the server hasn't seen.
+    """
+    session_id = data.get('session_id')
+    seed = data.get('history', [])
+    if not session_id:
+        # Stateless client: bound whatever it sent, without background summaries.
+        history = ConversationHistory(summarize=False)
+        for line in seed:
+            history.add(line)
+        return history
+
+    with _sessions_lock:
+        history = _sessions.get(session_id)
+        if history is None:
+            history = ConversationHistory()
+            for line in seed:
+                history.add(line)
+            _sessions[session_id] = history
+            if len(_sessions) > _MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        _sessions.move_to_end(session_id)
+    return history
+
+def _build_prompt(user_prompt, history):
+    """Prepends the bounded conversation history to the prompt."""
+    history_str = history.render()
+    return f"--- Recent Conversation History ---\n{history_str}\n\n--- Current Prompt ---\n{user_prompt}"
+
+def _remember_turn(data, history, user_prompt, umbra_response):
+    """Adds the finished turn to a server-side session history."""
+    if data.get('session_id'):
+        history.add(f"Kyle: {user_prompt}")
+        history.add(f"Umbra: {umbra_response}")
+
+def _log_turn(user_prompt, thought, decision):
+    """Stores the completed turn in Umbra's memory."""
+    log_entry = f"WebApp User: '{user_prompt}' | Thought: '{thought}' | Action: {decision}"
+    memory_agent.add_memory(redact(log_entry), "WebApp Conversation")
+    print("   - Memory logged.")
+
+def _fast_path(user_prompt):
+    """
+    Tries the router first. Returns (thought, decision, route); decision is
+    None when the prompt needs the LLM.
+    """
+    with tracing.span("route") as span:
+        decision, route = router_agent.route(user_prompt, tool_map)
+        span["route"] = route
+    if decision:
+        return f"Direct '{decision['tool']}' command; served by the {route} without the LLM.", decision, route
+    return None, None, route
+
+def _llm_decision(full_prompt):
+    """Asks the LLM which tool to use. Returns (thought, decision)."""
+    llm_response = decide_tool(full_prompt)
+    return llm_response.get("thought", "No thought provided."), llm_response.get("decision")
+
+def _finish_turn(data, history, user_prompt, thought, decision):
+    """Runs the chosen tool, then records the turn. Returns Umbra's response."""
+    umbra_response = "I'm not sure how to respond to that."
+    if decision and decision.get("tool"):
+        umbra_response = execute_tool(decision.get("tool"), decision.get("args", []))
+
+    _remember_turn(data, history, user_prompt, umbra_response)
+    _log_turn(user_prompt, thought, decision)
+    return umbra_response
 
 @app.route('/chat', methods=['POST'])
 def chat():
     """Handles chat messages from the UI, now including history."""
     data = request.json
     user_prompt = data.get('prompt')
-    history = data.get('history', [])
 
     if not user_prompt:
         return jsonify({"error": "No prompt provided"}), 400
+    history = _get_history(data)
 
     print(f"\n[Server] Received prompt: {user_prompt}")
     
-    history_str = "\n".join(history)
-    full_prompt_with_history = f"--- Recent Conversation History ---\n{history_str}\n\n--- Current Prompt ---\n{user_prompt}"
+    full_prompt_with_history = _build_prompt(user_prompt, history)
 
-    print("   - Consulting LLM with conversation history...")
-    llm_response = decide_tool(full_prompt_with_history)
-    
-    thought = llm_response.get("thought", "No thought provided.")
-    decision = llm_response.get("decision")
-    print(f"   - LLM Thought: {thought}")
-    print(f"   - LLM Decision: {decision}")
+    with tracing.start_trace("chat") as trace_id:
+        thought, decision, route = _fast_path(user_prompt)
+        if decision is None:
+            print("   - Consulting LLM with conversation history...")
+            thought, decision = _llm_decision(full_prompt_with_history)
+        print(f"   - Route: {route}")
+        print(f"   - LLM Thought: {thought}")
+        print(f"   - LLM Decision: {decision}")
 
-    umbra_response = "I'm not sure how to respond to that."
-    if decision and decision.get("tool"):
-        umbra_response = execute_tool(decision.get("tool"), decision.get("args", []))
+        umbra_response = _finish_turn(data, history, user_prompt, thought, decision)
+    return jsonify({"response": umbra_response, "route": route, "trace_id": trace_id})
 
-    log_entry = f"WebApp User: '{user_prompt}' | Thought: '{thought}' | Action: {decision}"
-    memory_agent.add_memory(log_entry, "WebApp Conversation")
-    print("   - Memory logged.")
+def _sse(event, data):
+    """Formats a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_llm_decision(full_prompt):
+    """Relays the LLM's thought as an SSE frame and returns (thought, decision) once decided."""
+    thought = "No thought provided."
+    decision = None
+    events = stream_decide_tool(full_prompt)
+    try:
+        for event in events:
+            if event["type"] == "thought":
+                thought = redact(event["thought"])
+                print(f"   - LLM Thought: {thought}")
+                yield _sse("thought", {"thought": thought})
+            elif event["type"] == "decision":
+                decision = event["decision"]
+                break
+    finally:
+        # We have everything we need; stop generating the rest of the JSON.
+        events.close()
+    return thought, decision
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming version of /chat. Sends Server-Sent Events as the LLM generates:
+    'thought' as soon as Umbra has reasoned, then 'response' the moment the
+    decision is complete and its tool has run, then 'done'.
+    """
+    data = request.json or {}
+    user_prompt = data.get('prompt')
+
+    if not user_prompt:
+        return jsonify({"error": "No prompt provided"}), 400
+    history = _get_history(data)
+
+    print(f"\n[Server] Received streaming prompt: {user_prompt}")
+    full_prompt_with_history = _build_prompt(user_prompt, history)
+
+    def generate():
+        with tracing.start_trace("chat/stream") as trace_id:
+            thought, decision, route = _fast_path(user_prompt)
+            print(f"   - Route: {route}")
+            if decision is None:
+                thought, decision = yield from _stream_llm_decision(full_prompt_with_history)
+
+            print(f"   - LLM Decision: {decision}")
+            umbra_response = "I'm not sure how to respond to that."
+            if decision and decision.get("tool"):
+                umbra_response = execute_tool(decision.get("tool"), decision.get("args", []))
+            yield _sse("response", {"response": str(umbra_response), "route": route, "trace_id": trace_id})
+
+            _remember_turn(data, history, user_prompt, umbra_response)
+            _log_turn(user_prompt, thought, decision)
+        yield _sse("done", {})
 
-    return jsonify({"response": umbra_response})
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
 
 if __name__ == '__main__':
+    start_up()
     app.run(port=5000, debug=True)
@@ -0,0 +1,118 @@
+import sys
+import json
+import datetime
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# A local stand-in for the external APIs Umbra calls (OpenWeather, Tavily,
+# Google Routes). It answers with canned data, so the agents can be exercised
+# offline. Point them at it with HTTP_BASE_URL_OVERRIDE in config.py:
+#
+#   HTTP_BASE_URL_OVERRIDE = "http://127.0.0.1:8765"
+#
+# Usage: python stub_server.py [port] [latency_ms]
+
+class _StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    counts = {}
+
+    def log_message(self, format, *args):
+        pass # Keep test output quiet.
+
+    def _send(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        path = urlsplit(self.path).path
+        self.counts[path] = self.counts.get(path, 0) + 1
+        time.sleep(self.latency) # Simulated network round trip.
+        handler = _ROUTES.get((method, path))
+        if handler is None:
+            return self._send({"error": {"message": f"No stub for {method} {path}"}}, 404)
+        payload = {}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        self._send(handler(query, payload))
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+def _weather(query, payload):
+    return {"name": query.get("q", "Boston").split(",")[0], "main": {"temp": 68.0},
+            "weather": [{"description": "clear sky"}]}
+
+def _search(query, payload):
+    text = payload.get("query", "")
+    slug = "-".join(text.lower().split())
+    if "sold" in text.lower():
+        # Marketplace-style snippets for market research.
+        prices = [212.5, 230.0, 245.0, 199.99, 260.0]
+        return {"answer": "",
+                "results": [{"title": f"Sold listing {i}", "url": f"https://example.com/{slug}/sold/{i}",
+                             "content": f"Sold {(datetime.date.today() - datetime.timedelta(days=3 * i)):%b %d, %Y} - "
+                                        f"${price:,.2f} + $12.50 shipping. Pre-owned."}
+                            for i, price in enumerate(prices, start=1)]}
+    return {"answer": f"Stub answer for: {text}",
+            "results": [{"title": f"Result {i}", "url": f"https://example.com/{slug}/{i}",
+                         "content": f"Stub result {i} about {text}"} for i in range(1, 4)]}
+
+def _compute_routes(query, payload):
+    return {"routes": [{"distanceMeters": 48280, "duration": "2700s"}]}
+
+def _compute_route_matrix(query, payload):
+    # Plausible numbers from the offline gazetteer: 1.3x the straight line at ~70 km/h.
+    from agents.geo_agent import geocode, haversine_km
+    elements = []
+    for i, origin in enumerate(payload.get("origins", [])):
+        for j, destination in enumerate(payload.get("destinations", [])):
+            start = geocode(origin["waypoint"].get("address", ""))
+            end = geocode(destination["waypoint"].get("address", ""))
+            if start is None or end is None:
+                elements.append({"originIndex": i, "destinationIndex": j, "condition": "ROUTE_NOT_FOUND"})
+                continue
+            km = haversine_km(*start, *end) * 1.3
+            seconds = int(km / 70 * 3600)
+            elements.append({"originIndex": i, "destinationIndex": j, "condition": "ROUTE_EXISTS",
+                             "distanceMeters": int(km * 1000), "staticDuration": f"{seconds}s",
+                             "duration": f"{int(seconds * 1.15)}s"})
+    return elements
+
+_ROUTES = {
+    ("GET", "/data/2.5/weather"): _weather,
+    ("POST", "/search"): _search,
+    ("POST", "/directions/v2:computeRoutes"): _compute_routes,
+    ("POST", "/distanceMatrix/v2:computeRouteMatrix"): _compute_route_matrix,
+}
+
+def start_stub_server(port: int = 0, latency_ms: float = 0.0):
+    """Starts the stub server on a background thread and returns (server, base_url)."""
+    _StubHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def request_counts():
+    """How many requests each stubbed path has received."""
+    return dict(_StubHandler.counts)
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server, url = start_stub_server(port, latency)
+    print(f"--- Stub API server listening on {url} (Ctrl+C to stop) ---")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
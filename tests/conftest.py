@@ -0,0 +1,16 @@
+import os
+import sys
+import types
+
+# Make the project importable, and give the agents a minimal config module when
+# no config.py has been set up (it holds API keys, so it isn't checked in).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import config # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.TAVILY_API_KEY = "test"
+    config.HTTP_CACHE_ENABLED = False
+    sys.modules["config"] = config
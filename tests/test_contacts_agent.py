@@ -0,0 +1,15 @@
+from agents.contacts_agent import _Contact, _merge_duplicates
+
+def test_merge_keeps_apart_people_identified_only_by_organization():
+    rows = [
+        _Contact({"Organization Name": "Acme Corp", "Address 1 - City": "Boston"}),
+        _Contact({"Organization Name": "Acme Corp", "Address 1 - City": "Denver"}),
+        _Contact({"Organization Name": "Acme Corp", "Address 1 - City": "Boston"}), # exact duplicate
+        _Contact({"First Name": "Ada", "Organization Name": "Acme Corp", "E-mail 1 - Value": "ada@acme.test"}),
+        _Contact({"Nickname": "nobody"}),
+    ]
+    merged = _merge_duplicates(rows)
+    keys = [key for key, _ in merged]
+    assert len(keys) == len(set(keys)) == 3
+    assert [contact.city for _, contact in merged] == ["Boston", "Denver", ""]
+    assert keys[2] == "email:ada@acme.test"
@@ -0,0 +1,39 @@
+import math
+import random
+
+import pytest
+
+from agents.geo_agent import cover_prefixes, geocode, geohash_encode, haversine_km
+
+@pytest.mark.parametrize("location, expected", [
+    ("Cambridge, MA", (42.3736, -71.1097)),
+    ("Las Vegas NV 89145", (36.1699, -115.1398)),
+    ("Dublin, Ireland", (53.3498, -6.2603)),
+    ("Boston", (42.3601, -71.0589)),
+])
+def test_geocode_known_places(location, expected):
+    assert geocode(location) == pytest.approx(expected)
+
+@pytest.mark.parametrize("location", ["Arlington, MA", "Ireland", "Massachusetts", "", "nowhere at all"])
+def test_geocode_returns_none_when_it_cannot_place_the_city(location):
+    assert geocode(location) is None
+
+@pytest.mark.parametrize("lat, lon, radius_km", [
+    (42.36, -71.06, 1), (42.36, -71.06, 25), (53.35, -6.26, 100), (-33.87, 151.21, 5), (0.0, 179.99, 50),
+])
+def test_cover_prefixes_cover_every_point_in_the_radius(lat, lon, radius_km):
+    prefixes = cover_prefixes(lat, lon, radius_km)
+    assert 1 <= len(prefixes) <= 9
+    rng = random.Random(0)
+    for _ in range(500):
+        # A random point inside the radius, offset in kilometres.
+        distance, bearing = radius_km * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+        plat = lat + distance * math.cos(bearing) / 110.57
+        plon = lon + distance * math.sin(bearing) / (111.32 * math.cos(math.radians(lat)))
+        plon = (plon + 180.0) % 360.0 - 180.0
+        if haversine_km(lat, lon, plat, plon) > radius_km:
+            continue
+        assert geohash_encode(plat, plon).startswith(tuple(prefixes))
+
+def test_cover_prefixes_match_everything_for_huge_radii():
+    assert cover_prefixes(42.36, -71.06, 20000) == [""]
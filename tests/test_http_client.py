@@ -0,0 +1,32 @@
+import sqlite3
+import time
+
+from agents import http_client
+
+def test_expired_responses_are_pruned_when_the_cache_opens(monkeypatch, tmp_path):
+    path = str(tmp_path / "http_cache.db")
+    monkeypatch.setattr(http_client, "CACHE_DB_PATH", path)
+    monkeypatch.setattr(http_client, "ENDPOINT_TTLS", {"weather": 600, "search": 86400})
+    monkeypatch.setattr(http_client, "STALE_SECONDS", 3600)
+    monkeypatch.setattr(http_client, "_db", None)
+    http_client._get_db().close()
+    monkeypatch.setattr(http_client, "_db", None)
+
+    now = time.time()
+    rows = [
+        ("fresh-weather", "weather", now - 60),
+        ("stale-weather", "weather", now - 600 - 60),       # still served while it refreshes
+        ("dead-weather", "weather", now - 600 - 3600 - 60),
+        ("old-search", "search", now - 86400 - 3600 - 60),
+        ("retired", "places", now),                          # endpoint no longer cached
+    ]
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO responses (key, endpoint, body, fetched_at) VALUES (?, ?, '{}', ?)", rows)
+
+    conn = http_client._get_db()
+    try:
+        keys = {key for (key,) in conn.execute("SELECT key FROM responses")}
+    finally:
+        conn.close()
+        monkeypatch.setattr(http_client, "_db", None)
+    assert keys == {"fresh-weather", "stale-weather"}
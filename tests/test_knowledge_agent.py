@@ -0,0 +1,31 @@
+import threading
+
+from agents import http_client, knowledge_agent
+
+def test_search_many_repeated_cached_query(monkeypatch, tmp_path):
+    # The second search_many is answered from the HTTP cache, so its future has
+    # finished before the done callback is registered and the callback runs
+    # inline; it must not deadlock on the in-flight lock.
+    calls = []
+    def fake_fetch(method, url, params, json_body, headers, timeout):
+        calls.append(json_body["query"])
+        return {"answer": f"answer for {json_body['query']}", "results": []}
+    monkeypatch.setattr(http_client, "_fetch", fake_fetch)
+    monkeypatch.setattr(http_client, "CACHE_ENABLED", True)
+    monkeypatch.setattr(http_client, "CACHE_DB_PATH", str(tmp_path / "http_cache.db"))
+    monkeypatch.setattr(http_client, "_db", None)
+    monkeypatch.setattr(http_client, "_memory", http_client.OrderedDict())
+
+    results = []
+    def run():
+        results.append(knowledge_agent.search_many(["stoic quotes"]))
+        results.append(knowledge_agent.search_many(["stoic quotes", "Stoic  quotes"]))
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive(), "search_many deadlocked"
+    assert calls == ["stoic quotes"]
+    assert [r["answer"] for r in results[0] + results[1]] == ["answer for stoic quotes"] * 3
+    assert all(r["error"] is None for r in results[0] + results[1])
+    assert knowledge_agent._inflight == {}
@@ -0,0 +1,27 @@
+import pytest
+
+from agents.learning_agent import extract_prices, price_statistics
+
+def test_extract_prices_reads_amounts_and_currencies():
+    prices = extract_prices("The Nikon Z6 sells for $1,299.99 new and £950 used.", default_date="2026-01-01")
+    assert [(amount, currency) for amount, currency, _ in prices] == [(1299.99, "USD"), (950.0, "GBP")]
+    assert all(date == "2026-01-01" for _, _, date in prices)
+
+def test_extract_prices_skips_shipping_discounts_and_subscriptions():
+    text = "Save $50 off, plus $35 shipping, a $10 coupon, or rent it for $29/mo. Price: $899."
+    assert [amount for amount, _, _ in extract_prices(text)] == [899.0]
+
+def test_price_statistics_summarizes_observations():
+    observations = [(100.0 + 10 * i, "USD", f"2026-0{1 + i}-01") for i in range(5)]
+    stats = price_statistics(observations)
+    assert stats["count"] == 5
+    assert stats["currency"] == "USD"
+    assert stats["mean"] == pytest.approx(120.0)
+    assert stats["median"] == pytest.approx(120.0)
+    assert (stats["min"], stats["max"]) == (100.0, 140.0)
+    assert stats["first_date"] == "2026-01-01"
+    assert stats["last_date"] == "2026-05-01"
+    assert stats["trend_per_30_days"] > 0
+
+def test_price_statistics_without_observations():
+    assert price_statistics([]) is None
@@ -0,0 +1,30 @@
+import json
+
+from agents.llm_agent import _DecisionStreamParser
+
+RESPONSE = json.dumps({
+    "thought": "Kyle wants the \"weather\" {in Boston}, [soon].",
+    "decision": {"tool": "weather", "args": ["Boston, MA"], "nested": {"a": [1, {"b": "}"}]}},
+    "extra": [1, 2],
+})
+
+def _parse(chunks):
+    parser = _DecisionStreamParser()
+    completed = []
+    for chunk in chunks:
+        completed += parser.feed(chunk)
+    return completed
+
+def test_parser_reports_each_top_level_value_for_any_chunking():
+    expected = [(key, value) for key, value in json.loads(RESPONSE).items()]
+    for size in (1, 2, 3, 7, 16, len(RESPONSE)):
+        assert _parse(RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)) == expected, size
+
+def test_parser_reports_the_thought_before_the_decision_arrives():
+    parser = _DecisionStreamParser()
+    cut = RESPONSE.index('"decision"') + 20
+    assert parser.feed(RESPONSE[:cut]) == [("thought", json.loads(RESPONSE)["thought"])]
+    assert [key for key, _ in parser.feed(RESPONSE[cut:])] == ["decision", "extra"]
+
+def test_parser_skips_malformed_values():
+    assert _parse(['{"thought": "ok", "decision": {"tool": oops}, "x": "y"}']) == [("thought", "ok"), ("x", "y")]
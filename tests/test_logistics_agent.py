@@ -0,0 +1,20 @@
+from collections import Counter
+
+import pytest
+
+from agents.logistics_agent import _MAX_ELEMENTS, _MAX_WAYPOINTS, _blocks
+
+@pytest.mark.parametrize("rows, cols", [(1, 1), (1, 60), (60, 1), (10, 10), (11, 10), (7, 33), (120, 3), (49, 49)])
+def test_blocks_cover_every_pair_once_within_the_limits(rows, cols):
+    origins = [f"o{i}" for i in range(rows)]
+    destinations = [f"d{j}" for j in range(cols)]
+    seen = Counter()
+    for block_origins, block_destinations in _blocks(origins, destinations):
+        assert len(block_origins) * len(block_destinations) <= _MAX_ELEMENTS
+        assert len(block_origins) + len(block_destinations) <= _MAX_WAYPOINTS
+        seen.update((o, d) for o in block_origins for d in block_destinations)
+    assert set(seen) == {(o, d) for o in origins for d in destinations}
+    assert set(seen.values()) == {1}
+
+def test_blocks_use_a_single_call_when_everything_fits():
+    assert len(list(_blocks(["a"] * 10, ["b"] * 10))) == 1
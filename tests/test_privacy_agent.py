@@ -0,0 +1,28 @@
+import pytest
+
+from agents import privacy_agent
+
+@pytest.fixture
+def known_pii():
+    privacy_agent.load_known_pii(["+44 20 7946 0958", "kyle.test@example.org"])
+    yield
+    privacy_agent.load_known_pii([])
+
+def _stream(text, size):
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    return "".join(privacy_agent.redact_stream(chunks))
+
+def test_redact_stream_matches_redact_for_every_chunking(known_pii):
+    for pad in range(0, 120, 7):
+        text = ("word " * pad) + "Call me on +44 20 7946 0958 or mail kyle.test@example.org, or 617-555-0123 tonight. " * 2
+        expected = privacy_agent.redact(text)
+        assert "7946" not in expected and "example.org" not in expected and "0123" not in expected
+        for size in (1, 2, 3, 5, 8, 13, 31, 64, 200):
+            assert _stream(text, size) == expected, (pad, size)
+
+def test_redact_stream_holds_back_a_partial_known_value(known_pii):
+    stream = privacy_agent.RedactingStream(holdback=4, min_emit=1)
+    emitted = stream.feed("x" * 80 + " reach me at +44 20 79")
+    assert "+44" not in emitted
+    emitted += stream.feed("46 0958 thanks") + stream.flush()
+    assert "0958" not in emitted and emitted.endswith("[REDACTED] thanks")
@@ -0,0 +1,30 @@
+import pytest
+
+from agents.router_agent import accepts_arg_count, describe_arity
+
+def _none():
+    pass
+
+def _one(location):
+    pass
+
+def _optional(location=None):
+    pass
+
+def _two_or_three(origin, destination, mode="driving"):
+    pass
+
+def _many(*args):
+    pass
+
+@pytest.mark.parametrize("tool, expected", [
+    (_none, "exactly 0"), (_one, "exactly 1"), (_optional, "0 to 1"),
+    (_two_or_three, "2 to 3"), (_many, "at least 1"),
+])
+def test_describe_arity(tool, expected):
+    assert describe_arity(tool) == expected
+
+def test_accepts_arg_count_respects_defaults_and_varargs():
+    assert accepts_arg_count(_optional, 0) and accepts_arg_count(_optional, 1)
+    assert not accepts_arg_count(_two_or_three, 1)
+    assert accepts_arg_count(_many, 5) and not accepts_arg_count(_many, 0)